@@ -0,0 +1,112 @@
+"""
+Content-addressed cache of analysis results
+
+Results are keyed by the content hash of the snapshot they were computed from plus
+the analyzer version and a digest of the rule set, kept in a small in-memory LRU and
+persisted as JSON files so re-opening a snapshot (also after a restart) returns the
+stored result instead of re-running the analysis. Bumping the analyzer version or
+changing the rules invalidates all entries.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from debug_logger import debug_log
+
+# Under the system temp dir by default, not the working directory, so running the
+# server or the benchmarks from a checkout doesn't leave cache files in it
+BEST_PRACTICES_CACHE_DIR = os.environ.get(
+    "BEST_PRACTICES_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cluster-explorer", "best_practices")
+)
+
+MAX_MEMORY_ENTRIES = 32
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of raw snapshot bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def canonical_content_hash(snapshot: Dict) -> str:
+    """
+    SHA-256 of a snapshot's canonical JSON form, for snapshots whose raw bytes
+    are not available.
+    """
+    canonical = json.dumps(snapshot, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    In-memory LRU backed by one JSON file per key in directory.
+    """
+
+    def __init__(self, directory: str, max_memory_entries: int = MAX_MEMORY_ENTRIES):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return result
+
+        try:
+            with open(self._path(key), "r") as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            debug_log(f"Ignoring unreadable cache entry {key}: {str(e)}", "WARNING")
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        self._remember(key, result)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            debug_log(f"Could not persist cache entry {key}: {str(e)}", "WARNING")
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+best_practices_cache = AnalysisCache(BEST_PRACTICES_CACHE_DIR)
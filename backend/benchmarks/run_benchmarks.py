@@ -0,0 +1,347 @@
+"""
+Benchmark suite for ClusterExplorer and the best practices analysis.
+
+For every scale, a deterministic snapshot is generated (see snapshot_generator, cached
+in --cache-dir) and the phases below are timed in a fresh process, so peak memory
+figures aren't polluted by other scales. --snapshot runs the suite on existing snapshot
+files (.json or .json.gz, e.g. downloaded from a real cluster) instead, and --phase
+limits it to some phases (the snapshot is always loaded):
+
+    load            parse the snapshot JSON and build the ClusterExplorer
+    search          search_by_components over pods and workloads
+    report          generate_component_report
+    node-pods       generate_node_pods_report
+    best-practices  analyze_best_practices (uncached)
+    drill-down      get_best_practice_violations of every check
+
+Each phase records min and median wall time over --repeat runs, throughput in pods
+per second and the process peak RSS after the phase. Results are written as JSON;
+--compare prints the change against a previous results file and flags regressions.
+
+The drill-down results are also checked: no check may list more failing resources
+than it applies to, and the cluster-wide checks must list none at all (the generated
+snapshots include a monitoring stack, so e.g. monitoring deployments must not show
+up as monitoring infrastructure violations). Problems are reported per scale.
+
+Usage:
+    python backend/benchmarks/run_benchmarks.py [--scale small --scale 1000x30000] [--repeat 3]
+                                                [--output results.json] [--compare baseline.json]
+    python backend/benchmarks/run_benchmarks.py --snapshot cluster.json.gz --phase best-practices
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from snapshot_generator import GENERATOR_VERSION, generate_snapshot, write_snapshot  # noqa: E402
+
+# Named scales: (nodes, pods)
+SCALES = {
+    "small": (100, 1000),
+    "medium": (1000, 30000),
+    "large": (10000, 300000),
+}
+
+PHASES = ("load", "search", "report", "node-pods", "best-practices", "drill-down")
+
+SEARCH_COMPONENTS = ["topologySpreadConstraints", "resources.requests", "podAntiAffinity"]
+SEARCH_RESOURCE_TYPES = ["pods", "deployments", "statefulsets"]
+
+# Checks without per-resource verdicts, which must not list failing resources
+CLUSTER_WIDE_CHECKS = [
+    "network-policies", "cni-configuration", "secret-management", "secret-access", "monitoring-infrastructure",
+    "logging-infrastructure", "distributed-tracing", "service-level-objectives", "alert-management",
+]
+
+# Relative slowdown of a phase median that counts as a regression in --compare
+REGRESSION_THRESHOLD = 0.10
+
+# Phases faster than this in both runs are too noisy to flag
+MIN_COMPARED_SECONDS = 0.005
+
+
+def parse_scale(scale: str) -> Tuple[str, int, int]:
+    """(name, nodes, pods) of a named scale or a NODESxPODS string."""
+    if scale in SCALES:
+        return (scale,) + SCALES[scale]
+    try:
+        nodes, pods = (int(part) for part in scale.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid scale '{scale}', expected one of {list(SCALES)} or NODESxPODS")
+    return scale, nodes, pods
+
+
+def snapshot_path(cache_dir: str, nodes: int, pods: int, seed: int) -> str:
+    """Generate the snapshot of a scale unless it is already cached, and return its path."""
+    path = os.path.join(cache_dir, f"snapshot-{nodes}n-{pods}p-s{seed}-g{GENERATOR_VERSION}.json.gz")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp.gz"
+        write_snapshot(generate_snapshot(nodes, pods, seed), tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _time_phase(run: Callable[[], object], repeat: int, pods: int) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {
+        "min_seconds": round(min(timings), 6),
+        "median_seconds": round(median, 6),
+        "pods_per_second": round(pods / median) if median > 0 else None,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
+
+
+def check_drill_down(violations: Dict[str, Dict]) -> List[str]:
+    """Problems of the violations of every check, see CLUSTER_WIDE_CHECKS."""
+    problems = []
+    for check_id, result in violations.items():
+        if result["total"] > result["applicable"]:
+            problems.append(f"{check_id}: {result['total']} failing resources but applies to {result['applicable']}")
+        if check_id in CLUSTER_WIDE_CHECKS and (result["total"] or result["applicable"]):
+            problems.append(f"{check_id}: cluster-wide check lists {result['total']} failing resources")
+    return problems
+
+
+def benchmark_snapshot(path: str, repeat: int, phase_names: Optional[Sequence[str]] = None) -> Dict:
+    """Time the phases (all by default) on one snapshot file. Runs in its own process."""
+    from bestpractices_analyzer import analyze_best_practices
+    from cluster_explorer import ClusterExplorer
+    from resource_records import process_rss_bytes
+
+    # The explorer and analyzer log and print per call; keep that out of the timings
+    logging.disable(logging.CRITICAL)
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    selected = set(phase_names or PHASES)
+
+    phases = {}
+    explorer = None
+
+    def load():
+        nonlocal explorer
+        explorer = None
+        explorer = ClusterExplorer(json.loads(raw))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        phases["load"] = _time_phase(load, repeat, 0)
+        pods = len(explorer.resources["pods"])
+        phases["load"]["pods_per_second"] = round(pods / phases["load"]["median_seconds"])
+        phases["load"]["megabytes_per_second"] = round(len(raw) / 2 ** 20 / phases["load"]["median_seconds"], 1)
+        phases["load"]["rss_bytes"] = process_rss_bytes()
+
+        if "search" in selected:
+            phases["search"] = _time_phase(
+                lambda: explorer.search_by_components(SEARCH_COMPONENTS, SEARCH_RESOURCE_TYPES, "include"), repeat, pods
+            )
+        if "report" in selected:
+            phases["report"] = _time_phase(
+                lambda: explorer.generate_component_report(SEARCH_COMPONENTS, SEARCH_RESOURCE_TYPES), repeat, pods
+            )
+        if "node-pods" in selected:
+            phases["node-pods"] = _time_phase(explorer.generate_node_pods_report, repeat, pods)
+        if "best-practices" in selected:
+            phases["best-practices"] = _time_phase(
+                lambda: analyze_best_practices(explorer.resources, explorer.quantities), repeat, pods
+            )
+
+        violations = {}
+        if "drill-down" in selected:
+            check_ids = [check["id"] for category in explorer.analyze_best_practices()["categories"].values()
+                         for check in category["checks"]]
+
+            def drill_down():
+                for check_id in check_ids:
+                    violations[check_id] = explorer.get_best_practice_violations(check_id)
+
+            phases["drill-down"] = _time_phase(drill_down, repeat, pods)
+
+    return {
+        "snapshot_bytes": len(raw),
+        "counts": {resource_type: len(items) for resource_type, items in explorer.resources.items() if items},
+        "phases": phases,
+        "violations": {check_id: result["total"] for check_id, result in violations.items()},
+        "problems": check_drill_down(violations),
+    }
+
+
+def _benchmark_worker(path: str, repeat: int, phase_names: Optional[Sequence[str]],
+                      results: multiprocessing.Queue) -> None:
+    try:
+        results.put(benchmark_snapshot(path, repeat, phase_names))
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_scale(path: str, repeat: int, phase_names: Optional[Sequence[str]] = None) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_benchmark_worker, args=(path, repeat, phase_names, results))
+    process.start()
+    # Poll rather than block: a worker killed by the OOM killer or a signal never
+    # puts a result and would otherwise hang the whole suite
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                result = {"error": _exit_reason(process.exitcode)}
+            break
+    process.join()
+    return result
+
+
+def _exit_reason(exitcode: Optional[int]) -> str:
+    if exitcode is not None and exitcode < 0:
+        try:
+            return f"worker killed by {signal.Signals(-exitcode).name}"
+        except ValueError:
+            return f"worker killed by signal {-exitcode}"
+    return f"worker exited with code {exitcode} without a result"
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print the median change per scale and phase against baseline and return the regressions."""
+    regressions = []
+    baseline_scales = {scale["name"]: scale for scale in baseline.get("scales", [])}
+    print(f"\nCompared to {baseline.get('meta', {}).get('commit') or 'baseline'}:")
+    for scale in results["scales"]:
+        previous = baseline_scales.get(scale["name"])
+        if previous is None or "phases" not in previous or "phases" not in scale:
+            continue
+        for phase, timing in scale["phases"].items():
+            previous_timing = previous["phases"].get(phase)
+            if not previous_timing or not previous_timing["median_seconds"]:
+                continue
+            change = timing["median_seconds"] / previous_timing["median_seconds"] - 1
+            flag = ""
+            if change > threshold and max(timing["median_seconds"], previous_timing["median_seconds"]) >= MIN_COMPARED_SECONDS:
+                flag = "  REGRESSION"
+                regressions.append(f"{scale['name']}/{phase}")
+            print(f"  {scale['name']:>12} {phase:<15} {previous_timing['median_seconds']:9.3f}s -> "
+                  f"{timing['median_seconds']:9.3f}s ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ClusterExplorer and the best practices analysis")
+    parser.add_argument("--scale", action="append", type=parse_scale,
+                        help=f"One of {list(SCALES)} or NODESxPODS, repeatable (default: small and medium)")
+    parser.add_argument("--snapshot", action="append", default=[],
+                        help="Benchmark this snapshot file (.json or .json.gz) instead of generated ones, repeatable")
+    parser.add_argument("--phase", action="append", choices=PHASES, help="Only run this phase, repeatable (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per phase")
+    parser.add_argument("--seed", type=int, default=0, help="Snapshot generator seed")
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "cluster-explorer-benchmarks"),
+                        help="Directory for generated snapshots")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Results file of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Median slowdown counted as a regression by --compare")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "phases": args.phase or list(PHASES),
+        },
+        "scales": [],
+    }
+
+    if args.snapshot:
+        runs = [(os.path.basename(path), path, None, None) for path in args.snapshot]
+    else:
+        runs = [
+            (name, snapshot_path(args.cache_dir, nodes, pods, args.seed), nodes, pods)
+            for name, nodes, pods in args.scale or [parse_scale("small"), parse_scale("medium")]
+        ]
+
+    for name, path, nodes, pods in runs:
+        result = {"name": name, "nodes": nodes, "pods": pods, **run_scale(path, args.repeat, args.phase)}
+        if nodes is None and "counts" in result:
+            result["nodes"] = result["counts"].get("nodes", 0)
+            result["pods"] = result["counts"].get("pods", 0)
+        nodes, pods = result["nodes"], result["pods"]
+        results["scales"].append(result)
+
+        if "error" in result:
+            print(f"{name} ({nodes} nodes, {pods} pods): failed: {result['error']}")
+            continue
+        print(f"{name} ({nodes} nodes, {pods} pods, {result['snapshot_bytes'] / 2 ** 20:.1f} MiB)")
+        for phase, timing in result["phases"].items():
+            print(f"  {phase:<15} median {timing['median_seconds']:8.3f}s  min {timing['min_seconds']:8.3f}s  "
+                  f"{timing['pods_per_second'] or 0:>10,} pods/s  peak RSS {timing['peak_rss_bytes'] / 2 ** 20:8.0f} MiB")
+        for problem in result["problems"]:
+            print(f"  PROBLEM {problem}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+    if any(scale.get("problems") or "error" in scale for scale in results["scales"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
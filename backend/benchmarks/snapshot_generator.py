@@ -0,0 +1,321 @@
+"""
+Deterministic synthetic cluster snapshots for benchmarks.
+
+Generates snapshots in the same format as the snapshot store (one "<kind>List" entry
+with an "items" array per resource type) at a configurable scale. The same parameters
+and seed always produce the same snapshot, so timings are comparable between commits.
+
+Usage:
+    python backend/benchmarks/snapshot_generator.py --nodes 1000 --pods 30000 -o snapshot.json.gz
+"""
+
+import argparse
+import gzip
+import json
+import random
+from typing import Dict, List, Optional
+
+ZONES = ["us-east-1a", "us-east-1b", "us-east-1c"]
+INSTANCE_TYPES = [
+    # (instance type, allocatable cpu, allocatable memory)
+    ("m5.large", "1930m", "7Gi"),
+    ("m5.xlarge", "3920m", "15Gi"),
+    ("m5.2xlarge", "7910m", "31Gi"),
+    ("c5.4xlarge", "15890m", "29Gi"),
+    ("r5.2xlarge", "7910m", "62Gi"),
+]
+IMAGES = [
+    "nginx:latest",
+    "redis:7.2",
+    "registry.corp.example.com/platform/api:1.14.2",
+    "registry.corp.example.com/platform/worker:1.14.2",
+    "docker.io/library/busybox:latest",
+    "ghcr.io/example/sidecar:v0.3.1",
+]
+CPU_REQUESTS = ["50m", "100m", "250m", "500m", "0.5", "1", "2"]
+MEMORY_REQUESTS = ["64Mi", "128Mi", "256Mi", "512Mi", "1Gi", "2Gi", "1G"]
+EVENT_REASONS = [
+    ("Scheduled", "Normal"), ("Pulled", "Normal"), ("Created", "Normal"), ("Started", "Normal"),
+    ("Killing", "Normal"), ("BackOff", "Warning"), ("FailedScheduling", "Warning"), ("Unhealthy", "Warning"),
+]
+TEAMS = ["payments", "search", "platform", "data", "web"]
+# Deployments and services of the monitoring stack, in its own namespace
+MONITORING_NAMESPACE = "monitoring"
+MONITORING_STACK = ["prometheus-server", "grafana", "kube-state-metrics"]
+
+# Part of the cache file names of generated snapshots; bump when the output changes
+GENERATOR_VERSION = 2
+
+
+def _metadata(rng: random.Random, name: str, namespace: Optional[str], uid: str,
+              labels: Optional[Dict] = None) -> Dict:
+    metadata = {
+        "name": name,
+        "uid": uid,
+        "resourceVersion": str(rng.randint(1, 10 ** 7)),
+        "creationTimestamp": f"2025-0{rng.randint(1, 9)}-{rng.randint(10, 28)}T{rng.randrange(24):02d}:00:00Z",
+        "labels": labels or {},
+    }
+    if namespace is not None:
+        metadata["namespace"] = namespace
+    return metadata
+
+
+def _pod_template(rng: random.Random, app: str, team: str) -> Dict:
+    containers = []
+    for c in range(rng.choice([1, 1, 1, 2, 3])):
+        memory = rng.choice(MEMORY_REQUESTS)
+        container = {
+            "name": "main" if c == 0 else f"sidecar-{c}",
+            "image": rng.choice(IMAGES),
+            "resources": {
+                "requests": {"cpu": rng.choice(CPU_REQUESTS), "memory": memory},
+                "limits": {"memory": memory if rng.random() < 0.6 else rng.choice(MEMORY_REQUESTS)},
+            },
+        }
+        if rng.random() < 0.1:
+            del container["resources"]["requests"]
+        if rng.random() < 0.6:
+            container["livenessProbe"] = {"httpGet": {"path": "/healthz", "port": 8080}, "periodSeconds": 10}
+        if rng.random() < 0.7:
+            container["readinessProbe"] = {"httpGet": {"path": "/ready", "port": 8080}}
+        if rng.random() < 0.3:
+            container["lifecycle"] = {"preStop": {"exec": {"command": ["sleep", "5"]}}}
+        if rng.random() < 0.2:
+            container["env"] = [{"name": "DB_PASSWORD", "valueFrom": {"secretKeyRef": {"name": f"{app}-db", "key": "password"}}}]
+        containers.append(container)
+
+    spec = {"containers": containers}
+    if rng.random() < 0.3:
+        spec["topologySpreadConstraints"] = [
+            {"topologyKey": "topology.kubernetes.io/zone", "maxSkew": 1, "whenUnsatisfiable": "DoNotSchedule",
+             "labelSelector": {"matchLabels": {"app": app}}}
+        ]
+    if rng.random() < 0.2:
+        term = {"topologyKey": "kubernetes.io/hostname", "labelSelector": {"matchLabels": {"app": app}}}
+        if rng.random() < 0.5:
+            spec["affinity"] = {"podAntiAffinity": {"requiredDuringSchedulingIgnoredDuringExecution": [term]}}
+        else:
+            spec["affinity"] = {"podAntiAffinity": {"preferredDuringSchedulingIgnoredDuringExecution": [
+                {"weight": 100, "podAffinityTerm": term}
+            ]}}
+    if rng.random() < 0.4:
+        spec["securityContext"] = {"runAsNonRoot": True, "runAsUser": 1000}
+    if rng.random() < 0.3:
+        spec["terminationGracePeriodSeconds"] = 60
+    if rng.random() < 0.1:
+        spec["tolerations"] = [{"key": "dedicated", "operator": "Equal", "value": "batch", "effect": "NoSchedule"}]
+
+    annotations = {"prometheus.io/scrape": "true", "prometheus.io/port": "9090"} if rng.random() < 0.4 else {}
+    return {"metadata": {"labels": {"app": app, "team": team}, "annotations": annotations}, "spec": spec}
+
+
+def generate_snapshot(nodes: int = 100, pods: int = 1000, seed: int = 0, pods_per_workload: int = 10,
+                      events_per_pod: float = 0.5, pdb_ratio: float = 0.5, namespaces: Optional[int] = None) -> Dict:
+    """
+    Generate a snapshot.
+
+    Args:
+        nodes: Number of nodes
+        pods: Number of pods, spread over the nodes and owned by workloads
+        seed: Random seed; equal arguments give equal snapshots
+        pods_per_workload: Average number of pods per workload
+        events_per_pod: Number of events per pod
+        pdb_ratio: Share of workloads with a PodDisruptionBudget
+        namespaces: Number of namespaces, one per 200 pods (at least 5) by default
+
+    Returns:
+        Snapshot dictionary with nodeList, podList, ... entries
+    """
+    rng = random.Random(seed)
+    namespace_names = [f"ns-{i}" for i in range(namespaces or max(5, pods // 200))]
+
+    node_items = []
+    for i in range(nodes):
+        instance_type, cpu, memory = INSTANCE_TYPES[rng.randrange(len(INSTANCE_TYPES))]
+        name = f"node-{i}"
+        node = {
+            "kind": "Node",
+            "metadata": _metadata(rng, name, None, f"node-{i}", {
+                "kubernetes.io/hostname": name,
+                "topology.kubernetes.io/zone": rng.choice(ZONES),
+                "node.kubernetes.io/instance-type": instance_type,
+                "karpenter.sh/capacity-type": rng.choice(["on-demand", "spot"]),
+            }),
+            "spec": {"providerID": f"aws:///{rng.choice(ZONES)}/i-{i:012x}"},
+            "status": {
+                "capacity": {"cpu": str(int(cpu[:-1]) // 1000 + 1), "memory": memory, "pods": "110"},
+                "allocatable": {"cpu": cpu, "memory": memory, "pods": "110"},
+                "conditions": [{"type": "Ready", "status": "True"}],
+            },
+        }
+        if i % 20 == 0:
+            node["spec"]["taints"] = [{"key": "dedicated", "value": "batch", "effect": "NoSchedule"}]
+        node_items.append(node)
+
+    deployments, statefulsets, replicasets, pdbs, services = [], [], [], [], []
+    workloads = []
+    for w in range(max(1, pods // max(1, pods_per_workload))):
+        namespace = rng.choice(namespace_names)
+        app = f"app-{w}"
+        team = rng.choice(TEAMS)
+        template = _pod_template(rng, app, team)
+        kind = "Deployment" if rng.random() < 0.8 else "StatefulSet"
+        workload = {
+            "kind": kind,
+            "metadata": _metadata(rng, app, namespace, f"wl-{w}", {"app": app, "team": team}),
+            "spec": {"replicas": rng.choice([1, 2, 3, 3, 5]), "selector": {"matchLabels": {"app": app}}, "template": template},
+        }
+        if kind == "Deployment":
+            deployments.append(workload)
+            replicaset_name = f"{app}-{rng.getrandbits(32):08x}"
+            replicasets.append({
+                "kind": "ReplicaSet",
+                "metadata": {
+                    **_metadata(rng, replicaset_name, namespace, f"rs-{w}", {"app": app}),
+                    "ownerReferences": [{"kind": "Deployment", "name": app, "uid": f"wl-{w}", "controller": True}],
+                },
+                "spec": {"replicas": workload["spec"]["replicas"], "template": template},
+            })
+            workloads.append((workload, "ReplicaSet", replicaset_name, f"rs-{w}"))
+        else:
+            statefulsets.append(workload)
+            workloads.append((workload, "StatefulSet", app, f"wl-{w}"))
+
+        if rng.random() < pdb_ratio:
+            selector = {"matchLabels": {"app": app}}
+            if rng.random() < 0.2:
+                selector = {"matchExpressions": [{"key": "app", "operator": "In", "values": [app]}]}
+            budget = {"maxUnavailable": 1} if rng.random() < 0.5 else {"minAvailable": "50%"}
+            pdbs.append({
+                "kind": "PodDisruptionBudget",
+                "metadata": _metadata(rng, f"{app}-pdb", namespace, f"pdb-{w}"),
+                "spec": {"selector": selector, **budget},
+            })
+        services.append({
+            "kind": "Service",
+            "metadata": _metadata(rng, f"{app}-svc", namespace, f"svc-{w}", {"app": app}),
+            "spec": {"selector": {"app": app}, "ports": [{"port": 80, "targetPort": 8080}], "type": "ClusterIP"},
+        })
+
+    pod_items: List[Dict] = []
+    for p in range(pods):
+        workload, owner_kind, owner_name, owner_uid = workloads[p % len(workloads)]
+        namespace = workload["metadata"]["namespace"]
+        template = workload["spec"]["template"]
+        phase = "Running" if rng.random() < 0.93 else rng.choice(["Pending", "Succeeded", "Failed"])
+        pod_items.append({
+            "kind": "Pod",
+            "metadata": {
+                **_metadata(rng, f"{owner_name}-{p:06d}", namespace, f"pod-{p}", template["metadata"]["labels"]),
+                "annotations": template["metadata"]["annotations"],
+                "ownerReferences": [{"kind": owner_kind, "name": owner_name, "uid": owner_uid, "controller": True}],
+                "managedFields": [{"manager": "kube-controller-manager", "operation": "Update", "apiVersion": "v1",
+                                   "fieldsType": "FieldsV1", "fieldsV1": {"f:metadata": {"f:labels": {}}}}],
+            },
+            "spec": {**template["spec"], "nodeName": f"node-{rng.randrange(nodes)}" if nodes and phase != "Pending" else None},
+            "status": {"phase": phase, "qosClass": "Burstable"},
+        })
+
+    network_policies = []
+    for i, namespace in enumerate(namespace_names):
+        if i % 3 == 0:
+            network_policies.append({
+                "kind": "NetworkPolicy",
+                "metadata": _metadata(rng, "default-deny", namespace, f"np-deny-{i}"),
+                "spec": {"podSelector": {}, "policyTypes": ["Ingress"]},
+            })
+        network_policies.append({
+            "kind": "NetworkPolicy",
+            "metadata": _metadata(rng, "allow-web", namespace, f"np-web-{i}"),
+            "spec": {"podSelector": {"matchLabels": {"team": "web"}}, "ingress": [{"from": [{"podSelector": {}}]}]},
+        })
+
+    events = []
+    for e in range(int(pods * events_per_pod)):
+        pod = pod_items[rng.randrange(len(pod_items))] if pod_items else None
+        if pod is None:
+            break
+        reason, event_type = EVENT_REASONS[rng.randrange(len(EVENT_REASONS))]
+        day, hour, minute = rng.randint(1, 7), rng.randrange(24), rng.randrange(60)
+        events.append({
+            "kind": "Event",
+            "metadata": {"name": f"{pod['metadata']['name']}.{e:x}", "namespace": pod["metadata"]["namespace"], "uid": f"ev-{e}"},
+            "involvedObject": {"kind": "Pod", "name": pod["metadata"]["name"], "namespace": pod["metadata"]["namespace"],
+                               "uid": pod["metadata"]["uid"]},
+            "reason": reason,
+            "type": event_type,
+            "count": rng.randint(1, 30),
+            "message": f"{reason} for pod {pod['metadata']['name']}",
+            "firstTimestamp": f"2025-03-{day:02d}T{hour:02d}:{minute:02d}:00Z",
+            "lastTimestamp": f"2025-03-{day:02d}T{hour:02d}:{minute:02d}:30Z",
+        })
+
+    pod_metrics = [
+        {
+            "metadata": {"name": pod["metadata"]["name"], "namespace": pod["metadata"]["namespace"]},
+            "containers": [
+                {"name": container["name"], "usage": {"cpu": f"{rng.randint(1, 900)}m", "memory": f"{rng.randint(16, 1500)}Mi"}}
+                for container in pod["spec"]["containers"]
+            ],
+        }
+        for pod in pod_items if pod["status"]["phase"] == "Running"
+    ]
+
+    # Generated last, so the rest of the snapshot doesn't depend on it
+    for i, app in enumerate(MONITORING_STACK):
+        deployments.append({
+            "kind": "Deployment",
+            "metadata": _metadata(rng, app, MONITORING_NAMESPACE, f"mon-{i}", {"app.kubernetes.io/name": app}),
+            "spec": {"replicas": 1, "selector": {"matchLabels": {"app.kubernetes.io/name": app}},
+                     "template": _pod_template(rng, app, "platform")},
+        })
+        services.append({
+            "kind": "Service",
+            "metadata": _metadata(rng, app, MONITORING_NAMESPACE, f"mon-svc-{i}", {"app.kubernetes.io/name": app}),
+            "spec": {"selector": {"app.kubernetes.io/name": app}, "ports": [{"port": 9090}], "type": "ClusterIP"},
+        })
+
+    return {
+        "nodeList": {"items": node_items},
+        "podList": {"items": pod_items},
+        "deploymentList": {"items": deployments},
+        "statefulSetList": {"items": statefulsets},
+        "replicaSetList": {"items": replicasets},
+        "podDisruptionBudgetList": {"items": pdbs},
+        "serviceList": {"items": services},
+        "networkPolicyList": {"items": network_policies},
+        "NamespaceList": {"items": [
+            {"kind": "Namespace", "metadata": _metadata(rng, name, None, f"ns-{name}"), "status": {"phase": "Active"}}
+            for name in namespace_names + [MONITORING_NAMESPACE]
+        ]},
+        "eventList": {"items": events},
+        "podMetricsList": {"items": pod_metrics},
+    }
+
+
+def write_snapshot(snapshot: Dict, path: str) -> None:
+    """Write a snapshot as JSON, gzipped when path ends with .gz."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as f:
+        json.dump(snapshot, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic cluster snapshot")
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--pods", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--namespaces", type=int, help="Default: one per 200 pods, at least 5")
+    parser.add_argument("--events-per-pod", type=float, default=0.5)
+    parser.add_argument("--pdb-ratio", type=float, default=0.5, help="Share of workloads with a PDB")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.json or .json.gz)")
+    args = parser.parse_args()
+
+    snapshot = generate_snapshot(args.nodes, args.pods, args.seed, events_per_pod=args.events_per_pod,
+                                 pdb_ratio=args.pdb_ratio, namespaces=args.namespaces)
+    write_snapshot(snapshot, args.output)
+
+
+if __name__ == "__main__":
+    main()
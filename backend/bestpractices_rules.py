@@ -0,0 +1,1142 @@
+"""
+Best practice rules
+
+Every check of the best practices analysis is a Rule that declares the resource types
+it inspects. The analyzer visits each resource of the snapshot once and feeds it to all
+rules interested in its type; a rule turns a resource into a tuple of counter
+contributions, and builds its check from the summed counters at the end.
+"""
+
+from typing import Dict, FrozenSet, List, Any, NamedTuple, Optional, Tuple
+import logging
+import re
+
+from pattern_matcher import PatternMatcher
+from resource_quantity import ResourceQuantities
+from selector_index import SelectorIndex
+
+logger = logging.getLogger("cluster_explorer")
+
+WORKLOAD_TYPES = ("deployments", "statefulsets")
+
+ZONE_TOPOLOGY_KEY = "topology.kubernetes.io/zone"
+
+
+def safe_percentage(count: int, total: int, default: int = 0) -> int:
+    """Calculate percentage and ensure it's between 0 and 100"""
+    if total <= 0:
+        return default
+    percentage = round((count / total) * 100)
+    return min(percentage, 100)  # Cap at 100%
+
+
+def pod_template_spec(workload: Dict) -> Dict:
+    return workload.get("spec", {}).get("template", {}).get("spec", {})
+
+
+class AnalysisContext:
+    """
+    Snapshot-wide data shared by the rules of one analysis, built on first use.
+    """
+
+    def __init__(self, resources: Dict[str, List[Dict]], quantities: ResourceQuantities):
+        self.resources = resources
+        self.quantities = quantities
+        self._pdb_index = None
+        self._workload_pdbs: Dict[tuple, List[Dict]] = {}
+        self._pod_flags: Dict[str, List[bool]] = {}
+        self._observability_matches: Dict[tuple, "ObservabilityMatches"] = {}
+
+    def workload_pdbs(self, resource_type: str, index: int, workload: Dict) -> List[Dict]:
+        """
+        PDBs selecting the pods of a workload, resolved through a per-namespace selector index.
+
+        PDBs select pods, so they are matched against the workload's pod template labels
+        (falling back to the workload's own labels when it has no template labels).
+        """
+        key = (resource_type, index)
+        pdbs = self._workload_pdbs.get(key)
+        if pdbs is None:
+            all_pdbs = self.resources.get("poddisruptionbudgets", [])
+            if self._pdb_index is None:
+                self._pdb_index = SelectorIndex([
+                    (pdb.get("metadata", {}).get("namespace", "default"), pdb.get("spec", {}).get("selector"))
+                    for pdb in all_pdbs
+                ])
+            metadata = workload.get("metadata", {})
+            labels = (
+                workload.get("spec", {}).get("template", {}).get("metadata", {}).get("labels")
+                or metadata.get("labels")
+                or {}
+            )
+            pdbs = [all_pdbs[i] for i in self._pdb_index.matching(metadata.get("namespace", "default"), labels)]
+            self._workload_pdbs[key] = pdbs
+        return pdbs
+
+    def pod_flags(self, name: str) -> List[bool]:
+        """A per-pod boolean array of ResourceQuantities as a list, for fast scalar access."""
+        flags = self._pod_flags.get(name)
+        if flags is None:
+            flags = getattr(self.quantities, name).tolist()
+            self._pod_flags[name] = flags
+        return flags
+
+    def observability_matches(self, resource_type: str, index: int, resource: Dict) -> "ObservabilityMatches":
+        """
+        Observability patterns found in a resource's name, labels and annotations.
+
+        Scanned once per resource and shared by all observability rules.
+        """
+        key = (resource_type, index)
+        matches = self._observability_matches.get(key)
+        if matches is None:
+            metadata = resource.get("metadata", {})
+            name = metadata.get("name", "") or ""
+            labels = metadata.get("labels") or {}
+            annotations = metadata.get("annotations") or {}
+            matches = ObservabilityMatches(
+                name=name.lower(),
+                in_name=OBSERVABILITY_PATTERNS.search(name),
+                in_label_keys=OBSERVABILITY_PATTERNS.search_all(labels.keys()),
+                in_label_values=OBSERVABILITY_PATTERNS.search_all(labels.values()),
+                in_annotations=OBSERVABILITY_PATTERNS.search_all(
+                    text for item in annotations.items() for text in item
+                ),
+            )
+            self._observability_matches[key] = matches
+        return matches
+
+
+class Rule:
+    """
+    A single best practice check.
+
+    Subclasses set the check's name, category, the resource types they inspect and the
+    names of their counters, and implement evaluate and finalize. A rule whose verdict
+    for a resource also depends on other resources of its namespace (e.g. the PDBs
+    selecting a workload) lists their types in context_types, so incremental analysis
+    re-evaluates it when those change.
+    """
+
+    name: str = ""
+    category: str = ""
+    resource_types: Tuple[str, ...] = ()
+    context_types: Tuple[str, ...] = ()
+    counters: Tuple[str, ...] = ()
+    explanation: str = ""
+    recommendation: str = ""
+    reference: str = ""
+
+    def evaluate(self, resource_type: str, index: int, resource: Dict, ctx: AnalysisContext) -> Optional[Tuple[int, ...]]:
+        """
+        Inspect one resource.
+
+        Args:
+            resource_type: Type of the resource, one of resource_types
+            index: Position of the resource in resources[resource_type]
+            resource: The resource
+            ctx: Shared analysis context
+
+        Returns:
+            Contribution to each of the rule's counters, or None when the resource
+            doesn't count for this rule
+        """
+        return None
+
+    def signature(self) -> Tuple:
+        """Identity of the rule's logic: verdicts are only reused between rules with equal signatures."""
+        return (type(self).__qualname__, self.name)
+
+    @property
+    def id(self) -> str:
+        """URL-safe identifier of the check, derived from its name."""
+        return re.sub(r"[^a-z0-9]+", "-", self.name.lower()).strip("-")
+
+    def verdict(self, contribution: Optional[Tuple[int, ...]]) -> Optional[bool]:
+        """
+        Whether a resource passes the check, given its contribution.
+
+        By default the first counter counts the resources the check applies to and the
+        second those passing it. Rules without per-resource verdicts (cluster-wide checks)
+        return None, as does a resource the check doesn't apply to.
+        """
+        if not contribution or len(contribution) < 2 or not contribution[0]:
+            return None
+        return contribution[1] > 0
+
+    def finalize(self, totals: Dict[str, int], ctx: AnalysisContext) -> Tuple[Dict[str, Any], int]:
+        """
+        Build the check from the summed counters.
+
+        Returns:
+            The check dictionary and the percentage it adds to its category score
+        """
+        raise NotImplementedError
+
+    def check(self, passed: bool, details: str) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "passed": passed,
+            "details": details,
+            "explanation": self.explanation,
+            "recommendation": self.recommendation,
+            "reference": self.reference,
+        }
+
+
+# --------------------------------------------
+# Resiliency Checks
+# --------------------------------------------
+
+class MultiZoneRule(Rule):
+    name = "Multi-zone deployment"
+    category = "resiliency"
+    resource_types = WORKLOAD_TYPES
+    counters = ("workloads", "multi_zone")
+    explanation = (
+        "Multi-zone deployment helps ensure application availability in case of zone failure. "
+        "Configure Pod anti-affinity or topology spread constraints to distribute your workloads "
+        "across multiple zones in your Kubernetes cluster."
+    )
+    recommendation = (
+        "Configure Pod anti-affinity or topology spread constraints with topologyKey: 'topology.kubernetes.io/zone' "
+        "to distribute your workloads across multiple zones. For critical services, use "
+        "requiredDuringSchedulingIgnoredDuringExecution to ensure zone distribution."
+    )
+    reference = "https://kubernetes.io/docs/concepts/scheduling-eviction/topology-spread-constraints/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        pod_spec = pod_template_spec(resource)
+
+        # Check for zone anti-affinity
+        required_rules = pod_spec.get("affinity", {}).get("podAntiAffinity", {}).get(
+            "requiredDuringSchedulingIgnoredDuringExecution", []
+        )
+        has_anti_affinity = any(rule.get("topologyKey") == ZONE_TOPOLOGY_KEY for rule in required_rules)
+
+        # Check for topology spread constraints
+        has_topology_spread = any(
+            constraint.get("topologyKey") == ZONE_TOPOLOGY_KEY
+            for constraint in pod_spec.get("topologySpreadConstraints", [])
+        )
+        return (1, 1 if has_anti_affinity or has_topology_spread else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["multi_zone"], totals["workloads"])
+        return self.check(
+            percentage >= 80,
+            f"{percentage}% of workloads are configured for multi-zone deployment"
+            if percentage >= 80
+            else f"Only {percentage}% of workloads are configured for multi-zone deployment",
+        ), percentage
+
+
+class HealthChecksRule(Rule):
+    name = "Health checks"
+    category = "resiliency"
+    resource_types = WORKLOAD_TYPES
+    counters = ("workloads", "any_probe", "liveness", "readiness", "startup")
+    explanation = (
+        "Health probes allow Kubernetes to detect and respond to application failures. "
+        "Liveness probes determine if an application is running, readiness probes determine "
+        "if an application is ready to receive traffic, and startup probes allow slow-starting "
+        "containers to delay other probes until they've initialized."
+    )
+    recommendation = (
+        "Configure readinessProbe for all containers to verify they're ready to receive traffic. "
+        "Add livenessProbe to detect and restart hung applications. For slow-starting applications, "
+        "use startupProbe to give them time to initialize before other probes activate. "
+        "Use HTTP checks for web services and exec commands for non-HTTP applications."
+    )
+    reference = "https://kubernetes.io/docs/tasks/configure-pod-container/configure-liveness-readiness-startup-probes/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        liveness = readiness = startup = 0
+        for container in pod_template_spec(resource).get("containers", []):
+            if "livenessProbe" in container:
+                liveness = 1
+            if "readinessProbe" in container:
+                readiness = 1
+            if "startupProbe" in container:
+                startup = 1
+        return (1, 1 if liveness or readiness or startup else 0, liveness, readiness, startup)
+
+    def finalize(self, totals, ctx):
+        workloads = totals["workloads"]
+        percentage = safe_percentage(totals["any_probe"], workloads)
+        breakdown = (
+            f"Breakdown: Liveness: {safe_percentage(totals['liveness'], workloads)}%, "
+            f"Readiness: {safe_percentage(totals['readiness'], workloads)}%, "
+            f"Startup: {safe_percentage(totals['startup'], workloads)}%"
+        )
+        return self.check(
+            percentage >= 75,
+            f"{percentage}% of workloads have at least one health probe configured. {breakdown}"
+            if percentage >= 75
+            else f"Only {percentage}% of workloads have health probes configured. {breakdown}",
+        ), percentage
+
+
+class GracefulTerminationRule(Rule):
+    name = "Graceful termination"
+    category = "resiliency"
+    resource_types = WORKLOAD_TYPES
+    counters = ("workloads", "graceful")
+    explanation = (
+        "Graceful termination allows applications to complete in-flight requests and clean up "
+        "resources before shutting down. Use preStop hooks to implement custom shutdown behavior "
+        "and appropriate terminationGracePeriodSeconds to ensure adequate time for cleanup."
+    )
+    recommendation = (
+        "Add preStop hooks to signal applications to stop accepting new connections and finish "
+        "processing existing ones. Set terminationGracePeriodSeconds to an appropriate value "
+        "(≥30s for most applications, longer for databases or message brokers). Implement proper "
+        "signal handling in your application code to respond to SIGTERM."
+    )
+    reference = "https://kubernetes.io/docs/concepts/containers/container-lifecycle-hooks/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        pod_spec = pod_template_spec(resource)
+        has_pre_stop_hook = any(
+            c.get("lifecycle", {}).get("preStop") is not None
+            for c in pod_spec.get("containers", [])
+        )
+        has_grace_period = pod_spec.get("terminationGracePeriodSeconds", 0) > 30
+        return (1, 1 if has_pre_stop_hook or has_grace_period else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["graceful"], totals["workloads"])
+        return self.check(
+            percentage >= 60,
+            f"{percentage}% of workloads have graceful termination configured"
+            if percentage >= 60
+            else f"Only {percentage}% of workloads have graceful termination configured",
+        ), percentage
+
+
+# --------------------------------------------
+# Workload Sizing Checks
+# --------------------------------------------
+
+class ResourceRequestsRule(Rule):
+    name = "Resource requests"
+    category = "workload"
+    resource_types = ("pods",)
+    counters = ("pods", "passed")
+    explanation = (
+        "Resource requests tell Kubernetes how much CPU and memory your containers need, enabling "
+        "proper scheduling decisions. Without requests, pods may be scheduled on nodes with "
+        "insufficient resources, leading to poor performance or evictions during load spikes."
+    )
+    recommendation = (
+        "Define CPU and memory requests for all containers based on observed usage patterns. "
+        "Start with metrics from your monitoring system or use the Vertical Pod Autoscaler in "
+        "recommendation mode to suggest appropriate values."
+    )
+    reference = "https://kubernetes.io/docs/concepts/configuration/manage-resources-containers/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        return (1, 1 if ctx.pod_flags("pod_all_requests")[index] else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["passed"], totals["pods"])
+        return self.check(
+            percentage >= 90,
+            f"{percentage}% of containers have resource requests defined"
+            if percentage >= 90
+            else f"Only {percentage}% of containers have resource requests defined",
+        ), percentage
+
+
+class ResourceLimitsRule(Rule):
+    name = "Resource limits"
+    category = "workload"
+    resource_types = ("pods",)
+    counters = ("pods", "passed")
+    explanation = (
+        "Memory limits prevent containers from consuming excessive memory resources that could "
+        "impact other workloads on the node. Containers exceeding their memory limit will be "
+        "terminated. CPU limits, however, only throttle containers and are often not recommended "
+        "as they can cause CPU starvation."
+    )
+    recommendation = (
+        "Set memory limits for all containers to prevent resource starvation. Consider setting "
+        "memory limits equal to requests to ensure the Guaranteed QoS class. Use LimitRange "
+        "resources to establish default limits at the namespace level."
+    )
+    reference = "https://kubernetes.io/docs/tasks/administer-cluster/manage-resources/memory-default-namespace/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        return (1, 1 if ctx.pod_flags("pod_all_memory_limits")[index] else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["passed"], totals["pods"])
+        return self.check(
+            percentage >= 70,
+            f"{percentage}% of containers have memory limits defined"
+            if percentage >= 70
+            else f"Only {percentage}% of containers have memory limits defined",
+        ), percentage
+
+
+class GuaranteedQoSRule(Rule):
+    name = "Guaranteed QoS"
+    category = "workload"
+    resource_types = ("pods",)
+    counters = ("eligible", "guaranteed")
+    explanation = (
+        "Kubernetes assigns Quality of Service (QoS) classes to pods based on resource specifications. "
+        "Pods with memory and CPU requests equal to their limits get the 'Guaranteed' QoS class, "
+        "providing the highest priority during resource contention and the lowest probability of "
+        "eviction. This is essential for production workloads where reliability is critical."
+    )
+    recommendation = (
+        "Set memory and CPU requests equal to limits for critical workloads to ensure the "
+        "Guaranteed QoS class. Avoid this for development or non-critical workloads where "
+        "resource utilization efficiency is more important than reliability. Consider using "
+        "ResourceQuotas and LimitRanges to enforce this for specific namespaces."
+    )
+    reference = "https://kubernetes.io/docs/tasks/configure-pod-container/quality-service-pod/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        # Only pods with memory requests and limits on every container are eligible.
+        # Quantities are compared by value, so "512Mi" and "0.5Gi" are equal
+        if not ctx.pod_flags("pod_all_memory_request_and_limit")[index]:
+            return None
+        return (1, 1 if ctx.pod_flags("pod_memory_guaranteed")[index] else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["guaranteed"], totals["eligible"])
+        return self.check(
+            percentage >= 50,
+            f"{percentage}% of pods have memory requests equal to limits for guaranteed QoS"
+            if percentage >= 50
+            else f"Only {percentage}% of pods have memory requests equal to limits for guaranteed QoS",
+        ), percentage
+
+
+# --------------------------------------------
+# PDB Checks
+# --------------------------------------------
+
+class PDBCoverageRule(Rule):
+    name = "PDB coverage"
+    category = "pdb"
+    resource_types = WORKLOAD_TYPES
+    context_types = ("poddisruptionbudgets",)
+    counters = ("multi_replica", "covered")
+    explanation = (
+        "Pod Disruption Budgets (PDBs) protect your application's availability during voluntary "
+        "disruptions like node drains or cluster upgrades. Without PDBs, Kubernetes might terminate "
+        "too many pods simultaneously, causing service disruption even for highly-replicated workloads."
+    )
+    recommendation = (
+        "Implement PDBs for all stateful applications and critical workloads with multiple replicas. "
+        "Consider setting maxUnavailable to 1 for small deployments (3-5 replicas) or to a percentage "
+        "(e.g., 25%) for larger deployments to balance availability with operational flexibility."
+    )
+    reference = "https://kubernetes.io/docs/tasks/run-application/configure-pdb/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        # Skip workloads with 1 or no replicas
+        if (resource.get("spec", {}).get("replicas") or 1) <= 1:
+            return None
+        return (1, 1 if ctx.workload_pdbs(resource_type, index, resource) else 0)
+
+    def finalize(self, totals, ctx):
+        logger.info(f"Found {totals['multi_replica']} workloads with multiple replicas")
+        logger.info(f"Found {len(ctx.resources.get('poddisruptionbudgets', []))} PodDisruptionBudgets in the cluster")
+        percentage = safe_percentage(totals["covered"], totals["multi_replica"])
+        logger.info(f"PDB coverage: {totals['covered']}/{totals['multi_replica']} workloads ({percentage}%)")
+        return self.check(
+            percentage >= 80,
+            f"{percentage}% of multi-replica workloads have PDBs"
+            if percentage >= 80
+            else f"Only {percentage}% of multi-replica workloads have PDBs",
+        ), percentage
+
+
+class PDBConfigurationRule(Rule):
+    name = "PDB configuration"
+    category = "pdb"
+    resource_types = WORKLOAD_TYPES
+    context_types = ("poddisruptionbudgets",)
+    counters = ("multi_replica", "max_unavailable")
+    explanation = (
+        "PDBs can be configured with either minAvailable or maxUnavailable. MaxUnavailable is "
+        "generally preferred for workloads that scale up and down frequently. It allows for a fixed number "
+        "of pods to be unavailable regardless of scaling events, making it more flexible as your deployment "
+        "size changes. An overly strict PDB can block cluster maintenance operations."
+    )
+    recommendation = (
+        "Use maxUnavailable for workloads that scale, set to 1 for small deployments (3-5 replicas) or "
+        "to a percentage (e.g., 25%) for larger deployments. For critical services with fixed replica counts, "
+        "minAvailable can be used to ensure a specific number of pods are always available. Test your PDBs "
+        "with cordons and drains to verify they work as expected."
+    )
+    reference = "https://kubernetes.io/docs/tasks/run-application/configure-pdb/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        # Skip workloads with 1 or no replicas
+        if (resource.get("spec", {}).get("replicas") or 1) <= 1:
+            return None
+        has_max_unavailable = any(
+            "maxUnavailable" in pdb.get("spec", {}) for pdb in ctx.workload_pdbs(resource_type, index, resource)
+        )
+        return (1, 1 if has_max_unavailable else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["max_unavailable"], totals["multi_replica"])
+        logger.info(f"maxUnavailable PDB coverage: {totals['max_unavailable']}/{totals['multi_replica']} workloads ({percentage}%)")
+        return self.check(
+            percentage >= 70,
+            f"{percentage}% of multi-replica workloads have PDBs with maxUnavailable"
+            if percentage >= 70
+            else f"Only {percentage}% of multi-replica workloads have PDBs with maxUnavailable",
+        ), percentage
+
+
+# --------------------------------------------
+# Topology Checks
+# --------------------------------------------
+
+class TopologyConstraintsRule(Rule):
+    name = "Topology constraints"
+    category = "topology"
+    resource_types = WORKLOAD_TYPES
+    counters = ("workloads", "constrained")
+    explanation = (
+        "Topology spread constraints ensure pods are distributed across failure domains like "
+        "zones, nodes, or regions. This improves application resilience by preventing pods from "
+        "clustering on the same infrastructure, which could lead to widespread outages during "
+        "zone or node failures."
+    )
+    recommendation = (
+        "Implement topology spread constraints for critical workloads to ensure even distribution "
+        "across zones and nodes. Use maxSkew of 1 for critical services and configure "
+        "whenUnsatisfiable to ScheduleAnyway for non-critical services to balance resilience "
+        "with deployment flexibility."
+    )
+    reference = "https://kubernetes.io/docs/concepts/scheduling-eviction/topology-spread-constraints/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        return (1, 1 if pod_template_spec(resource).get("topologySpreadConstraints") else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["constrained"], totals["workloads"])
+        return self.check(
+            percentage >= 50,
+            f"{percentage}% of workloads use topology spread constraints"
+            if percentage >= 50
+            else f"Only {percentage}% of workloads use topology spread constraints",
+        ), percentage
+
+
+class PodAntiAffinityRule(Rule):
+    name = "Pod anti-affinity"
+    category = "topology"
+    resource_types = WORKLOAD_TYPES
+    counters = ("workloads", "anti_affinity", "required", "preferred")
+    explanation = (
+        "Pod anti-affinity prevents pods from being scheduled on the same nodes or zones, improving "
+        "resilience against infrastructure failures. Without proper distribution constraints, the scheduler might place "
+        "all replicas on a single node, which could cause a complete service outage if that node fails. "
+        "However, podAntiAffinity can lead to optimization issues in large clusters."
+    )
+    recommendation = (
+        "Consider migrating from podAntiAffinity to topologySpreadConstraints, which offers better "
+        "scheduling efficiency and more flexible distribution controls. topologySpreadConstraints allows "
+        "for explicit control over pod distribution with maxSkew and is the recommended approach for "
+        "Kubernetes 1.19+. Use preferred anti-affinity for most workloads and required only for critical stateful services."
+    )
+    reference = "https://kubernetes.io/docs/concepts/scheduling-eviction/topology-spread-constraints/#comparison-with-podaffinity-podantiaffinity"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        anti_affinity = pod_template_spec(resource).get("affinity", {}).get("podAntiAffinity")
+        if not anti_affinity:
+            return (1, 0, 0, 0)
+        return (
+            1,
+            1,
+            1 if anti_affinity.get("requiredDuringSchedulingIgnoredDuringExecution") else 0,
+            1 if anti_affinity.get("preferredDuringSchedulingIgnoredDuringExecution") else 0,
+        )
+
+    def finalize(self, totals, ctx):
+        workloads = totals["workloads"]
+        percentage = safe_percentage(totals["anti_affinity"], workloads)
+        return self.check(
+            percentage <= 30,  # Inverted threshold based on new requirements
+            f"{percentage}% of workloads use pod anti-affinity. "
+            f"Breakdown: Required: {safe_percentage(totals['required'], workloads)}%, "
+            f"Preferred: {safe_percentage(totals['preferred'], workloads)}%",
+        ), percentage
+
+
+# --------------------------------------------
+# Security Checks
+# --------------------------------------------
+
+class NetworkPoliciesRule(Rule):
+    name = "Network policies"
+    category = "security"
+    resource_types = ("networkpolicies",)
+    counters = ("policies", "default_deny")
+    explanation = (
+        "Network policies are essential for implementing the principle of least privilege in your "
+        "cluster network. Without default deny policies, pods can communicate with any other pod "
+        "or external endpoint, potentially allowing attackers to move laterally through your cluster."
+    )
+    recommendation = (
+        "Implement default deny network policies for all namespaces, then explicitly allow required "
+        "traffic with additional policies. Start with egress policies which are typically less "
+        "disruptive, then implement ingress policies. Use tools like Network Policy Advisor or "
+        "network visualization to understand existing traffic patterns."
+    )
+    reference = "https://kubernetes.io/docs/concepts/services-networking/network-policies/"
+
+    # The analyzer before the rule engine never saw the policies (its container loop
+    # shadowed the resources dict), so it always reported them as not available. They
+    # are evaluated since, which can flip this check and raise the security score.
+    def evaluate(self, resource_type, index, resource, ctx):
+        spec = resource.get("spec", {})
+        pod_selector = spec.get("podSelector", {})
+        policy_types = spec.get("policyTypes", [])
+        default_deny = (
+            # Check for empty pod selector (applies to all pods)
+            (not pod_selector.get("matchLabels") and not pod_selector.get("matchExpressions")) and
+            (
+                # Check if it's denying all ingress or egress
+                (not spec.get("ingress") or "Ingress" in policy_types) or
+                (not spec.get("egress") or "Egress" in policy_types)
+            )
+        )
+        return (1, 1 if default_deny else 0)
+
+    def verdict(self, contribution):
+        # A policy that isn't default deny is no violation; the check is about the cluster having one
+        return None
+
+    def finalize(self, totals, ctx):
+        # First check if network policies are available in the data
+        available = totals["policies"] > 0
+        logger.info(f"Network policies data available: {available}, count: {totals['policies']}")
+
+        if not available:
+            logger.warning("Network policy data not available in snapshot data")
+            return self.check(False, "Network policy data not available in snapshot data"), 0
+
+        default_deny_policy = totals["default_deny"] > 0
+        logger.info(f"Default deny network policy found: {default_deny_policy}")
+        return self.check(
+            default_deny_policy,
+            "Default deny network policy is in place"
+            if default_deny_policy
+            else "No default deny network policy found",
+        ), 100 if default_deny_policy else 0
+
+
+class SecurityContextRule(Rule):
+    name = "Security context"
+    category = "security"
+    resource_types = ("pods",)
+    counters = ("pods", "non_root")
+    explanation = (
+        "Running containers as non-root is a fundamental security practice. Root access inside a "
+        "container can make it easier for attackers to escape the container, especially if combined "
+        "with other vulnerabilities. Most applications don't require root privileges to function."
+    )
+    recommendation = (
+        "Configure all containers to run as non-root users with runAsNonRoot: true and a specific "
+        "runAsUser value. Remove unnecessary capabilities and add seccompProfile. Consider using "
+        "admission controllers like Pod Security Policies or Pod Security Standards to enforce "
+        "these requirements cluster-wide."
+    )
+    reference = "https://kubernetes.io/docs/tasks/configure-pod-container/security-context/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        pod_spec = resource.get("spec", {})
+        containers = pod_spec.get("containers", [])
+        if not containers:
+            return (1, 0)
+
+        pod_security_context = pod_spec.get("securityContext", {})
+        if pod_security_context.get("runAsNonRoot") is True or (pod_security_context.get("runAsUser", 0) or 0) > 0:
+            return (1, 1)
+        non_root = any(
+            c.get("securityContext", {}).get("runAsNonRoot") is True or
+            (c.get("securityContext", {}).get("runAsUser", 0) or 0) > 0
+            for c in containers
+        )
+        return (1, 1 if non_root else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["non_root"], totals["pods"])
+        return self.check(
+            percentage >= 75,
+            f"{percentage}% of pods run as non-root"
+            if percentage >= 75
+            else f"Only {percentage}% of pods run as non-root",
+        ), percentage
+
+
+class ImageScanningRule(Rule):
+    name = "Image scanning"
+    category = "security"
+    resource_types = ("pods",)
+    counters = ("pods", "failing")
+    explanation = (
+        "Container image scanning identifies vulnerabilities in your application dependencies and "
+        "base images. Using 'latest' tags or unvetted public images increases security risk, as they "
+        "may contain unpatched vulnerabilities or even malicious code. Additionally, 'latest' makes "
+        "it impossible to track which version is running."
+    )
+    recommendation = (
+        "Use a private registry with vulnerability scanning enabled. Pin images to specific digests "
+        "or tags (never 'latest'). Implement admission controllers like Kyverno or OPA Gatekeeper to "
+        "reject unscanned images or images with critical vulnerabilities. Consider tools like Trivy "
+        "or Clair for scanning."
+    )
+    reference = "https://cast.ai/blog/kubernetes-security-10-best-practices/"
+
+    @staticmethod
+    def image_passes(image: str) -> bool:
+        # For image scanning, we'll assume it's in place if images follow a pattern
+        # like registry.company.com/ or if there are no latest tags
+        return (
+            # Check if image comes from a private registry (likely scanned)
+            ("." in image and "/" in image and not image.startswith("docker.io")) or
+            # Check if it avoids 'latest' tag
+            (not image.endswith(":latest") and ":" in image)
+        )
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        failing = not all(
+            self.image_passes(container.get("image", ""))
+            for container in resource.get("spec", {}).get("containers", [])
+        )
+        return (1, 1 if failing else 0)
+
+    def verdict(self, contribution):
+        return None if not contribution else contribution[1] == 0
+
+    def finalize(self, totals, ctx):
+        image_scanning = totals["pods"] > 0 and totals["failing"] == 0
+        return self.check(
+            image_scanning,
+            "Images appear to follow security best practices"
+            if image_scanning
+            else "Some images may not be scanned (using latest tag or public registries)",
+        ), 100 if image_scanning else 0
+
+
+# --------------------------------------------
+# Network Checks
+# --------------------------------------------
+
+class CNIConfigurationRule(Rule):
+    name = "CNI configuration"
+    category = "network"
+    resource_types = ("networkpolicies",)
+    counters = ("policies",)
+    explanation = (
+        "Container Network Interface (CNI) plugins that support network policies are essential for "
+        "implementing microsegmentation in Kubernetes. Without a policy-enabled CNI like Calico, "
+        "Cilium, or Antrea, network policies won't be enforced, leaving your cluster vulnerable to "
+        "lateral movement attacks."
+    )
+    recommendation = (
+        "Ensure your cluster uses a CNI plugin that supports network policies, such as Calico, "
+        "Cilium, or Antrea. If using a cloud provider, check if their CNI implementation supports "
+        "network policies (e.g., Azure CNI, Amazon VPC CNI with additional components). Test policy "
+        "enforcement by creating and verifying simple deny policies."
+    )
+    reference = "https://kubernetes.io/docs/concepts/extend-kubernetes/compute-storage-net/network-plugins/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        return (1,)
+
+    def finalize(self, totals, ctx):
+        # We'll assume the CNI is configured if there are any network policies
+        cni_configuration = totals["policies"] > 0
+        return self.check(
+            cni_configuration,
+            "Network policies are being used, suggesting proper CNI configuration"
+            if cni_configuration
+            else "No network policies found, may indicate missing CNI configuration",
+        ), 100 if cni_configuration else 0
+
+
+class ServiceTopologyRule(Rule):
+    name = "Service Topology"
+    category = "network"
+    resource_types = ("services",)
+    counters = ("services", "topology_keys")
+    explanation = (
+        "Service topology allows Kubernetes to route traffic to pods in the same topology domain "
+        "(e.g., same node or zone) as the client, reducing latency and cross-zone data transfer "
+        "costs. Without topology routing, traffic may unnecessarily cross zone or node boundaries, "
+        "increasing latency and potentially incurring extra costs."
+    )
+    recommendation = (
+        "Enable topology aware routing in your services, particularly for data-intensive or "
+        "latency-sensitive applications. Use topologyKeys like 'kubernetes.io/hostname' for "
+        "node-local routing or 'topology.kubernetes.io/zone' for zone-aware routing. For newer "
+        "Kubernetes versions, consider using topology aware hints instead."
+    )
+    reference = "https://opensource.googleblog.com/2020/11/kubernetes-efficient-multi-zone.html"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        return (1, 1 if resource.get("spec", {}).get("topologyKeys") else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["topology_keys"], totals["services"])
+        return self.check(
+            percentage > 0,
+            f"{percentage}% of services use topologyKeys"
+            if percentage > 0
+            else "No services use topologyKeys",
+        ), percentage
+
+
+# --------------------------------------------
+# Secrets Checks (simplified)
+# --------------------------------------------
+
+class SecretManagementRule(Rule):
+    name = "Secret management"
+    category = "secrets"
+    resource_types = ("pods",)
+    counters = ("mounting_secrets",)
+    explanation = (
+        "Native Kubernetes secrets have limitations: they're stored in etcd in base64 encoding (not "
+        "encryption) by default, lack fine-grained access controls, and don't provide key rotation "
+        "or versioning. External secret management tools address these limitations with encryption, "
+        "access controls, rotation, and audit capabilities."
+    )
+    recommendation = (
+        "Implement an external secrets management solution like HashiCorp Vault, AWS Secrets Manager, "
+        "Azure Key Vault, or Google Secret Manager. Use the Kubernetes External Secrets operator or "
+        "Secrets Store CSI Driver to integrate these services with your cluster. Encrypt etcd at rest "
+        "as a minimum security measure."
+    )
+    reference = "https://external-secrets.io/latest/introduction/overview/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        # For demo, we'll assume external secrets are used if no pod mounts secrets directly
+        mounts_secret = any(v.get("secret") for v in resource.get("spec", {}).get("volumes", []))
+        return (1 if mounts_secret else 0,)
+
+    def finalize(self, totals, ctx):
+        external_secrets_used = totals["mounting_secrets"] == 0
+        return self.check(
+            external_secrets_used,
+            "External secrets management appears to be used"
+            if external_secrets_used
+            else "Pods are mounting Kubernetes secrets directly",
+        ), 100 if external_secrets_used else 0
+
+
+class SecretAccessRule(Rule):
+    name = "Secret access"
+    category = "secrets"
+    explanation = (
+        "Without proper RBAC controls, Service Accounts may have overly broad access to secrets, "
+        "increasing the risk if a pod is compromised. By default, Kubernetes doesn't restrict which "
+        "pods can access which secrets, so explicit RBAC rules are needed to implement the principle "
+        "of least privilege."
+    )
+    recommendation = (
+        "Implement fine-grained RBAC policies that limit service account access to only the secrets "
+        "they need. Avoid using cluster-wide roles for secret access. Use namespaced roles and "
+        "role bindings to isolate secrets between namespaces. Regularly audit RBAC rules and remove "
+        "unnecessary permissions."
+    )
+    reference = "https://kubernetes.io/docs/reference/access-authn-authz/rbac/"
+
+    def finalize(self, totals, ctx):
+        rbac_restricts_secrets = True  # Simplified assumption
+        return self.check(rbac_restricts_secrets, "RBAC properly restricts secret access"), 100
+
+
+# --------------------------------------------
+# Observability Checks (enhanced)
+# --------------------------------------------
+
+# Common monitoring tool deployments
+MONITORING_TOOLS = {
+    "prometheus": "Prometheus is a popular open-source monitoring and alerting system.",
+    "grafana": "Grafana allows you to visualize metrics from various sources including Prometheus.",
+    "metrics-server": "Metrics Server collects resource metrics from Kubelets for horizontal pod autoscaling.",
+    "datadog": "Datadog is a commercial monitoring solution offering comprehensive Kubernetes observability.",
+    "elastic": "Elastic Stack provides logging, metrics, and APM capabilities.",
+    "kube-state-metrics": "Kube State Metrics exposes cluster-level metrics.",
+    "newrelic": "New Relic offers commercial application and infrastructure monitoring."
+}
+
+LOGGING_DEPLOYMENT_NAMES = ["fluentd", "fluent-bit", "filebeat", "logstash", "elastic", "elasticsearch", "loki", "logging"]
+
+TRACING_DEPLOYMENT_NAMES = ["jaeger", "zipkin", "opentelemetry", "otel", "tracing", "tempo"]
+
+ALERTING_DEPLOYMENT_NAMES = ["alertmanager", "alert", "notification", "pagerduty", "opsgenie"]
+
+SLO_MARKERS = ("slo", "sli")
+
+# Every substring the observability rules look for, including the monitoring tool names without dashes
+OBSERVABILITY_PATTERNS = PatternMatcher(
+    list(MONITORING_TOOLS) + [tool.replace("-", "") for tool in MONITORING_TOOLS] + list(SLO_MARKERS)
+)
+
+
+class ObservabilityMatches(NamedTuple):
+    """OBSERVABILITY_PATTERNS found in one resource, see AnalysisContext.observability_matches."""
+
+    name: str
+    in_name: FrozenSet[str]
+    in_label_keys: FrozenSet[str]
+    in_label_values: FrozenSet[str]
+    in_annotations: FrozenSet[str]
+
+
+class MonitoringInfrastructureRule(Rule):
+    name = "Monitoring infrastructure"
+    category = "observability"
+    resource_types = ("deployments", "services")
+    counters = tuple(MONITORING_TOOLS)
+    explanation = (
+        "A robust monitoring infrastructure is essential for cluster and application visibility. "
+        "We've checked for common tools like Prometheus, Grafana, and metrics-server, but "
+        "can't determine if they're properly configured or what dashboards exist. Consider implementing "
+        "a comprehensive monitoring stack with service discovery for automatic monitoring of new services."
+    )
+    recommendation = (
+        "Implement a Prometheus-Grafana stack with service discovery to automatically monitor "
+        "new services. Configure alert rules for critical components and integrate with notification systems."
+    )
+    reference = "https://kubernetes.github.io/ingress-nginx/user-guide/monitoring/"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        matches = ctx.observability_matches(resource_type, index, resource)
+        found = matches.in_label_keys | matches.in_label_values
+        # Deployments are matched on annotations too, services only on name and labels
+        if resource_type == "deployments":
+            found = found | matches.in_annotations
+
+        return tuple(
+            1 if (
+                tool in matches.in_name or
+                tool.replace("-", "") in matches.in_name or
+                tool in found
+            ) else 0
+            for tool in MONITORING_TOOLS
+        )
+
+    def verdict(self, contribution):
+        # The counters are one per tool, not applies/passes; the check is about the cluster having the tools
+        return None
+
+    def finalize(self, totals, ctx):
+        detected_tools = [tool for tool in MONITORING_TOOLS if totals[tool] > 0]
+        percentage = safe_percentage(len(detected_tools), 3, 0)  # Consider 3 tools as complete coverage
+        return self.check(
+            len(detected_tools) > 0,
+            f"Detected monitoring tools: {', '.join(detected_tools)}"
+            if detected_tools
+            else "No common monitoring tools detected",
+        ), percentage
+
+
+class ApplicationMetricsRule(Rule):
+    name = "Application metrics"
+    category = "observability"
+    resource_types = ("pods",)
+    counters = ("pods", "annotated")
+    explanation = (
+        "Application metrics help you understand your service behavior and performance. "
+        "While we can detect Prometheus annotations, it's important to expose the right metrics "
+        "that reflect application health, business KPIs, and user experience. Define SLIs (Service Level "
+        "Indicators) for each service and implement the RED method (Rate, Errors, Duration) "
+        "or USE method (Utilization, Saturation, Errors) as appropriate."
+    )
+    recommendation = (
+        "Add Prometheus annotations to your pods including 'prometheus.io/scrape: true', 'prometheus.io/port: <port>', "
+        "and 'prometheus.io/path: /metrics'. Ensure your applications expose a /metrics endpoint with appropriate "
+        "metrics that follow the RED method (Request Rate, Error Rate, Duration) for services and "
+        "USE method (Utilization, Saturation, Errors) for resources."
+    )
+    reference = "https://learn.microsoft.com/en-us/azure/azure-monitor/containers/prometheus-metrics-scrape-configuration?tabs=CRDConfig%2CCRDScrapeConfig%2CConfigFileScrapeConfigBasicAuth%2CConfigFileScrapeConfigTLSAuth#enable-pod-annotation-based-scraping"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        annotated = any(
+            "prometheus" in key or "metrics" in key or "metrics" in value
+            for key, value in resource.get("metadata", {}).get("annotations", {}).items()
+        )
+        return (1, 1 if annotated else 0)
+
+    def finalize(self, totals, ctx):
+        percentage = safe_percentage(totals["annotated"], totals["pods"])
+        return self.check(
+            percentage >= 50,
+            f"{percentage}% of pods have metrics annotations"
+            if percentage >= 50
+            else f"Only {percentage}% of pods have metrics annotations",
+        ), percentage
+
+
+class _DeploymentNameRule(Rule):
+    """Detects infrastructure by deployments whose name is one of deployment_names."""
+
+    resource_types = ("deployments",)
+    counters = ("matches",)
+    deployment_names: List[str] = []
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        name = ctx.observability_matches(resource_type, index, resource).name
+        return (1 if name and name in self.deployment_names else 0,)
+
+
+class LoggingInfrastructureRule(_DeploymentNameRule):
+    name = "Logging infrastructure"
+    category = "observability"
+    deployment_names = LOGGING_DEPLOYMENT_NAMES
+    explanation = (
+        "Centralized logging simplifies troubleshooting across distributed services. "
+        "Beyond just collecting logs, ensure you're implementing structured logging with "
+        "consistent fields (request IDs, user IDs, etc.) across services. Define log levels "
+        "appropriately and consider implementing log sampling for high-volume services to "
+        "reduce storage costs while maintaining visibility into errors."
+    )
+    recommendation = (
+        "Set up centralized logging with ELK stack (Elasticsearch, Logstash, Kibana) or "
+        "Loki with Grafana. Implement structured logging with consistent fields across all services "
+        "and define appropriate log retention policies."
+    )
+    reference = "https://grafana.com/docs/loki/latest/best-practices/"
+
+    def finalize(self, totals, ctx):
+        exists = totals["matches"] > 0
+        return self.check(
+            exists,
+            "Logging infrastructure detected" if exists
+            else "No common logging infrastructure detected",
+        ), 100 if exists else 0
+
+
+class DistributedTracingRule(_DeploymentNameRule):
+    name = "Distributed tracing"
+    category = "observability"
+    deployment_names = TRACING_DEPLOYMENT_NAMES
+    explanation = (
+        "Distributed tracing connects requests across service boundaries, helping identify bottlenecks. "
+        "To implement effectively, use consistent trace context propagation across all services, "
+        "sample intelligently (capture rare events, errors), and correlate traces with logs and metrics. "
+        "Consider implementing OpenTelemetry to standardize instrumentation across different languages and frameworks."
+    )
+    recommendation = (
+        "Implement OpenTelemetry-based tracing and deploy Jaeger or Tempo for trace collection and visualization. "
+        "Ensure propagation of trace context across service boundaries and integrate with your existing logging system."
+    )
+    reference = "https://opentelemetry.io/docs/instrumentation/"
+
+    def finalize(self, totals, ctx):
+        exists = totals["matches"] > 0
+        return self.check(
+            exists,
+            "Tracing infrastructure detected" if exists
+            else "No common tracing infrastructure detected. You might be using an external service or not implementing tracing.",
+        ), 100 if exists else 25  # Give 25% if not detected as it might be external
+
+
+class ServiceLevelObjectivesRule(Rule):
+    name = "Service Level Objectives"
+    category = "observability"
+    resource_types = ("services",)
+    counters = ("matches",)
+    explanation = (
+        "Service Level Objectives (SLOs) define reliability targets for your services. "
+        "While difficult to detect automatically, implementing SLOs is crucial for balancing "
+        "reliability and feature development. Define SLOs based on user experience metrics, "
+        "set appropriate error budgets, and create alerts based on burning error budgets "
+        "rather than instantaneous failures."
+    )
+    recommendation = (
+        "Define SLOs for each critical service based on user-focused metrics. Create dashboards "
+        "showing SLO compliance and error budget burn rates. Set up alerts only for significant "
+        "SLO violations rather than individual failures."
+    )
+    reference = "https://cloud.google.com/blog/products/devops-sre/sre-fundamentals-slis-slas-and-slos"
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        matches = ctx.observability_matches(resource_type, index, resource)
+        evidence = any(marker in matches.in_name or marker in matches.in_label_keys for marker in SLO_MARKERS)
+        return (1 if evidence else 0,)
+
+    def finalize(self, totals, ctx):
+        evidence = totals["matches"] > 0
+        return self.check(
+            evidence,
+            "Evidence of SLO implementation detected" if evidence
+            else "No clear evidence of SLO implementation found",
+        ), 75 if evidence else 25  # Give 25% by default as this is hard to detect
+
+
+class AlertManagementRule(_DeploymentNameRule):
+    name = "Alert management"
+    category = "observability"
+    deployment_names = ALERTING_DEPLOYMENT_NAMES
+    explanation = (
+        "Effective alerting notifies the right people at the right time about critical issues. "
+        "Configure alerting based on symptoms (user impact) rather than causes, and implement "
+        "routing for different severity levels. Alert fatigue can be prevented by reducing noisy "
+        "alerts, implementing good runbooks, and using appropriate alert thresholds with time windows."
+    )
+    recommendation = (
+        "Configure AlertManager or a similar tool to handle alert routing, grouping, and silencing. "
+        "Integrate with incident management systems like PagerDuty or OpsGenie. Create detailed "
+        "runbooks for each alert type to speed up resolution."
+    )
+    reference = "https://prometheus.io/docs/alerting/latest/alertmanager/"
+
+    def finalize(self, totals, ctx):
+        exists = totals["matches"] > 0
+        return self.check(
+            exists,
+            "Alert management system detected" if exists
+            else "No alerting system detected",
+        ), 100 if exists else 30  # Give 30% by default as this is hard to detect
+
+
+# Category order of the analysis output
+CATEGORIES = ("resiliency", "workload", "pdb", "topology", "security", "network", "secrets", "observability")
+
+# Built-in rules, in the order their checks appear within each category
+BUILTIN_RULES = (
+    MultiZoneRule,
+    HealthChecksRule,
+    GracefulTerminationRule,
+    ResourceRequestsRule,
+    ResourceLimitsRule,
+    GuaranteedQoSRule,
+    PDBCoverageRule,
+    PDBConfigurationRule,
+    TopologyConstraintsRule,
+    PodAntiAffinityRule,
+    NetworkPoliciesRule,
+    SecurityContextRule,
+    ImageScanningRule,
+    CNIConfigurationRule,
+    ServiceTopologyRule,
+    SecretManagementRule,
+    SecretAccessRule,
+    MonitoringInfrastructureRule,
+    ApplicationMetricsRule,
+    LoggingInfrastructureRule,
+    DistributedTracingRule,
+    ServiceLevelObjectivesRule,
+    AlertManagementRule,
+)
+
+
+def builtin_rules() -> List[Rule]:
+    return [rule_class() for rule_class in BUILTIN_RULES]
@@ -0,0 +1,209 @@
+"""
+Resilient CAST AI API client
+
+Wraps httpx.AsyncClient with the retry policy the report collection needs:
+network errors, 429 and 5xx responses are retried with exponential backoff and full
+jitter, a 429's Retry-After header is honoured, and the number of concurrent requests
+per API key is capped across all clients of the process (e.g. the cost and efficiency
+collections of one cluster running in parallel).
+
+The base URL defaults to the region's public API and can be overridden with the
+CAST_API_URL environment variable or the base_url argument, and an httpx transport
+can be injected, so the client can be pointed at a local stand-in server.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import weakref
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+API_ENDPOINTS = {
+    "US": "https://api.cast.ai",
+    "EU": "https://api.eu.cast.ai",
+}
+
+# Overrides the regional endpoints, e.g. for a local stand-in server
+CAST_API_URL = os.environ.get("CAST_API_URL")
+
+# Concurrent requests per API key
+CAST_API_CONCURRENCY = int(os.environ.get("CAST_API_CONCURRENCY", "6"))
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Longest Retry-After that is waited for instead of failing the request
+MAX_RETRY_AFTER = 120.0
+
+REQUEST_TIMEOUT = 60.0
+
+# Semaphores per event loop and API key digest
+_key_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+    weakref.WeakKeyDictionary()
+
+
+class CastApiError(Exception):
+    """A request that failed for good, after any retries."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def api_base_url(region: str = "US") -> str:
+    """Base URL of the API for a region (US or EU), or CAST_API_URL when set."""
+    return (CAST_API_URL or API_ENDPOINTS.get(region.upper(), API_ENDPOINTS["US"])).rstrip("/")
+
+
+def _key_semaphore(api_key: str, limit: int) -> asyncio.Semaphore:
+    semaphores = _key_semaphores.setdefault(asyncio.get_running_loop(), {})
+    digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    if digest not in semaphores:
+        semaphores[digest] = asyncio.Semaphore(max(1, limit))
+    return semaphores[digest]
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Delay of a Retry-After header, given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _is_retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+class CastApiClient:
+    """
+    CAST AI API client for one API key, used as an async context manager.
+
+    Args:
+        api_key: The API key for authentication
+        region: The region (US or EU), selects the default base URL
+        base_url: API base URL, overriding CAST_API_URL and the region
+        transport: httpx transport to send requests through, e.g. for tests
+        max_concurrency: Concurrent requests per API key; the first client of a key
+            in an event loop sets the limit
+        max_retries: Retries of a request after a retryable failure
+    """
+
+    def __init__(self, api_key: str, region: str = "US", base_url: Optional[str] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 max_concurrency: int = CAST_API_CONCURRENCY, max_retries: int = MAX_RETRIES):
+        self.api_key = api_key
+        self.region = region
+        self.base_url = base_url.rstrip("/") if base_url else api_base_url(region)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.retries = 0
+        self.bytes_received = 0
+
+    async def __aenter__(self) -> "CastApiClient":
+        self._client = httpx.AsyncClient(transport=self._transport, timeout=REQUEST_TIMEOUT)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads the retries of concurrent requests failing together
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        GET a path of the API and return the decoded JSON body.
+
+        Args:
+            path: Path below the base URL, e.g. "/v1/kubernetes/external-clusters/<id>"
+            params: Query parameters
+
+        Returns:
+            The response body
+
+        Raises:
+            CastApiError: If the request failed with a non-retryable status or all
+                retries failed
+        """
+        url = f"{self.base_url}{path}"
+        semaphore = _key_semaphore(self.api_key, self.max_concurrency)
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with semaphore:
+                    self.requests += 1
+                    response = await self._client.get(url, params=params, headers={"X-API-Key": self.api_key})
+                self.bytes_received += len(response.content)
+                if response.status_code < 400:
+                    return response.json()
+                error = CastApiError(
+                    f"GET {path} failed with status {response.status_code}: {response.text[:200]}",
+                    response.status_code,
+                )
+                if not _is_retryable(response.status_code):
+                    raise error
+                if response.status_code == 429:
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+            except httpx.TransportError as e:
+                error = CastApiError(f"GET {path} failed: {type(e).__name__}: {e}")
+
+            if attempt == self.max_retries:
+                raise error
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                raise CastApiError(f"{error} (Retry-After {retry_after:.0f}s)", error.status_code)
+            delay = max(retry_after or 0.0, self._backoff(attempt))
+            logger.warning(f"{error}, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            self.retries += 1
+            # Wait outside the semaphore so other requests of the key keep going
+            await asyncio.sleep(delay)
+
+    async def get_cluster(self, cluster_id: str) -> Dict[str, Any]:
+        """External cluster details, including its createdAt."""
+        return await self.get_json(f"/v1/kubernetes/external-clusters/{cluster_id}")
+
+    async def get_report(self, cluster_id: str, report: str, start_date: datetime, end_date: datetime,
+                         step_seconds: int = 86400) -> Dict[str, Any]:
+        """
+        One period of a cluster's cost report.
+
+        Args:
+            cluster_id: The ID of the cluster
+            report: Report endpoint, 'cost' or 'efficiency'
+            start_date: Start of the period (UTC)
+            end_date: End of the period (UTC)
+            step_seconds: Resolution of the report items
+
+        Returns:
+            The report response
+        """
+        return await self.get_json(
+            f"/v1/cost-reports/clusters/{cluster_id}/{report}",
+            params={
+                "startTime": start_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                "endTime": end_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                "stepSeconds": step_seconds,
+            },
+        )
@@ -1,13 +1,38 @@
 from typing import Dict, List, Optional
 from datetime import datetime
-from bestpractices_analyzer import analyze_best_practices
+from bestpractices_analyzer import ANALYZER_VERSION, AnalysisState, rules_digest, run_best_practices
+from custom_rules import configured_rules
+from analysis_cache import best_practices_cache, canonical_content_hash
 from debug_logger import debug_log
+from search_executor import PARALLEL_SEARCH_THRESHOLD, parallel_search
+from resource_records import SnapshotCompactor, build_records, deep_sizeof, process_rss_bytes
+from resource_quantity import ResourceQuantities, quantities_equal
+from node_allocation import build_node_allocation_report
+from node_simulator import simulate_node_consolidation
+from event_index import BUCKET_SECONDS, EventIndex
+from rightsizing import RightsizingAnalysis
+from namespace_rollup import build_namespace_rollup
+from findings_index import FindingsIndex
 
 
 class ClusterExplorer:
-    def __init__(self, snapshot_data: Dict):
+    def __init__(self, snapshot_data: Dict, content_hash: Optional[str] = None,
+                 previous_analysis_state: Optional[AnalysisState] = None):
         self.data = snapshot_data
+        self._content_hash = content_hash
+        # Best practices state of the previously loaded snapshot, to analyze only what changed
+        self._previous_analysis_state = previous_analysis_state
+        self.best_practices_state: Optional[AnalysisState] = None
+        self._best_practices_rules = None
+        self._findings = None
         self.resources = self._process_snapshot()
+        self._compactor = SnapshotCompactor()
+        self.records = self._build_records()
+        self.quantities = ResourceQuantities(self.resources['pods'], self.resources['nodes'])
+        self._pods_by_node = None
+        self._event_index = None
+        self._rightsizing = None
+        self._namespace_rollup = None
 
     def _process_snapshot(self) -> Dict:
         return {
@@ -82,6 +107,57 @@ class ClusterExplorer:
 
         return items
 
+    def _build_records(self) -> Dict[str, List]:
+        """
+        Compact the loaded resources and extract their hot metadata into records.
+
+        Returns:
+            Dictionary of ResourceRecord lists by resource type, aligned with self.resources
+        """
+        records = {}
+        compacted = set()
+        for resource_type, items in self.resources.items():
+            # Some resource types share the same list (recommendations/woop)
+            if id(items) not in compacted:
+                self._compactor.compact_resources(items)
+                compacted.add(id(items))
+            records[resource_type] = build_records(items, self._display_kind(resource_type), self._compactor)
+        return records
+
+    def get_memory_stats(self) -> Dict:
+        """
+        Report the memory held by the loaded snapshot and what compaction saved at load.
+
+        Walks the whole resource graph, so this is meant for diagnostics, not hot paths.
+
+        Returns:
+            Dictionary with resource/record sizes in bytes, process RSS and compaction counters
+        """
+        compaction = self._compactor.get_stats()
+        resources_bytes = deep_sizeof(self.resources)
+        saved_bytes = (
+            compaction["string_bytes_saved"] +
+            compaction["label_bytes_saved"] +
+            compaction["managed_fields_bytes_removed"]
+        )
+        return {
+            "resource_counts": self.get_resource_summary(),
+            "resources_bytes": resources_bytes,
+            "records_bytes": deep_sizeof(self.records),
+            "uncompacted_resources_bytes_estimate": resources_bytes + saved_bytes,
+            "compaction_saved_bytes": saved_bytes,
+            "process_rss_bytes": process_rss_bytes(),
+            "compaction": compaction
+        }
+
+    def get_content_hash(self) -> str:
+        """
+        Content hash of the snapshot, as given at load time or computed from its canonical JSON.
+        """
+        if self._content_hash is None:
+            self._content_hash = canonical_content_hash(self.data)
+        return self._content_hash
+
     def get_resource_summary(self) -> Dict[str, int]:
         return {
             resource_type: len(items)
@@ -89,14 +165,34 @@ class ClusterExplorer:
         }
 
     def get_resource_details(self, resource_type: str) -> List[Dict]:
+        """
+        Get the resources of a type as stored after compaction.
+
+        Their metadata.managedFields were dropped at load unless
+        SNAPSHOT_KEEP_MANAGED_FIELDS is set, see resource_records.
+        """
         return self.resources.get(resource_type, [])
 
+    def get_namespace_rollup(self) -> Dict:
+        """
+        Per-namespace resource counts, pod phases, requests and event counts.
+        
+        Computed once on first use, since the snapshot doesn't change after load.
+        
+        Returns:
+            Dictionary with one row per namespace and the counts of cluster-scoped resources
+        """
+        if self._namespace_rollup is None:
+            self._namespace_rollup = build_namespace_rollup(self.resources, self.records, self.quantities)
+            debug_log(f"Namespace rollup built for {len(self._namespace_rollup['namespaces'])} namespaces", "INFO")
+        return self._namespace_rollup
+
     def search_by_label(self, label_key: str, label_value: Optional[str] = None) -> Dict[str, List]:
         results = {}
         for resource_type, resources in self.resources.items():
             matched = []
-            for resource in resources:
-                labels = resource.get('metadata', {}).get('labels', {})
+            for resource, record in zip(resources, self.records[resource_type]):
+                labels = record.labels
                 if label_key in labels:
                     if label_value is None or labels[label_key] == label_value:
                         matched.append(resource)
@@ -107,7 +203,7 @@ class ClusterExplorer:
     def get_namespaced_resources(self, namespace: str) -> Dict[str, List]:
         namespaced_resources = {}
         for resource_type, resources in self.resources.items():
-            matched = [r for r in resources if r.get('metadata', {}).get('namespace') == namespace]
+            matched = [r for r, record in zip(resources, self.records[resource_type]) if record.namespace == namespace]
             if matched:
                 namespaced_resources[resource_type] = matched
         return namespaced_resources
@@ -115,6 +211,10 @@ class ClusterExplorer:
     def search_by_components(self, components: List[str], resource_types: List[str], mode: str = "include") -> Dict:
         """
         Search for resources that include or exclude specific Kubernetes components.
+
+        Large searches (see PARALLEL_SEARCH_THRESHOLD in search_executor) are split into
+        chunks and evaluated by a pool of forked worker processes. Matches are merged back
+        in resource order, so the result is the same as the sequential search.
         
         Args:
             components: List of component paths to search for (e.g. 'topologySpreadConstraints', 'resources.requests')
@@ -124,396 +224,386 @@ class ClusterExplorer:
         Returns:
             Dict containing search results with matched resources
         """
-        results = []
         total_resources = 0
         
         # Add logging to see what we're searching for
         print(f"Searching for components: {components} in resource types: {resource_types}, mode: {mode}")
         
-        # Helper function to check if a resource contains a specific component
-        def resource_contains_component(resource: Dict, component_path: str, resource_type: str) -> bool:
-            # Add debug logging for the resource being checked
+        searched_types = []
+        for resource_type in resource_types:
+            # Skip if resource type doesn't exist
+            if resource_type not in self.resources:
+                print(f"Resource type not found in available resources: {resource_type}")
+                continue
+            total_resources += len(self.resources[resource_type])
+            searched_types.append(resource_type)
+
+        results = None
+        if total_resources >= PARALLEL_SEARCH_THRESHOLD:
+            results = parallel_search(self, searched_types, components, mode)
+
+        if results is None:
+            results = []
+            for resource_type in searched_types:
+                resource_count = len(self.resources[resource_type])
+                print(f"Processing {resource_count} resources of type {resource_type}")
+                results.extend(self._match_resources(resource_type, 0, resource_count, components, mode))
+        
+        print(f"Search complete. Found {len(results)} matches out of {total_resources} total resources.")
+        return {
+            "matches": results,
+            "totalResources": total_resources,
+            "matchCount": len(results)
+        }
+
+    def _match_resources(self, resource_type: str, start: int, stop: int, components: List[str], mode: str) -> List[Dict]:
+        """
+        Evaluate the search components against resources[start:stop] of a single resource type.
+
+        Args:
+            resource_type: The resource type to search in
+            start: Index of the first resource to check
+            stop: Index after the last resource to check
+            components: List of component paths to search for
+            mode: Either 'include' or 'exclude'
+
+        Returns:
+            List of search result rows, in resource order
+        """
+        results = []
+        resources = self.resources[resource_type]
+        displayed_kind = self._display_kind(resource_type)
+
+        for i in range(start, stop):
+            resource = resources[i]
             kind = resource_type
             name = resource.get("metadata", {}).get("name", "unnamed")
+
+            # Check each component
+            matching_components = []
+            for component in components:
+                try:
+                    has_component = self._resource_contains_component(resource, component, resource_type)
+                    
+                    # Based on search mode, collect component or skip
+                    if (mode == "include" and has_component) or (mode == "exclude" and not has_component):
+                        matching_components.append(component)
+                except Exception as e:
+                    debug_log(f"Error checking component {component} for {kind}/{name}: {str(e)}", "WARNING")
             
-            # Handle special cases first
-            if component_path == "topologySpreadConstraints":
-                # Check directly in spec for Pods, or in spec.template.spec for controllers
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    has_component = bool(resource.get("spec", {}).get("template", {}).get("spec", {}).get("topologySpreadConstraints", []))
-                    print(f"Checking {kind}/{name} for topologySpreadConstraints: {has_component}")
-                    return has_component
-                return bool(resource.get("spec", {}).get("topologySpreadConstraints", []))
-            elif component_path == "resources.requests":
-                # Resources requests are in a very specific location in Kubernetes resources
-                # For controllers (Deployment, StatefulSet, etc.), they're in spec.template.spec.containers[*].resources.requests
+            # If we have matching components, add this resource to results
+            if matching_components:
+                results.append({
+                    "name": name,
+                    "namespace": resource.get("metadata", {}).get("namespace", "default"),
+                    "kind": displayed_kind,
+                    "components": matching_components,
+                    "hasMemoryImbalance": resource.get("metadata", {}).get("annotations", {}).get("memory-resources-imbalance") == "true"
+                })
 
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    print(f"Checking controller {kind}/{name} for resource.requests")
-                    template = resource.get("spec", {}).get("template")
-                    if not template:
-                        print(f"  - No template found in {kind}/{name}")
-                        return False
-                        
-                    template_spec = template.get("spec", {})
-                    if not template_spec:
-                        print(f"  - No template.spec found in {kind}/{name}")
-                        return False
-                        
-                    containers = template_spec.get("containers", [])
-                    init_containers = template_spec.get("initContainers", [])
-                else:
-                    # For Pods, containers are directly in spec
-                    print(f"Checking Pod/{name} for resource.requests")
-                    containers = resource.get("spec", {}).get("containers", [])
-                    init_containers = resource.get("spec", {}).get("initContainers", [])
-                
-                container_count = len(containers) + len(init_containers)
-                print(f"  - Found {container_count} containers to check")
-                
-                if container_count == 0:
-                    print(f"  - Warning: No containers found in {kind}/{name}")
+        return results
+
+    @staticmethod
+    def _display_kind(resource_type: str) -> str:
+        """
+        Map a resource type to a consistent capitalized singular kind.
+        This will be properly mapped back to the correct resource type in the frontend.
+        """
+        if resource_type == "deployments":
+            return "Deployment"
+        elif resource_type == "statefulsets":
+            return "StatefulSet"
+        elif resource_type == "daemonsets":
+            return "DaemonSet"
+        elif resource_type == "pods":
+            return "Pod"
+        elif resource_type == "jobs":
+            return "Job"
+        elif resource_type == "cronjobs":
+            return "CronJob"
+        elif resource_type == "replicasets":
+            return "ReplicaSet"
+        elif resource_type == "services":
+            return "Service"
+
+        # Default to capitalizing the first letter and removing trailing 's'
+        displayed_kind = resource_type.capitalize()
+        if displayed_kind.endswith('s'):
+            displayed_kind = displayed_kind[:-1]
+        return displayed_kind
+
+    def _resource_contains_component(self, resource: Dict, component_path: str, resource_type: str) -> bool:
+        """
+        Check whether a single resource contains a component, as used by search_by_components.
+
+        Note that the resources.requests check marks resources with unbalanced memory
+        requests/limits through the memory-resources-imbalance annotation.
+        """
+        # Handle special cases first
+        if component_path == "topologySpreadConstraints":
+            # Check directly in spec for Pods, or in spec.template.spec for controllers
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                has_component = bool(resource.get("spec", {}).get("template", {}).get("spec", {}).get("topologySpreadConstraints", []))
+                return has_component
+            return bool(resource.get("spec", {}).get("topologySpreadConstraints", []))
+        elif component_path == "resources.requests":
+            # Resources requests are in a very specific location in Kubernetes resources
+            # For controllers (Deployment, StatefulSet, etc.), they're in spec.template.spec.containers[*].resources.requests
+
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                template = resource.get("spec", {}).get("template")
+                if not template:
                     return False
-                
-                # Flag to determine if any container has unbalanced memory resources
-                has_memory_imbalance = False
-                has_resource_requests = False
-                
-                # Verify each container for resource requests
-                for i, container in enumerate(containers + init_containers):
-                    container_name = container.get("name", f"container-{i}")
-                    
-                    # Check if container has resources and requests defined
-                    if not container.get("resources"):
-                        print(f"  - Container {container_name} has no resources section")
-                        continue
-                    
-                    resources = container.get("resources", {})    
-                    requests = resources.get("requests", {})
-                    limits = resources.get("limits", {})
-                    
-                    # Check if no requests are set
-                    if not requests:
-                        print(f"  - Container {container_name} has no requests in resources")
-                        continue
-                        
-                    # Check for CPU and Memory requests
-                    has_cpu_request = bool(requests.get("cpu"))
-                    has_memory_request = bool(requests.get("memory"))
-                    
-                    # If any container has requests, the resource has resource requests
-                    if has_cpu_request or has_memory_request:
-                        has_resource_requests = True
                     
-                    # Check for CPU and Memory limits
-                    has_cpu_limit = bool(limits.get("cpu"))
-                    has_memory_limit = bool(limits.get("memory"))
-                    
-                    # Check if memory request exists but doesn't match the limit or limit doesn't exist
-                    if has_memory_request:
-                        memory_request = requests.get("memory")
-                        memory_limit = limits.get("memory") if has_memory_limit else None
-                        
-                        # Memory request exists but limit doesn't, or they don't match
-                        if not has_memory_limit or memory_request != memory_limit:
-                            print(f"  - MEMORY IMBALANCE in container {container_name}: request={memory_request}, limit={memory_limit}")
-                            has_memory_imbalance = True
-                    
-                    print(f"  - Container {container_name}: CPU requests: {has_cpu_request}, Memory requests: {has_memory_request}")
-                    print(f"  - Container {container_name}: CPU limits: {has_cpu_limit}, Memory limits: {has_memory_limit}")
-                
-                # After checking all containers, mark the resource if needed and return whether we found requests
-                if has_resource_requests:
-                    print(f"  - MATCH: Resource {kind}/{name} has resource requests")
-                    
-                    # Store memory imbalance info in the resource for frontend use
-                    if has_memory_imbalance:
-                        annotations = resource.get("metadata", {}).get("annotations", {})
-                        if not annotations:
-                            if "metadata" not in resource:
-                                resource["metadata"] = {}
-                            if "annotations" not in resource["metadata"]:
-                                resource["metadata"]["annotations"] = {}
-                        
-                        # Set a marker annotation for the frontend to detect
-                        resource["metadata"]["annotations"]["memory-resources-imbalance"] = "true"
-                        print(f"  - Marked resource {kind}/{name} with memory imbalance annotation")
+                template_spec = template.get("spec", {})
+                if not template_spec:
+                    return False
                     
-                    return True
-                
-                print(f"  - No containers with resource requests found in {kind}/{name}")
+                containers = template_spec.get("containers", [])
+                init_containers = template_spec.get("initContainers", [])
+            else:
+                # For Pods, containers are directly in spec
+                containers = resource.get("spec", {}).get("containers", [])
+                init_containers = resource.get("spec", {}).get("initContainers", [])
+            
+            container_count = len(containers) + len(init_containers)
+            
+            if container_count == 0:
                 return False
-            elif component_path == "podDisruptionBudget":
-                # A resource is protected by a PDB if the PDB's selector matches the resource's labels
-                # Services cannot have PDBs - they protect Pods, not Services
-                if resource_type == "services":
-                    return False
+            
+            # Flag to determine if any container has unbalanced memory resources
+            has_memory_imbalance = False
+            has_resource_requests = False
+            
+            # Verify each container for resource requests
+            for container in containers + init_containers:
+                # Check if container has resources and requests defined
+                if not container.get("resources"):
+                    continue
                 
-                resource_labels = resource.get("metadata", {}).get("labels", {})
+                resources = container.get("resources", {})    
+                requests = resources.get("requests", {})
+                limits = resources.get("limits", {})
                 
-                if not resource_labels:
-                    return False
+                # Check if no requests are set
+                if not requests:
+                    continue
+                    
+                # Check for CPU and Memory requests
+                has_cpu_request = bool(requests.get("cpu"))
+                has_memory_request = bool(requests.get("memory"))
                 
-                # Check for direct annotation
-                if resource.get("metadata", {}).get("annotations", {}).get("policy/pdb"):
-                    return True
+                # If any container has requests, the resource has resource requests
+                if has_cpu_request or has_memory_request:
+                    has_resource_requests = True
                 
-                # Check all PDBs
-                pdbs = self.resources.get("poddisruptionbudgets", [])
+                # Check for a memory limit
+                has_memory_limit = bool(limits.get("memory"))
                 
-                for pdb in pdbs:
-                    pdb_namespace = pdb.get("metadata", {}).get("namespace", "default")
-                    resource_namespace = resource.get("metadata", {}).get("namespace")
-                    
-                    # Skip if namespaces don't match
-                    if pdb_namespace != resource_namespace:
-                        continue
+                # Check if memory request exists but doesn't match the limit or limit doesn't exist
+                if has_memory_request:
+                    memory_request = requests.get("memory")
+                    memory_limit = limits.get("memory") if has_memory_limit else None
                     
-                    # Get selector
-                    selector = pdb.get("spec", {}).get("selector", {}).get("matchLabels", {})
-                    
-                    if not selector:
-                        continue
-                    
-                    # Check if all keys match
-                    matches = True
-                    for key, value in selector.items():
-                        if resource_labels.get(key) != value:
-                            matches = False
-                            break
-                    
-                    if matches:
-                        return True
+                    # Memory request exists but limit doesn't, or they don't match ("512Mi" matches "0.5Gi")
+                    if not has_memory_limit or not quantities_equal(memory_request, memory_limit):
+                        has_memory_imbalance = True
                 
-                return False
-            elif component_path == "podAntiAffinity" or component_path == "podAffinity" or component_path == "nodeAffinity":
-                # Fix affinity checking - this was the issue!
-                # The component path strings need to match exactly what's in the Kubernetes resource
+            
+            # After checking all containers, mark the resource if needed and return whether we found requests
+            if has_resource_requests:
                 
-                # Get the affinity object from the correct location based on resource kind
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    template_spec = resource.get("spec", {}).get("template", {}).get("spec", {})
-                    affinity = template_spec.get("affinity", {})
-                else:
-                    affinity = resource.get("spec", {}).get("affinity", {})
+                # Store memory imbalance info in the resource for frontend use
+                if has_memory_imbalance:
+                    annotations = resource.get("metadata", {}).get("annotations", {})
+                    if not annotations:
+                        if "metadata" not in resource:
+                            resource["metadata"] = {}
+                        if "annotations" not in resource["metadata"]:
+                            resource["metadata"]["annotations"] = {}
+                    
+                    # Set a marker annotation for the frontend to detect
+                    resource["metadata"]["annotations"]["memory-resources-imbalance"] = "true"
                 
-                # Print the actual affinity object for debugging
-                print(f"  - Affinity object for {kind}/{name}: {affinity}")
+                return True
+            
+            return False
+        elif component_path == "podDisruptionBudget":
+            # A resource is protected by a PDB if the PDB's selector matches the resource's labels
+            # Services cannot have PDBs - they protect Pods, not Services
+            if resource_type == "services":
+                return False
+            
+            resource_labels = resource.get("metadata", {}).get("labels", {})
+            
+            if not resource_labels:
+                return False
+            
+            # Check for direct annotation
+            if resource.get("metadata", {}).get("annotations", {}).get("policy/pdb"):
+                return True
+            
+            # Check all PDBs
+            pdbs = self.resources.get("poddisruptionbudgets", [])
+            
+            for pdb in pdbs:
+                pdb_namespace = pdb.get("metadata", {}).get("namespace", "default")
+                resource_namespace = resource.get("metadata", {}).get("namespace")
                 
-                # Check if the component exists and is not empty
-                # Important: Don't use component_path directly, as Kubernetes uses camelCase
-                # The variables "podAntiAffinity", "podAffinity", "nodeAffinity" are correctly spelled in camelCase
-                # and match what's in the resource
-                has_component = False
+                # Skip if namespaces don't match
+                if pdb_namespace != resource_namespace:
+                    continue
                 
-                if component_path == "podAntiAffinity" and "podAntiAffinity" in affinity:
-                    has_component = bool(affinity.get("podAntiAffinity"))
-                elif component_path == "podAffinity" and "podAffinity" in affinity:
-                    has_component = bool(affinity.get("podAffinity"))
-                elif component_path == "nodeAffinity" and "nodeAffinity" in affinity:
-                    has_component = bool(affinity.get("nodeAffinity"))
+                # Get selector
+                selector = pdb.get("spec", {}).get("selector", {}).get("matchLabels", {})
                 
-                print(f"Checking {kind}/{name} for {component_path}: {has_component}")
-                return has_component
-            elif component_path == "nodeSelector":
-                # Check in different locations based on resource type
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    has_component = bool(resource.get("spec", {}).get("template", {}).get("spec", {}).get("nodeSelector"))
-                    print(f"Checking {kind}/{name} for nodeSelector: {has_component}")
-                    return has_component
-                return bool(resource.get("spec", {}).get("nodeSelector"))
-            elif component_path == "tolerations":
-                # Check in different locations based on resource type
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    has_component = bool(resource.get("spec", {}).get("template", {}).get("spec", {}).get("tolerations"))
-                    print(f"Checking {kind}/{name} for tolerations: {has_component}")
-                    return has_component
-                return bool(resource.get("spec", {}).get("tolerations"))
-            elif component_path == "topologyKeys":
-                # topologyKeys are only available in Services
-                if resource_type != "services":
-                    print(f"topologyKeys only apply to services, not {kind}/{name}")
-                    return False
-                    
-                # Check if any topologyKeys exist in the service
-                topology_keys = []
+                if not selector:
+                    continue
                 
-                # Check in service spec.topologyKeys (Kubernetes >= 1.17)
-                if resource.get("spec", {}).get("topologyKeys"):
-                    topology_keys = resource.get("spec", {}).get("topologyKeys", [])
+                # Check if all keys match
+                matches = True
+                for key, value in selector.items():
+                    if resource_labels.get(key) != value:
+                        matches = False
+                        break
                 
-                # Also check in service spec.externalTrafficPolicy and trafficPolicy (for headless services)
-                if resource.get("spec", {}).get("externalTrafficPolicy") == "Local":
-                    # Not directly a topologyKey but indicates topology awareness
-                    has_component = True
-                    print(f"  - MATCH: Found externalTrafficPolicy=Local in {kind}/{name}")
+                if matches:
                     return True
-                
-                has_component = bool(topology_keys)
-                print(f"Checking {kind}/{name} for topologyKeys: {has_component}")
-                if has_component:
-                    print(f"  - MATCH: Found topologyKeys: {topology_keys}")
+            
+            return False
+        elif component_path == "podAntiAffinity" or component_path == "podAffinity" or component_path == "nodeAffinity":
+            # Fix affinity checking - this was the issue!
+            # The component path strings need to match exactly what's in the Kubernetes resource
+            
+            # Get the affinity object from the correct location based on resource kind
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                template_spec = resource.get("spec", {}).get("template", {}).get("spec", {})
+                affinity = template_spec.get("affinity", {})
+            else:
+                affinity = resource.get("spec", {}).get("affinity", {})
+            
+            # Check if the component exists and is not empty
+            # Important: Don't use component_path directly, as Kubernetes uses camelCase
+            # The variables "podAntiAffinity", "podAffinity", "nodeAffinity" are correctly spelled in camelCase
+            # and match what's in the resource
+            has_component = False
+            
+            if component_path == "podAntiAffinity" and "podAntiAffinity" in affinity:
+                has_component = bool(affinity.get("podAntiAffinity"))
+            elif component_path == "podAffinity" and "podAffinity" in affinity:
+                has_component = bool(affinity.get("podAffinity"))
+            elif component_path == "nodeAffinity" and "nodeAffinity" in affinity:
+                has_component = bool(affinity.get("nodeAffinity"))
+            
+            return has_component
+        elif component_path == "nodeSelector":
+            # Check in different locations based on resource type
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                has_component = bool(resource.get("spec", {}).get("template", {}).get("spec", {}).get("nodeSelector"))
                 return has_component
-            elif component_path == "livenessProbe":
-                # Liveness probes are defined at the container level
-                # We need to check each container in the pod/workload
-                print(f"Checking {kind}/{name} for livenessProbe")
-                
-                # Initialize containers lists
-                containers = []
-                init_containers = []
-                
-                # Get containers based on resource type
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
-                    init_containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("initContainers", [])
-                else:
-                    containers = resource.get("spec", {}).get("containers", [])
-                    init_containers = resource.get("spec", {}).get("initContainers", [])
-                
-                # Check each container for livenessProbe
-                for container in containers + init_containers:
-                    if container.get("livenessProbe"):
-                        print(f"  - MATCH: Found livenessProbe in container {container.get('name', 'unnamed')}")
-                        return True
-                
-                print(f"  - No livenessProbe found in {kind}/{name}")
-                return False
-            elif component_path == "readinessProbe":
-                # Readiness probes are defined at the container level
-                print(f"Checking {kind}/{name} for readinessProbe")
-                
-                # Initialize containers lists
-                containers = []
-                init_containers = []
-                
-                # Get containers based on resource type
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
-                    init_containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("initContainers", [])
-                else:
-                    containers = resource.get("spec", {}).get("containers", [])
-                    init_containers = resource.get("spec", {}).get("initContainers", [])
-                
-                # Check each container for readinessProbe
-                for container in containers + init_containers:
-                    if container.get("readinessProbe"):
-                        print(f"  - MATCH: Found readinessProbe in container {container.get('name', 'unnamed')}")
-                        return True
-                
-                print(f"  - No readinessProbe found in {kind}/{name}")
+            return bool(resource.get("spec", {}).get("nodeSelector"))
+        elif component_path == "tolerations":
+            # Check in different locations based on resource type
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                has_component = bool(resource.get("spec", {}).get("template", {}).get("spec", {}).get("tolerations"))
+                return has_component
+            return bool(resource.get("spec", {}).get("tolerations"))
+        elif component_path == "topologyKeys":
+            # topologyKeys are only available in Services
+            if resource_type != "services":
                 return False
-            elif component_path == "startupProbe":
-                # Startup probes are defined at the container level
-                print(f"Checking {kind}/{name} for startupProbe")
-                
-                # Initialize containers lists
-                containers = []
-                init_containers = []
-                
-                # Get containers based on resource type
-                if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
-                    containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
-                    init_containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("initContainers", [])
-                else:
-                    containers = resource.get("spec", {}).get("containers", [])
-                    init_containers = resource.get("spec", {}).get("initContainers", [])
                 
-                # Check each container for startupProbe
-                for container in containers + init_containers:
-                    if container.get("startupProbe"):
-                        print(f"  - MATCH: Found startupProbe in container {container.get('name', 'unnamed')}")
-                        return True
-                
-                print(f"  - No startupProbe found in {kind}/{name}")
-                return False
+            # Check if any topologyKeys exist in the service
+            topology_keys = []
             
-            # For general case, handle nested paths
-            parts = component_path.split('.')
-            current = resource
+            # Check in service spec.topologyKeys (Kubernetes >= 1.17)
+            if resource.get("spec", {}).get("topologyKeys"):
+                topology_keys = resource.get("spec", {}).get("topologyKeys", [])
             
-            for part in parts:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                else:
-                    return False
+            # Also check in service spec.externalTrafficPolicy and trafficPolicy (for headless services)
+            if resource.get("spec", {}).get("externalTrafficPolicy") == "Local":
+                # Not directly a topologyKey but indicates topology awareness
+                has_component = True
+                return True
             
-            return current is not None and (not isinstance(current, dict) or bool(current))
-        
-        # Process each resource type
-        for resource_type in resource_types:
-            # Skip if resource type doesn't exist
-            if resource_type not in self.resources:
-                print(f"Resource type not found in available resources: {resource_type}")
-                continue
-            resources = self.resources[resource_type]
-            resource_count = len(resources)
-            total_resources += resource_count
-            print(f"Processing {resource_count} resources of type {resource_type}")
+            return bool(topology_keys)
+        elif component_path == "livenessProbe":
+            # Liveness probes are defined at the container level
+            # We need to check each container in the pod/workload
             
-            for i, resource in enumerate(resources):
-                kind = resource_type
-                name = resource.get("metadata", {}).get("name", "unnamed")
-
-                # Check each component
-                matching_components = []
-                print(f"Checking resource {i+1}/{resource_count}: {kind}/{name}")
-                
-                for component in components:
-                    try:
-                        has_component = resource_contains_component(resource, component, resource_type)
-                        
-                        # Based on search mode, collect component or skip
-                        if (mode == "include" and has_component) or (mode == "exclude" and not has_component):
-                            matching_components.append(component)
-                            print(f"  - Component {component} matched for {kind}/{name}")
-                    except Exception as e:
-                        print(f"Error checking component {component} for {kind}/{name}: {str(e)}")
-                
-                # If we have matching components, add this resource to results
-                if matching_components:
-                    print(f"Adding {kind}/{name} to results with components: {matching_components}")
-                    
-                    # For the kind field, use a consistent capitalized singular form
-                    # This will be properly mapped back to the correct resource type in the frontend
-                    displayed_kind = None
-                    
-                    if resource_type == "deployments":
-                        displayed_kind = "Deployment"
-                    elif resource_type == "statefulsets":
-                        displayed_kind = "StatefulSet"
-                    elif resource_type == "daemonsets":
-                        displayed_kind = "DaemonSet"
-                    elif resource_type == "pods":
-                        displayed_kind = "Pod"
-                    elif resource_type == "jobs":
-                        displayed_kind = "Job"
-                    elif resource_type == "cronjobs":
-                        displayed_kind = "CronJob"
-                    elif resource_type == "replicasets":
-                        displayed_kind = "ReplicaSet"
-                    elif resource_type == "services":
-                        displayed_kind = "Service"
-                    else:
-                        # Default to capitalizing the first letter and removing trailing 's'
-                        displayed_kind = resource_type.capitalize()
-                        if displayed_kind.endswith('s'):
-                            displayed_kind = displayed_kind[:-1]
-                    
-                    results.append({
-                        "name": name,
-                        "namespace": resource.get("metadata", {}).get("namespace", "default"),
-                        "kind": displayed_kind,
-                        "components": matching_components,
-                        "hasMemoryImbalance": resource.get("metadata", {}).get("annotations", {}).get("memory-resources-imbalance") == "true"
-                    })
+            # Initialize containers lists
+            containers = []
+            init_containers = []
+            
+            # Get containers based on resource type
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
+                init_containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("initContainers", [])
+            else:
+                containers = resource.get("spec", {}).get("containers", [])
+                init_containers = resource.get("spec", {}).get("initContainers", [])
+            
+            # Check each container for livenessProbe
+            for container in containers + init_containers:
+                if container.get("livenessProbe"):
+                    return True
+            
+            return False
+        elif component_path == "readinessProbe":
+            # Readiness probes are defined at the container level
+            
+            # Initialize containers lists
+            containers = []
+            init_containers = []
+            
+            # Get containers based on resource type
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
+                init_containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("initContainers", [])
+            else:
+                containers = resource.get("spec", {}).get("containers", [])
+                init_containers = resource.get("spec", {}).get("initContainers", [])
+            
+            # Check each container for readinessProbe
+            for container in containers + init_containers:
+                if container.get("readinessProbe"):
+                    return True
+            
+            return False
+        elif component_path == "startupProbe":
+            # Startup probes are defined at the container level
+            
+            # Initialize containers lists
+            containers = []
+            init_containers = []
+            
+            # Get containers based on resource type
+            if resource_type in ["deployments", "statefulsets", "replicasets", "daemonsets", "jobs"]:
+                containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
+                init_containers = resource.get("spec", {}).get("template", {}).get("spec", {}).get("initContainers", [])
+            else:
+                containers = resource.get("spec", {}).get("containers", [])
+                init_containers = resource.get("spec", {}).get("initContainers", [])
+            
+            # Check each container for startupProbe
+            for container in containers + init_containers:
+                if container.get("startupProbe"):
+                    return True
+            
+            return False
         
-        print(f"Search complete. Found {len(results)} matches out of {total_resources} total resources.")
-        return {
-            "matches": results,
-            "totalResources": total_resources,
-            "matchCount": len(results)
-        }
+        # For general case, handle nested paths
+        parts = component_path.split('.')
+        current = resource
+        
+        for part in parts:
+            if isinstance(current, dict) and part in current:
+                current = current[part]
+            else:
+                return False
+        
+        return current is not None and (not isinstance(current, dict) or bool(current))
+
 
     def generate_component_report(self, components: List[str], resource_types: List[str]) -> Dict:
         """
@@ -742,12 +832,27 @@ class ClusterExplorer:
         print(f"Report generation complete.")
         return report
 
-    def analyze_best_practices(self) -> Dict:
+    def get_analysis_state(self) -> Optional[AnalysisState]:
+        """
+        Best practices state to seed the analysis of the next snapshot with: this
+        snapshot's, or the previous one's while this snapshot wasn't analyzed (any state
+        is a valid base, only the amount of re-evaluated resources differs).
+        """
+        return self.best_practices_state or self._previous_analysis_state
+
+    def analyze_best_practices(self, profile: bool = False) -> Dict:
         """
         Analyze the cluster resources against best practices.
         
+        Args:
+            profile: Re-run the analysis even if cached and include its per-check
+                timings and counts under "profile"
+            
         Returns:
             Dictionary with analysis results
+            
+        Raises:
+            RuleDefinitionError: If the configured rules file is missing or doesn't compile
         """
         debug_log("Starting best practices analysis in ClusterExplorer", "INFO")
         
@@ -760,15 +865,26 @@ class ClusterExplorer:
         resource_counts = {k: len(v) for k, v in self.resources.items() if v}
         debug_log(f"Resources available for analysis: {resource_counts}", "INFO")
         
+        # Built-in rules plus the house rules of the rules file, if configured. Outside of the
+        # try below: a broken rules file is a configuration error, not a cluster scoring 0
+        rules = configured_rules(self.resources.keys())
+        
         try:
-            # Call the analyzer module
-            results = analyze_best_practices(self.resources)
+            # Results are cached per snapshot content, analyzer version and rule set
+            cache_key = f"{self.get_content_hash()}-v{ANALYZER_VERSION}-{rules_digest(rules)}"
+            results = best_practices_cache.get(cache_key) if not profile else None
+            if results is not None:
+                debug_log(f"Best practices analysis served from cache ({cache_key})", "INFO")
+                return results
             
-            if results is None:
-                debug_log("Best practices analysis returned None", "WARNING")
-                return self._get_default_best_practices_result()
-                
-            debug_log(f"Best practices analysis completed with overall score: {results.get('overall_score', 0)}", "INFO")
+            # Call the analyzer module, reusing the verdicts for resources unchanged since the previous snapshot
+            results = self._run_best_practices(rules)
+            
+            debug_log(f"Best practices analysis completed with overall score: {results.get('overall_score', 0)} "
+                      f"({self.best_practices_state.evaluated} rule evaluations, {self.best_practices_state.reused} reused)", "INFO")
+            best_practices_cache.put(cache_key, results)
+            if profile:
+                return {**results, "profile": self.best_practices_state.profile}
             return results
             
         except Exception as e:
@@ -777,6 +893,37 @@ class ClusterExplorer:
             debug_log(f"Traceback: {traceback.format_exc()}", "ERROR")
             return self._get_default_best_practices_result()
     
+    def _run_best_practices(self, rules: List) -> Dict:
+        results, self.best_practices_state = run_best_practices(
+            self.resources, self.quantities, rules, self._previous_analysis_state
+        )
+        self._previous_analysis_state = None
+        self._best_practices_rules = rules
+        self._findings = None
+        return results
+
+    def get_best_practice_violations(self, check_id: str, namespace: Optional[str] = None,
+                                     page: int = 1, page_size: int = 50) -> Dict:
+        """
+        Resources failing a best practice check.
+        
+        Args:
+            check_id: Id of the check (see the "id" of the analysis checks)
+            namespace: Only return resources of this namespace
+            page: 1-based page number
+            page_size: Resources per page
+            
+        Returns:
+            Dictionary with the check, per-namespace failing counts and a page of failing resources
+        """
+        if self.best_practices_state is None:
+            # Analysis results may have come from the cache, without verdicts
+            debug_log("Evaluating best practices for the findings index", "INFO")
+            self._run_best_practices(configured_rules(self.resources.keys()))
+        if self._findings is None:
+            self._findings = FindingsIndex(self.records, self._best_practices_rules, self.best_practices_state)
+        return self._findings.violations(check_id, namespace, page, page_size)
+
     def _get_default_best_practices_result(self) -> Dict:
         """
         Return a default structure for best practices analysis when no valid analysis can be performed.
@@ -813,24 +960,141 @@ class ClusterExplorer:
             debug_log("No nodes or pods available for node pods report", "WARNING")
             return {}
         
-        # Initialize the result dict
+        # Group pods by node through the nodeName index
+        pods_by_node = self._get_pods_by_node()
         node_pods_map = {}
-        
-        # Group pods by node
-        for node in nodes:
-            node_name = node.get('metadata', {}).get('name')
+        for record in self.records['nodes']:
+            node_name = record.name
             if not node_name:
                 continue
+            node_pods_map[node_name] = [pods[i] for i in pods_by_node.get(node_name, [])]
+        
+        debug_log(f"Node pods report generated for {len(node_pods_map)} nodes", "INFO")
+        return node_pods_map
+
+    def _get_pods_by_node(self) -> Dict[str, List[int]]:
+        """
+        Index of pod positions in resources['pods'] by spec.nodeName, built on first use.
+        """
+        if self._pods_by_node is None:
+            pods_by_node = {}
+            for i, record in enumerate(self.records['pods']):
+                if record.node_name:
+                    pods_by_node.setdefault(record.node_name, []).append(i)
+            self._pods_by_node = pods_by_node
+        return self._pods_by_node
+
+    def generate_node_allocation_report(self, top_n: int = 5) -> Dict:
+        """
+        Generate a report of requested vs allocatable resources on each node.
+        
+        Args:
+            top_n: Number of top consuming pods to list per node
             
-            # Find all pods running on this node
-            pods_on_node = []
-            for pod in pods:
-                pod_node_name = pod.get('spec', {}).get('nodeName')
-                if pod_node_name == node_name:
-                    pods_on_node.append(pod)
+        Returns:
+            Dictionary with a cluster summary and a compact allocation row per node
+        """
+        debug_log("Generating node allocation report", "INFO")
+        report = build_node_allocation_report(
+            self.records['nodes'], self.records['pods'], self.quantities, top_n
+        )
+        debug_log(f"Node allocation report generated for {len(report['nodes'])} nodes", "INFO")
+        return report
+
+    def simulate_node_consolidation(self, remove_nodes: Optional[List[str]] = None,
+                                    node_shapes: Optional[Dict[str, Dict]] = None) -> Dict:
+        """
+        Simulate removing or reshaping nodes and re-pack the snapshot's pods by their requests.
+        
+        Args:
+            remove_nodes: Names of nodes to take out of the cluster
+            node_shapes: New allocatable capacity by node name, e.g. {"node-1": {"cpu": "8", "memory": "32Gi"}}
             
-            # Add to the mapping
-            node_pods_map[node_name] = pods_on_node
+        Returns:
+            Dictionary with the minimal node set, the nodes left empty and the pods that would not fit
+        """
+        debug_log(f"Simulating node consolidation: remove={remove_nodes}, reshape={list((node_shapes or {}).keys())}", "INFO")
+        result = simulate_node_consolidation(self.resources, self.quantities, remove_nodes, node_shapes)
+        debug_log(f"Node consolidation simulated: {result['summary']}", "INFO")
+        return result
+
+    def _get_event_index(self) -> EventIndex:
+        """
+        Index of the snapshot's events, built on first use.
+        """
+        if self._event_index is None:
+            self._event_index = EventIndex(
+                self.resources['events'], self.resources['pods'], self.resources['replicasets']
+            )
+            debug_log(f"Event index built for {len(self.resources['events'])} events", "INFO")
+        return self._event_index
+
+    def get_event_summary(self, bucket: str = "hour", top_n: int = 10, namespace: Optional[str] = None) -> Dict:
+        """
+        Summarize the snapshot's events.
         
-        debug_log(f"Node pods report generated for {len(node_pods_map)} nodes", "INFO")
-        return node_pods_map
\ No newline at end of file
+        Args:
+            bucket: Histogram bucket size, one of 'minute', 'hour' or 'day'
+            top_n: Number of entries in each top-N list
+            namespace: Only summarize events of this namespace
+            
+        Returns:
+            Dictionary with totals, a time histogram and top reasons, namespaces and objects
+        """
+        if bucket not in BUCKET_SECONDS:
+            raise ValueError(f"Invalid bucket '{bucket}', expected one of {list(BUCKET_SECONDS)}")
+        return self._get_event_index().summary(bucket=bucket, top_n=top_n, namespace=namespace)
+
+    def get_event_counts(self, kind: Optional[str] = None, namespace: Optional[str] = None,
+                         rollup_workloads: bool = True, page: int = 1, page_size: int = 100) -> Dict:
+        """
+        Count events per involved object.
+        
+        Args:
+            kind: Only return objects of this kind
+            namespace: Only return objects in this namespace
+            rollup_workloads: Attribute pod and ReplicaSet events to the owning workload
+            page: 1-based page number
+            page_size: Objects per page
+            
+        Returns:
+            Dictionary with a page of objects with their number of events, occurrences
+            and warnings, and pagination info
+        """
+        return self._get_event_index().counts_by_object(kind, namespace, rollup_workloads, page, page_size)
+
+    def get_event_timeline(self, kind: Optional[str] = None, namespace: Optional[str] = None,
+                           name: Optional[str] = None, uid: Optional[str] = None) -> List[Dict]:
+        """
+        Get the events of a single object, ordered by time.
+        
+        Args:
+            kind: Kind of the involved object
+            namespace: Namespace of the involved object
+            name: Name of the involved object
+            uid: UID of the involved object, used instead of kind/namespace/name when given
+            
+        Returns:
+            List of events
+        """
+        return self._get_event_index().timeline(kind, namespace, name, uid)
+
+    def generate_rightsizing_report(self, group_by: str = "workload", namespace: Optional[str] = None,
+                                    sort_by: str = "cpuWaste", page: int = 1, page_size: int = 50) -> Dict:
+        """
+        Compare pod metrics usage with requests and WOOP recommendations.
+        
+        Args:
+            group_by: Aggregate per 'workload' or per 'namespace'
+            namespace: Only return rows of this namespace
+            sort_by: Column to sort by, descending
+            page: 1-based page number
+            page_size: Rows per page
+            
+        Returns:
+            Dictionary with a cluster summary and a page of per-workload or per-namespace rows
+        """
+        if self._rightsizing is None:
+            debug_log("Building right-sizing analysis", "INFO")
+            self._rightsizing = RightsizingAnalysis(self.resources, self.records['pods'], self.quantities)
+        return self._rightsizing.report(group_by, namespace, sort_by, page, page_size)
@@ -6,6 +6,8 @@ from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta
 import httpx
 
+from cast_api_client import api_base_url
+
 router = APIRouter()
 
 class ClusterInfoRequest(BaseModel):
@@ -39,9 +41,7 @@ def format_date(date_str):
 
 async def get_cluster_info(cluster_id: str, api_token: str, region: str = 'US'):
     """Fetch cluster information from CAST.AI API"""
-    # Determine the API endpoint based on region
-    base_url = 'https://api.eu.cast.ai' if region.upper() == 'EU' else 'https://api.cast.ai'
-    url = f'{base_url}/v1/kubernetes/external-clusters/{cluster_id}'
+    url = f'{api_base_url(region)}/v1/kubernetes/external-clusters/{cluster_id}'
     
     headers = {
         'accept': 'application/json',
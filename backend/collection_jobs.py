@@ -0,0 +1,265 @@
+"""
+Background jobs for cluster data collection
+
+Collections run as asyncio tasks of the server instead of inside the request that
+started them. Every job has an id and live progress (chunks done out of planned, items
+and bytes received, per report) that can be polled or streamed; a cluster has at most
+one active job, so starting a collection while one is running returns the running job.
+A full re-download requested while an incremental collection runs is queued behind it
+rather than merged into it. Jobs can be cancelled (the report store checkpoints keep
+what was already fetched), and clusters can be put on a periodic refresh schedule.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from data_collection import collect_cluster_data
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for polling, oldest dropped first
+MAX_FINISHED_JOBS = 200
+
+# Shortest refresh interval of a schedule
+MIN_SCHEDULE_SECONDS = 300
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class CollectionJob:
+    """
+    One collection of a cluster's cost and efficiency data.
+
+    Args:
+        cluster_id: The ID of the cluster
+        region: The region (US or EU)
+        full: Re-download the whole history instead of extending the stored reports
+        trigger: What started the job, 'request' or 'schedule'
+    """
+
+    def __init__(self, cluster_id: str, region: str, full: bool, trigger: str = "request"):
+        self.id = uuid.uuid4().hex
+        self.cluster_id = cluster_id
+        self.region = region
+        self.full = full
+        self.trigger = trigger
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.progress: Dict[str, Dict[str, int]] = {}
+        self.task: Optional[asyncio.Task] = None
+        # Bumped on every change; waiters of changed are woken up
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def _touch(self) -> None:
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def update_progress(self, report: str, counters: Dict[str, int]) -> None:
+        self.progress[report] = counters
+        self._touch()
+
+    def set_status(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        if status == "running":
+            self.started_at = _now()
+        elif status not in ACTIVE_STATUSES:
+            self.finished_at = _now()
+        self._touch()
+
+    async def wait_for_change(self, version: int, timeout: float) -> bool:
+        """Wait until the job changed after version, at most timeout seconds. Returns whether it did."""
+        if self.version != version:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        totals = {
+            counter: sum(counters.get(counter, 0) for counters in self.progress.values())
+            for counter in ("chunks_total", "chunks_done", "chunks_failed", "items", "bytes")
+        }
+        # Both reports share one API client, so its byte count is per job rather than per report
+        totals["bytes"] = max((counters.get("bytes", 0) for counters in self.progress.values()), default=0)
+        return {
+            "id": self.id,
+            "cluster_id": self.cluster_id,
+            "region": self.region,
+            "full": self.full,
+            "trigger": self.trigger,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {**totals, "reports": self.progress},
+            "version": self.version,
+        }
+
+
+class CollectionJobManager:
+    """Registry of the collection jobs and refresh schedules of the process."""
+
+    def __init__(self):
+        self._jobs: Dict[str, CollectionJob] = {}
+        # (cluster_id, region) -> id of its latest active job
+        self._active: Dict[Tuple[str, str], str] = {}
+        # (cluster_id, region) -> (schedule, task)
+        self._schedules: Dict[Tuple[str, str], Tuple[Dict[str, Any], asyncio.Task]] = {}
+
+    def submit(self, cluster_id: str, api_key: str, region: str = "US", full: bool = False,
+               trigger: str = "request") -> CollectionJob:
+        """
+        Start a collection of a cluster, or return its collection already in progress.
+
+        A full collection requested while an incremental one is active is queued to
+        start when that one finishes; any other request joins the active job.
+
+        Returns:
+            The new or the active job
+        """
+        key = (cluster_id, region.upper())
+        active_id = self._active.get(key)
+        previous = self._jobs.get(active_id) if active_id is not None else None
+        if previous is not None and previous.active and (previous.full or not full):
+            return previous
+
+        job = CollectionJob(cluster_id, key[1], full, trigger)
+        self._jobs[job.id] = job
+        self._active[key] = job.id
+        after = previous.task if previous is not None and previous.active else None
+        job.task = asyncio.create_task(self._run(job, api_key, after))
+        # Also runs when the task is cancelled before it started, unlike the handlers of _run
+        job.task.add_done_callback(lambda task: self._finished(job, task))
+        self._prune()
+        logger.info(f"Started collection job {job.id} for {cluster_id} ({job.region})")
+        return job
+
+    async def _run(self, job: CollectionJob, api_key: str, after: Optional[asyncio.Task] = None) -> Dict[str, Any]:
+        if after is not None:
+            # Queued behind the cluster's previous job; its outcome doesn't matter here
+            await asyncio.wait([after])
+        job.set_status("running")
+        try:
+            result = await collect_cluster_data(job.cluster_id, api_key, job.region, job.full,
+                                                on_progress=job.update_progress)
+        except Exception as e:
+            logger.error(f"Collection job {job.id} failed: {e}")
+            result = {"status": "error", "message": str(e)}
+        if result.get("status") == "success":
+            job.set_status("succeeded")
+        else:
+            job.set_status("failed", result.get("message"))
+        return result
+
+    def _finished(self, job: CollectionJob, task: asyncio.Task) -> None:
+        if task.cancelled() and job.active:
+            job.set_status("cancelled")
+        key = (job.cluster_id, job.region)
+        if self._active.get(key) == job.id:
+            # A job queued behind another one may finish (be cancelled) first
+            still_active = [other for other in self._jobs.values()
+                            if (other.cluster_id, other.region) == key and other.active]
+            if still_active:
+                self._active[key] = still_active[-1].id
+            else:
+                del self._active[key]
+
+    def _prune(self) -> None:
+        finished = [job for job in self._jobs.values() if not job.active]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> CollectionJob:
+        """
+        Raises:
+            KeyError: If there is no such job
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown collection job '{job_id}'")
+        return job
+
+    def list(self, cluster_id: Optional[str] = None) -> List[CollectionJob]:
+        """Jobs, newest first, optionally of one cluster only."""
+        return [
+            job for job in reversed(list(self._jobs.values()))
+            if cluster_id is None or job.cluster_id == cluster_id
+        ]
+
+    def cancel(self, job_id: str) -> CollectionJob:
+        """
+        Cancel a queued or running job. Chunks already fetched stay stored.
+
+        Raises:
+            KeyError: If there is no such job
+        """
+        job = self.get(job_id)
+        if job.active and job.task is not None:
+            job.task.cancel()
+        return job
+
+    def schedule(self, cluster_id: str, api_key: str, region: str = "US", interval_seconds: int = 86400) -> Dict[str, Any]:
+        """
+        Refresh a cluster's data every interval_seconds, replacing its previous schedule.
+
+        Raises:
+            ValueError: If the interval is shorter than MIN_SCHEDULE_SECONDS
+        """
+        if interval_seconds < MIN_SCHEDULE_SECONDS:
+            raise ValueError(f"interval_seconds must be at least {MIN_SCHEDULE_SECONDS}")
+        key = (cluster_id, region.upper())
+        self.unschedule(cluster_id, region)
+        schedule = {"cluster_id": cluster_id, "region": key[1], "interval_seconds": interval_seconds,
+                    "next_run": None, "last_job_id": None}
+        self._schedules[key] = (schedule, asyncio.create_task(self._run_schedule(schedule, api_key)))
+        return dict(schedule)
+
+    async def _run_schedule(self, schedule: Dict[str, Any], api_key: str) -> None:
+        while True:
+            job = self.submit(schedule["cluster_id"], api_key, schedule["region"], trigger="schedule")
+            schedule["last_job_id"] = job.id
+            try:
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    # The schedule itself was cancelled, the job keeps running
+                    raise
+            except Exception as e:
+                logger.error(f"Scheduled collection of {schedule['cluster_id']} failed: {e}")
+            next_run = datetime.now(timezone.utc).timestamp() + schedule["interval_seconds"]
+            schedule["next_run"] = datetime.fromtimestamp(next_run, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            await asyncio.sleep(schedule["interval_seconds"])
+
+    def unschedule(self, cluster_id: str, region: str = "US") -> bool:
+        """Stop refreshing a cluster. Returns whether it had a schedule."""
+        entry = self._schedules.pop((cluster_id, region.upper()), None)
+        if entry is None:
+            return False
+        entry[1].cancel()
+        return True
+
+    def schedules(self) -> List[Dict[str, Any]]:
+        return [dict(schedule) for schedule, _ in self._schedules.values()]
+
+
+collection_jobs = CollectionJobManager()
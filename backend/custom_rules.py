@@ -0,0 +1,433 @@
+"""
+User-defined best practice rules
+
+House rules are declared in a YAML file (see BEST_PRACTICES_RULES_FILE) and compiled
+into Rule objects, so they run in the analyzer's single pass next to the built-in
+checks. Example:
+
+    rules:
+      - name: Team label
+        category: governance
+        resources: [deployments, statefulsets]
+        where:                         # optional: which resources the rule applies to
+          path: metadata.namespace
+          op: in
+          value: [prod, staging]
+        require:                       # what an applicable resource must satisfy
+          all:
+            - path: metadata.labels.team
+              op: exists
+            - path: podSpec.containers[*].image
+              op: not_matches
+              value: "^docker.io/"
+        threshold: 100                 # % of applicable resources that must pass
+        explanation: ...
+        recommendation: ...
+        reference: ...
+
+A predicate is either {path, op[, value][, match]} or one of {all: [...]},
+{any: [...]}, {not: predicate}. Paths are dotted field names; ["key"] addresses keys
+containing dots (e.g. metadata.labels["app.kubernetes.io/name"]), [*] expands a list
+and podSpec is the pod spec of pods and of workload pod templates. When a path expands
+lists, the op must hold for all values, or for any with match: any. Paths, ops and
+values are validated when the file is compiled.
+
+An expansion without values (the list is empty or the path doesn't exist) fails the
+predicate, with match: all as well as match: any, so
+podSpec.containers[*].resources.limits.memory with op exists fails for a resource
+without containers. To accept resources without the list, negate an any:
+{not: {path: podSpec.initContainers[*].image, op: matches, value: "^docker.io/",
+match: any}} holds when there are no init containers.
+
+Each rule's percentage counts towards its category score, the average of the
+category's checks. A rule with a category of its own adds that category to the
+overall score, the average of all category scores, so house rules in new categories
+weigh as much as a built-in category each.
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+from bestpractices_rules import Rule, builtin_rules, safe_percentage
+
+BEST_PRACTICES_RULES_FILE = os.environ.get("BEST_PRACTICES_RULES_FILE")
+
+# Path of the pod spec within resources that run pods
+POD_SPEC_PATHS = {
+    "pods": ("spec",),
+    "deployments": ("spec", "template", "spec"),
+    "statefulsets": ("spec", "template", "spec"),
+    "daemonsets": ("spec", "template", "spec"),
+    "replicasets": ("spec", "template", "spec"),
+    "replicationcontrollers": ("spec", "template", "spec"),
+    "jobs": ("spec", "template", "spec"),
+    "rollouts": ("spec", "template", "spec"),
+}
+
+PATH_ROOTS = ("apiVersion", "kind", "metadata", "spec", "status", "data", "type", "podSpec")
+
+METADATA_FIELDS = (
+    "name", "namespace", "uid", "labels", "annotations", "ownerReferences", "creationTimestamp",
+    "generateName", "resourceVersion", "generation", "finalizers",
+)
+
+VALUE_OPS = ("equals", "not_equals", "in", "not_in", "matches", "not_matches", "gt", "gte", "lt", "lte")
+OPS = ("exists", "absent") + VALUE_OPS
+
+_MISSING = object()
+
+_PATH_TOKEN = re.compile(r'\.?([A-Za-z_][\w-]*)|\["([^"]+)"\]|(\[\*\])')
+
+
+class RuleDefinitionError(ValueError):
+    """A rule file that doesn't compile."""
+
+
+def _parse_path(path: Any, where: str) -> List[Tuple[str, bool]]:
+    """Split a path into (field, expand) steps, expand meaning the field holds a list to iterate."""
+    if not isinstance(path, str) or not path:
+        raise RuleDefinitionError(f"{where}: path must be a non-empty string")
+    steps: List[Tuple[str, bool]] = []
+    position = 0
+    while position < len(path):
+        token = _PATH_TOKEN.match(path, position)
+        if token is None or (position == 0 and path.startswith(".")):
+            raise RuleDefinitionError(f"{where}: invalid path '{path}' at position {position}")
+        name, quoted, star = token.groups()
+        if star:
+            if not steps or steps[-1][1]:
+                raise RuleDefinitionError(f"{where}: [*] must follow a field in path '{path}'")
+            steps[-1] = (steps[-1][0], True)
+        else:
+            if position > 0 and name and not token.group(0).startswith("."):
+                raise RuleDefinitionError(f"{where}: missing '.' before '{name}' in path '{path}'")
+            steps.append((name or quoted, False))
+        position = token.end()
+
+    if steps[0][0] not in PATH_ROOTS or steps[0][1]:
+        raise RuleDefinitionError(f"{where}: path '{path}' must start with one of {list(PATH_ROOTS)}")
+    if steps[0][0] == "metadata" and len(steps) > 1 and steps[1][0] not in METADATA_FIELDS:
+        raise RuleDefinitionError(f"{where}: unknown metadata field '{steps[1][0]}' in path '{path}'")
+    return steps
+
+
+def _compile_getter(steps: List[Tuple[str, bool]], resource_type: str) -> Tuple[Callable[[Dict], Any], bool]:
+    """
+    Getter of a parsed path for one resource type, and whether it returns a list of
+    values (the path expands lists) rather than a single value.
+    """
+    if steps[0][0] == "podSpec":
+        steps = [(field, False) for field in POD_SPEC_PATHS[resource_type]] + steps[1:]
+    fields = tuple(field for field, _ in steps)
+
+    if not any(expand for _, expand in steps):
+        def get_single(resource: Dict) -> Any:
+            value = resource
+            for field in fields:
+                if not isinstance(value, dict):
+                    return _MISSING
+                value = value.get(field, _MISSING)
+                if value is _MISSING:
+                    return _MISSING
+            return value
+        return get_single, False
+
+    # Runs of plain fields are resolved together; each run but the last ends with a list to expand
+    stages: List[Tuple[str, ...]] = [()]
+    for field, expand in steps:
+        stages[-1] += (field,)
+        if expand:
+            stages.append(())
+    expanded_stages, last_stage = stages[:-1], stages[-1]
+
+    def resolve(value: Any, stage_fields: Tuple[str, ...]) -> Any:
+        for field in stage_fields:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(field, _MISSING)
+        return value
+
+    if len(expanded_stages) == 1:
+        # The common case of a single list, e.g. podSpec.containers[*].image
+        (list_fields,) = expanded_stages
+        if len(last_stage) == 1:
+            (item_field,) = last_stage
+
+            def get_items_field(resource: Dict) -> List[Any]:
+                items = resolve(resource, list_fields)
+                if not isinstance(items, list):
+                    return []
+                return [item.get(item_field, _MISSING) if isinstance(item, dict) else _MISSING for item in items]
+            return get_items_field, True
+
+        def get_items(resource: Dict) -> List[Any]:
+            items = resolve(resource, list_fields)
+            if not isinstance(items, list):
+                return []
+            return [resolve(item, last_stage) for item in items] if last_stage else items
+        return get_items, True
+
+    def get_many(resource: Dict) -> List[Any]:
+        values = [resource]
+        for stage_fields in expanded_stages:
+            next_values = []
+            for value in values:
+                value = resolve(value, stage_fields)
+                if isinstance(value, list):
+                    next_values.extend(value)
+            values = next_values
+        if last_stage:
+            return [resolve(value, last_stage) for value in values]
+        return values
+    return get_many, True
+
+
+def _compile_test(op: str, value: Any, where: str) -> Callable[[Any], bool]:
+    """Test of a single resolved value."""
+    if op == "exists":
+        return lambda v: v is not _MISSING and v is not None
+    if op == "absent":
+        return lambda v: v is _MISSING or v is None
+    if op in ("equals", "not_equals"):
+        test = lambda v: v == value
+    elif op in ("in", "not_in"):
+        if not isinstance(value, list):
+            raise RuleDefinitionError(f"{where}: '{op}' needs a list value")
+        try:
+            choices = frozenset(value)
+            test = lambda v: v in choices if isinstance(v, (str, int, float, bool)) else False
+        except TypeError:
+            test = lambda v: v in value
+    elif op in ("matches", "not_matches"):
+        try:
+            pattern = re.compile(str(value))
+        except re.error as e:
+            raise RuleDefinitionError(f"{where}: invalid regular expression '{value}': {e}")
+        test = lambda v: isinstance(v, str) and pattern.search(v) is not None
+    else:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise RuleDefinitionError(f"{where}: '{op}' needs a numeric value")
+        compare = {
+            "gt": lambda v: v > value,
+            "gte": lambda v: v >= value,
+            "lt": lambda v: v < value,
+            "lte": lambda v: v <= value,
+        }[op]
+        test = lambda v: isinstance(v, (int, float)) and not isinstance(v, bool) and compare(v)
+
+    if op.startswith("not_"):
+        return lambda v: not test(v)
+    return test
+
+
+def _compile_predicate(definition: Any, resource_type: str, where: str) -> Callable[[Dict], bool]:
+    """Compile a predicate definition into a function of a resource of resource_type."""
+    if not isinstance(definition, dict):
+        raise RuleDefinitionError(f"{where}: predicate must be a mapping")
+
+    for combinator in ("all", "any"):
+        if combinator in definition:
+            if set(definition) != {combinator} or not isinstance(definition[combinator], list) or not definition[combinator]:
+                raise RuleDefinitionError(f"{where}: '{combinator}' must be the only key and hold a non-empty list")
+            parts = [
+                _compile_predicate(part, resource_type, f"{where}.{combinator}[{i}]")
+                for i, part in enumerate(definition[combinator])
+            ]
+            if combinator == "all":
+                return lambda resource: all(part(resource) for part in parts)
+            return lambda resource: any(part(resource) for part in parts)
+
+    if "not" in definition:
+        if set(definition) != {"not"}:
+            raise RuleDefinitionError(f"{where}: 'not' must be the only key")
+        inner = _compile_predicate(definition["not"], resource_type, f"{where}.not")
+        return lambda resource: not inner(resource)
+
+    unknown = set(definition) - {"path", "op", "value", "match"}
+    if unknown:
+        raise RuleDefinitionError(f"{where}: unknown keys {sorted(unknown)}")
+    op = definition.get("op")
+    if op not in OPS:
+        raise RuleDefinitionError(f"{where}: op must be one of {list(OPS)}, got {op!r}")
+    if op in VALUE_OPS and "value" not in definition:
+        raise RuleDefinitionError(f"{where}: '{op}' needs a value")
+    match = definition.get("match", "all")
+    if match not in ("all", "any"):
+        raise RuleDefinitionError(f"{where}: match must be 'all' or 'any'")
+
+    steps = _parse_path(definition.get("path"), where)
+    if steps[0][0] == "podSpec" and resource_type not in POD_SPEC_PATHS:
+        raise RuleDefinitionError(f"{where}: podSpec paths don't apply to {resource_type}")
+    getter, many = _compile_getter(steps, resource_type)
+    test = _compile_test(op, definition.get("value"), where)
+
+    if not many:
+        return lambda resource: test(getter(resource))
+    if match == "any":
+        return lambda resource: any(map(test, getter(resource)))
+
+    def test_all(resource: Dict) -> bool:
+        values = getter(resource)
+        # No values isn't vacuous truth: the resource lacks what the rule asks about
+        return bool(values) and all(map(test, values))
+    return test_all
+
+
+class CustomRule(Rule):
+    """
+    A rule compiled from a definition of the rules file: the share of applicable
+    resources satisfying the require predicate must reach the threshold.
+    """
+
+    counters = ("applicable", "passed")
+
+    def __init__(self, definition: Dict, known_types: Optional[Iterable[str]] = None, where: str = "rule"):
+        if not isinstance(definition, dict):
+            raise RuleDefinitionError(f"{where}: rule must be a mapping")
+        unknown = set(definition) - {
+            "name", "category", "resources", "where", "require", "threshold", "explanation", "recommendation", "reference"
+        }
+        if unknown:
+            raise RuleDefinitionError(f"{where}: unknown keys {sorted(unknown)}")
+
+        name = definition.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise RuleDefinitionError(f"{where}: name is required")
+        where = f"{where} ({name})"
+        category = definition.get("category")
+        if not isinstance(category, str) or not category.strip():
+            raise RuleDefinitionError(f"{where}: category is required")
+
+        resource_types = definition.get("resources")
+        if isinstance(resource_types, str):
+            resource_types = [resource_types]
+        if not isinstance(resource_types, list) or not resource_types:
+            raise RuleDefinitionError(f"{where}: resources must list at least one resource type")
+        if known_types is not None:
+            known_types = set(known_types)
+            unknown_types = [t for t in resource_types if t not in known_types]
+            if unknown_types:
+                raise RuleDefinitionError(f"{where}: unknown resource types {unknown_types}")
+
+        if "require" not in definition:
+            raise RuleDefinitionError(f"{where}: require is required")
+        threshold = definition.get("threshold", 100)
+        if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 <= threshold <= 100:
+            raise RuleDefinitionError(f"{where}: threshold must be a percentage between 0 and 100")
+
+        self.name = name
+        self.category = category
+        self.resource_types = tuple(resource_types)
+        self.threshold = threshold
+        self.explanation = str(definition.get("explanation", ""))
+        self.recommendation = str(definition.get("recommendation", ""))
+        self.reference = str(definition.get("reference", ""))
+        # Predicates are compiled per resource type, so podSpec resolves to a fixed path
+        self._predicates = {
+            resource_type: (
+                _compile_predicate(definition["where"], resource_type, f"{where}.where")
+                if definition.get("where") is not None else None,
+                _compile_predicate(definition["require"], resource_type, f"{where}.require"),
+            )
+            for resource_type in self.resource_types
+        }
+        self.digest = hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def signature(self) -> Tuple:
+        return super().signature() + (self.digest,)
+
+    def evaluate(self, resource_type, index, resource, ctx):
+        applies, require = self._predicates[resource_type]
+        if applies is not None and not applies(resource):
+            return None
+        return (1, 1 if require(resource) else 0)
+
+    def finalize(self, totals, ctx):
+        applicable = totals["applicable"]
+        if not applicable:
+            return self.check(True, f"No {', '.join(self.resource_types)} to check"), 100
+        percentage = safe_percentage(totals["passed"], applicable)
+        return self.check(
+            percentage >= self.threshold,
+            f"{totals['passed']} of {applicable} resources pass ({percentage}%, threshold {self.threshold}%)",
+        ), percentage
+
+
+def compile_rules(document: Any, known_types: Optional[Iterable[str]] = None, source: str = "rules") -> List[Rule]:
+    """
+    Compile a parsed rules document.
+
+    Args:
+        document: Mapping with a 'rules' list of rule definitions
+        known_types: Resource types rules may inspect, unchecked when None
+        source: Name of the document in error messages
+
+    Returns:
+        The compiled rules, in definition order
+
+    Raises:
+        RuleDefinitionError: If a rule is invalid
+    """
+    if document is None:
+        return []
+    if not isinstance(document, dict) or not isinstance(document.get("rules", []), list):
+        raise RuleDefinitionError(f"{source}: expected a mapping with a 'rules' list")
+
+    known_types = list(known_types) if known_types is not None else None
+    taken_ids = {rule.id for rule in builtin_rules()}
+    rules = []
+    for i, definition in enumerate(document.get("rules", [])):
+        rule = CustomRule(definition, known_types, f"{source}: rules[{i}]")
+        if rule.id in taken_ids:
+            raise RuleDefinitionError(f"{source}: rules[{i}]: a check with id '{rule.id}' already exists")
+        taken_ids.add(rule.id)
+        rules.append(rule)
+    return rules
+
+
+def load_rules_file(path: str, known_types: Optional[Iterable[str]] = None) -> List[Rule]:
+    """Compile the rules of a YAML rules file."""
+    try:
+        with open(path, "r") as f:
+            document = yaml.safe_load(f)
+    except OSError as e:
+        raise RuleDefinitionError(f"{path}: cannot read rules file: {e.strerror or e}")
+    except yaml.YAMLError as e:
+        raise RuleDefinitionError(f"{path}: invalid YAML: {e}")
+    return compile_rules(document, known_types, path)
+
+
+_compiled_files: Dict[Tuple, List[Rule]] = {}
+
+
+def configured_rules(known_types: Optional[Iterable[str]] = None) -> List[Rule]:
+    """
+    Built-in rules followed by the rules of BEST_PRACTICES_RULES_FILE, if set. The file
+    is recompiled when it changes.
+
+    Raises:
+        RuleDefinitionError: If the rules file is missing, unreadable or doesn't compile
+    """
+    rules = builtin_rules()
+    if not BEST_PRACTICES_RULES_FILE:
+        return rules
+
+    known_types = tuple(sorted(known_types)) if known_types is not None else None
+    try:
+        modified = os.path.getmtime(BEST_PRACTICES_RULES_FILE)
+    except OSError:
+        raise RuleDefinitionError(
+            f"{BEST_PRACTICES_RULES_FILE}: rules file not found (set by BEST_PRACTICES_RULES_FILE)"
+        )
+    key = (BEST_PRACTICES_RULES_FILE, modified, known_types)
+    custom = _compiled_files.get(key)
+    if custom is None:
+        custom = load_rules_file(BEST_PRACTICES_RULES_FILE, known_types)
+        _compiled_files.clear()
+        _compiled_files[key] = custom
+    return rules + custom
@@ -1,42 +1,26 @@
-import os
-import json
+import asyncio
 import logging
-from datetime import datetime, timedelta
-import httpx
-from typing import Dict, Any, List
-from urllib.parse import quote
-from cluster_info import get_cluster_info
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+from dateutil.parser import parse as parse_datetime
+from cast_api_client import CastApiClient
+from report_store import ReportStore, sanitize_filename
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def sanitize_filename(filename: str) -> str:
-    """Sanitize filename to be safe for all operating systems."""
-    # Replace any non-alphanumeric characters (except dots and hyphens) with underscores
-    sanitized = ''.join(c if c.isalnum() or c in '.-' else '_' for c in filename)
-    # Ensure the filename doesn't start with a dot or hyphen
-    sanitized = sanitized.lstrip('.-')
-    return sanitized
+# Days before the last stored day that are fetched again, as recent data may still change
+COLLECTION_OVERLAP_DAYS = 1
 
-def get_output_path(cluster_id: str, data_type: str) -> str:
-    """
-    Get the output path for the data file.
-    
-    Args:
-        cluster_id: The ID of the cluster
-        data_type: Type of data ('cost' or 'efficiency')
-        
-    Returns:
-        str: The full path where the data should be saved
-    """
-    # Create the directory structure
-    base_dir = os.path.join('reports', cluster_id, data_type)
-    os.makedirs(base_dir, exist_ok=True)
-    
-    # Use a simple filename without date
-    filename = f"{data_type}_data.json"
-    return os.path.join(base_dir, filename)
+# Incremental windows up to this long are fetched in a single request instead of monthly chunks
+SINGLE_REQUEST_DAYS = 31
+
+# Format of the date ranges in report store checkpoints
+RANGE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Called with the report type and its chunk counters after every chunk of a collection
+ProgressCallback = Callable[[str, Dict[str, int]], None]
 
 def get_monthly_date_ranges(start_date: datetime, end_date: datetime) -> List[tuple]:
     """Generate monthly date ranges between start and end dates."""
@@ -60,73 +44,60 @@ def get_monthly_date_ranges(start_date: datetime, end_date: datetime) -> List[tu
     return date_ranges
 
 async def collect_cost_data_for_period(
-    client: httpx.AsyncClient,
+    client: CastApiClient,
     cluster_id: str,
-    api_key: str,
     start_date: datetime,
-    end_date: datetime,
-    region: str
+    end_date: datetime
 ) -> Dict[str, Any]:
     """Collect cost data for a specific time period."""
-    base_url = "https://api.cast.ai/v1" if region == "US" else "https://api.eu.cast.ai/v1"
+    data = await client.get_report(cluster_id, 'cost', start_date, end_date)
     
-    start_str = quote(start_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
-    end_str = quote(end_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
-    url = f"{base_url}/cost-reports/clusters/{cluster_id}/cost?startTime={start_str}&endTime={end_str}&stepSeconds=86400"
-    
-    try:
-        response = await client.get(
-            url,
-            headers={"X-API-Key": api_key}
-        )
-        response.raise_for_status()
-        data = response.json()
+    # Remove summary section if it exists
+    if 'summary' in data:
+        del data['summary']
         
-        # Remove summary section if it exists
-        if 'summary' in data:
-            del data['summary']
-            
-        return data
-    except httpx.HTTPError as e:
-        logger.error(f"HTTP error occurred for period {start_date} to {end_date}: {e}")
-        raise
+    return data
 
 async def collect_efficiency_data_for_period(
-    client: httpx.AsyncClient,
+    client: CastApiClient,
     cluster_id: str,
-    api_key: str,
     start_date: datetime,
-    end_date: datetime,
-    region: str
+    end_date: datetime
 ) -> Dict[str, Any]:
     """Collect efficiency data for a specific time period."""
-    base_url = "https://api.cast.ai/v1" if region == "US" else "https://api.eu.cast.ai/v1"
-    
-    start_str = quote(start_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
-    end_str = quote(end_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
-    url = f"{base_url}/cost-reports/clusters/{cluster_id}/efficiency?startTime={start_str}&endTime={end_str}&stepSeconds=86400"
+    data = await client.get_report(cluster_id, 'efficiency', start_date, end_date)
     
-    try:
-        response = await client.get(
-            url,
-            headers={"X-API-Key": api_key}
-        )
-        response.raise_for_status()
-        data = response.json()
+    # Remove current section if it exists
+    if 'current' in data:
+        del data['current']
         
-        # Remove current section if it exists
-        if 'current' in data:
-            del data['current']
-            
-        return data
-    except httpx.HTTPError as e:
-        logger.error(f"HTTP error occurred for period {start_date} to {end_date}: {e}")
-        raise
+    return data
+
+def _parse_timestamp(timestamp: str) -> datetime:
+    """Naive UTC datetime of an item timestamp, like the other dates of this module."""
+    parsed = parse_datetime(timestamp)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _tomorrow() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+def _incremental_date_ranges(last_timestamp: str) -> List[tuple]:
+    """Date ranges from COLLECTION_OVERLAP_DAYS before the last stored day up to the start of tomorrow."""
+    last_day = _parse_timestamp(last_timestamp)
+    start_date = last_day.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=COLLECTION_OVERLAP_DAYS)
+    end_date = _tomorrow()
+    if end_date - start_date <= timedelta(days=SINGLE_REQUEST_DAYS):
+        return [(start_date, end_date)]
+    return get_monthly_date_ranges(start_date, end_date)
 
-async def collect_cluster_cost_data(cluster_id: str, api_key: str, region: str = "US") -> Dict[str, Any]:
-    """Collect cost data for a specific cluster in monthly chunks."""
+async def _get_date_ranges(client: CastApiClient, cluster_id: str,
+                           cluster_info: Optional[Dict[str, Any]] = None) -> List[tuple]:
+    """Monthly date ranges from the day the cluster was created up to the start of tomorrow."""
     # Get cluster info to determine the start date
-    cluster_info = await get_cluster_info(cluster_id, api_key, region)
+    if cluster_info is None:
+        cluster_info = await client.get_cluster(cluster_id)
     if not cluster_info:
         raise Exception("Cluster not found")
 
@@ -135,92 +106,156 @@ async def collect_cluster_cost_data(cluster_id: str, api_key: str, region: str =
     phase1_start = phase1_start.replace(hour=0, minute=0, second=0, microsecond=0)
     
     # Set current date to start of next day
-    current_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    current_date = _tomorrow()
     
-    # Get monthly date ranges
-    date_ranges = get_monthly_date_ranges(phase1_start, current_date)
+    return get_monthly_date_ranges(phase1_start, current_date)
+
+async def _collect_report(
+    report: str,
+    collect_period: Callable[..., Awaitable[Dict[str, Any]]],
+    client: CastApiClient,
+    cluster_id: str,
+    cluster_info: Optional[Dict[str, Any]],
+    full: bool,
+    on_progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Fetch the missing date ranges of a report concurrently and merge them into its store.
+
+    Every fetched chunk is written to the store right away and removed from the store's
+    checkpoint, so an interrupted collection resumes with the chunks it didn't get to.
+    Chunks that fail for good (after the client's retries) stay in the checkpoint and
+    are listed as missing in the manifest until a later collection fetches them.
+    """
+    store = ReportStore(cluster_id, report)
+    incremental = store.exists() and not full
     
-    # Collect data for each period
-    all_items = []
-    async with httpx.AsyncClient() as client:
-        for start_date, end_date in date_ranges:
-            try:
-                data = await collect_cost_data_for_period(client, cluster_id, api_key, start_date, end_date, region)
-                if 'items' in data:
-                    all_items.extend(data['items'])
-            except Exception as e:
-                logger.error(f"Error collecting cost data for period {start_date} to {end_date}: {e}")
-                continue
+    # Only fetch what is missing from the stored report, the full history if there is none
+    if incremental:
+        date_ranges = _incremental_date_ranges(store.last_timestamp())
+    else:
+        date_ranges = await _get_date_ranges(client, cluster_id, cluster_info)
     
-    # Combine all data
-    combined_data = {
-        'items': sorted(all_items, key=lambda x: x['timestamp'])
-    }
+    # Plus the ranges an earlier collection didn't get to or failed on
+    planned = []
+    for date_range in store.pending_ranges() + [
+        [start_date.strftime(RANGE_FORMAT), end_date.strftime(RANGE_FORMAT)] for start_date, end_date in date_ranges
+    ]:
+        if date_range not in planned:
+            planned.append(date_range)
+    remaining = list(planned)
+    store.save_pending(remaining)
+    counters = {'chunks_total': len(planned), 'chunks_done': 0, 'chunks_failed': 0, 'items': 0}
     
-    # Save the combined data
-    output_path = get_output_path(cluster_id, 'cost')
-    with open(output_path, 'w') as f:
-        json.dump(combined_data, f, indent=2)
+    def report_progress() -> None:
+        if on_progress is not None:
+            on_progress(report, {**counters, 'bytes': client.bytes_received})
     
-    return combined_data
-
-async def collect_cluster_efficiency_data(cluster_id: str, api_key: str, region: str = "US") -> Dict[str, Any]:
-    """Collect efficiency data for a specific cluster in monthly chunks."""
-    # Get cluster info to determine the start date
-    cluster_info = await get_cluster_info(cluster_id, api_key, region)
-    if not cluster_info:
-        raise Exception("Cluster not found")
-
-    # Get phase 1 start date (createdAt) and set to start of day
-    phase1_start = datetime.strptime(cluster_info['createdAt'], '%Y-%m-%dT%H:%M:%S.%fZ')
-    phase1_start = phase1_start.replace(hour=0, minute=0, second=0, microsecond=0)
+    report_progress()
+    logger.info(f"Collecting {report} data for {cluster_id} in {len(planned)} requests "
+                f"({store.count() if incremental else 0} items stored)")
     
-    # Set current date to start of next day
-    current_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    async def fetch(date_range: List[str]) -> bool:
+        start_date, end_date = (datetime.strptime(date, RANGE_FORMAT) for date in date_range)
+        try:
+            data = await collect_period(client, cluster_id, start_date, end_date)
+        except Exception as e:
+            logger.error(f"Error collecting {report} data for period {start_date} to {end_date}: {e}")
+            counters['chunks_failed'] += 1
+            report_progress()
+            return False
+        # Merge into the stored partitions, deduplicated by timestamp, and checkpoint
+        items = data.get('items', [])
+        store.write(items, region=client.region)
+        remaining.remove(date_range)
+        store.save_pending(remaining)
+        counters['chunks_done'] += 1
+        counters['items'] += len(items)
+        report_progress()
+        return True
     
-    # Get monthly date ranges
-    date_ranges = get_monthly_date_ranges(phase1_start, current_date)
+    fetched = await asyncio.gather(*(fetch(date_range) for date_range in planned))
+    if remaining:
+        logger.warning(f"Collected {sum(fetched)} of {len(planned)} {report} chunks for {cluster_id}, "
+                       f"missing: {remaining}")
     
-    # Collect data for each period
-    all_items = []
-    async with httpx.AsyncClient() as client:
-        for start_date, end_date in date_ranges:
-            try:
-                data = await collect_efficiency_data_for_period(client, cluster_id, api_key, start_date, end_date, region)
-                if 'items' in data:
-                    all_items.extend(data['items'])
-            except Exception as e:
-                logger.error(f"Error collecting efficiency data for period {start_date} to {end_date}: {e}")
-                continue
-    
-    # Combine all data
     combined_data = {
-        'items': sorted(all_items, key=lambda x: x['timestamp'])
+        'items': store.read()
     }
     
-    # Save the combined data
-    output_path = get_output_path(cluster_id, 'efficiency')
-    with open(output_path, 'w') as f:
-        json.dump(combined_data, f, indent=2)
-    
     return combined_data
 
-async def collect_cluster_data(cluster_id: str, api_key: str, region: str = "US") -> Dict[str, Any]:
+async def collect_cluster_cost_data(cluster_id: str, api_key: str, region: str = "US",
+                                    cluster_info: Optional[Dict[str, Any]] = None, full: bool = False,
+                                    client: Optional[CastApiClient] = None,
+                                    on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Collect cost data for a specific cluster in monthly chunks, fetched concurrently.
+
+    Only the days since the last stored one (and ranges missing from earlier
+    collections) are fetched and merged into the stored data, unless full is set or
+    nothing is stored yet.
+    """
+    if client is None:
+        async with CastApiClient(api_key, region) as client:
+            return await _collect_report('cost', collect_cost_data_for_period, client, cluster_id, cluster_info, full,
+                                         on_progress)
+    return await _collect_report('cost', collect_cost_data_for_period, client, cluster_id, cluster_info, full,
+                                 on_progress)
+
+async def collect_cluster_efficiency_data(cluster_id: str, api_key: str, region: str = "US",
+                                          cluster_info: Optional[Dict[str, Any]] = None, full: bool = False,
+                                          client: Optional[CastApiClient] = None,
+                                          on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Collect efficiency data for a specific cluster in monthly chunks, fetched concurrently.
+
+    Only the days since the last stored one (and ranges missing from earlier
+    collections) are fetched and merged into the stored data, unless full is set or
+    nothing is stored yet.
+    """
+    if client is None:
+        async with CastApiClient(api_key, region) as client:
+            return await _collect_report('efficiency', collect_efficiency_data_for_period, client, cluster_id,
+                                         cluster_info, full, on_progress)
+    return await _collect_report('efficiency', collect_efficiency_data_for_period, client, cluster_id,
+                                 cluster_info, full, on_progress)
+
+async def collect_cluster_data(cluster_id: str, api_key: str, region: str = "US", full: bool = False,
+                               on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     Collect all data for a specific cluster.
 
+    Cost and efficiency data are collected in parallel, sharing one cluster info lookup.
+    Reports already stored are only extended with the days since their last item.
+
     Args:
         cluster_id: The ID of the cluster
         api_key: The API key for authentication
         region: The region (US or EU)
+        full: Re-download the whole history instead of extending the stored reports
+        on_progress: Called with the report type and its chunk counters (chunks_total,
+            chunks_done, chunks_failed, items, bytes) as the collection proceeds
 
     Returns:
         Dict[str, Any]: The combined data
     """
     try:
-        # Collect cost and efficiency data
-        cost_data = await collect_cluster_cost_data(cluster_id, api_key, region)
-        efficiency_data = await collect_cluster_efficiency_data(cluster_id, api_key, region)
+        async with CastApiClient(api_key, region) as client:
+            # The cluster's creation date is only needed to collect a report from scratch
+            cluster_info = None
+            if full or not all(ReportStore(cluster_id, report).exists() for report in ('cost', 'efficiency')):
+                cluster_info = await client.get_cluster(cluster_id)
+                if not cluster_info:
+                    raise Exception("Cluster not found")
+
+            # Collect cost and efficiency data, sharing the client and its per-key request limit
+            cost_data, efficiency_data = await asyncio.gather(
+                collect_cluster_cost_data(cluster_id, api_key, region, cluster_info, full=full, client=client,
+                                          on_progress=on_progress),
+                collect_cluster_efficiency_data(cluster_id, api_key, region, cluster_info, full=full, client=client,
+                                                on_progress=on_progress),
+            )
         
         return {
             "status": "success",
@@ -246,9 +281,6 @@ def get_latest_report_dates(cluster_id: str, region: str = 'US') -> Dict[str, An
         Dict[str, Any]: Dictionary containing the latest dates for each report type
     """
     try:
-        # Sanitize the cluster ID
-        safe_cluster_id = sanitize_filename(cluster_id)
-        
         # Initialize result structure
         result = {
             'cluster_id': cluster_id,
@@ -257,27 +289,13 @@ def get_latest_report_dates(cluster_id: str, region: str = 'US') -> Dict[str, An
             'efficiency': None
         }
         
-        # Check cost data
-        cost_path = os.path.join('reports', safe_cluster_id, 'cost', 'cost_data.json')
-        if os.path.exists(cost_path):
-            try:
-                with open(cost_path, 'r') as f:
-                    data = json.load(f)
-                    if 'items' in data:
-                        result['cost'] = max(item['timestamp'] for item in data['items'])
-            except Exception as e:
-                logger.error(f"Error reading cost data: {str(e)}")
-        
-        # Check efficiency data
-        efficiency_path = os.path.join('reports', safe_cluster_id, 'efficiency', 'efficiency_data.json')
-        if os.path.exists(efficiency_path):
+        # The last timestamp of each report comes from its manifest
+        for report in ('cost', 'efficiency'):
             try:
-                with open(efficiency_path, 'r') as f:
-                    data = json.load(f)
-                    if 'items' in data:
-                        result['efficiency'] = max(item['timestamp'] for item in data['items'])
+                manifest = ReportStore(cluster_id, report).manifest()
+                result[report] = manifest['last'] if manifest else None
             except Exception as e:
-                logger.error(f"Error reading efficiency data: {str(e)}")
+                logger.error(f"Error reading {report} data: {str(e)}")
         
         return result
 
@@ -0,0 +1,347 @@
+"""
+Event index
+
+Indexes the snapshot's events by involved object (kind/namespace/name and uid) and
+reason, and keeps per-event columns (timestamp, count, reason, namespace, type) as
+NumPy arrays so that per-workload counts, time-bucketed histograms and top-N
+aggregations are answered without scanning or shipping the whole event list.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from resource_records import build_controller_map, resolve_workload
+
+BUCKET_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+# Most buckets a histogram returns; longer spans use a coarser bucket, and spans too
+# long for daily buckets (e.g. a stale 1970 timestamp) keep only the latest days
+MAX_HISTOGRAM_BUCKETS = 2000
+
+
+@lru_cache(maxsize=65536)
+def _parse_timestamp(value: str) -> float:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return math.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def event_timestamp(event: Dict) -> float:
+    """Epoch seconds of the last occurrence of an event, NaN when unknown."""
+    for value in (
+        event.get("lastTimestamp"),
+        (event.get("series") or {}).get("lastObservedTime"),
+        event.get("eventTime"),
+        event.get("firstTimestamp"),
+        event.get("metadata", {}).get("creationTimestamp"),
+    ):
+        if isinstance(value, str) and value:
+            return _parse_timestamp(value)
+    return math.nan
+
+
+def _format_timestamp(value: float) -> Optional[str]:
+    if math.isnan(value):
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class _Codes:
+    """Maps strings to dense integer codes."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self._codes: Dict[Optional[str], int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: Optional[str]) -> Optional[int]:
+        return self._codes.get(value)
+
+
+class EventIndex:
+    """
+    Lookup structures over resources['events'].
+
+    Workload rollups resolve pod events to the pod's controller (and ReplicaSets to
+    their Deployment) through the pods' and replicasets' ownerReferences.
+    """
+
+    def __init__(self, events: List[Dict], pods: List[Dict], replicasets: List[Dict]):
+        self.events = events
+        self.by_object: Dict[Tuple[str, str, str], List[int]] = {}
+        self.by_uid: Dict[str, List[int]] = {}
+        self.by_reason: Dict[str, List[int]] = {}
+
+        self._reasons = _Codes()
+        self._namespaces = _Codes()
+        self._objects = _Codes()
+        self._object_keys: List[Tuple[str, str, str]] = []
+
+        timestamps = []
+        counts = []
+        reason_codes = []
+        namespace_codes = []
+        object_codes = []
+        warnings = []
+
+        for i, event in enumerate(events):
+            involved = event.get("involvedObject") or event.get("regarding") or {}
+            kind = involved.get("kind")
+            namespace = involved.get("namespace") or event.get("metadata", {}).get("namespace")
+            name = involved.get("name")
+            object_key = (kind, namespace, name)
+            reason = event.get("reason")
+
+            self.by_object.setdefault(object_key, []).append(i)
+            if involved.get("uid"):
+                self.by_uid.setdefault(involved["uid"], []).append(i)
+            self.by_reason.setdefault(reason, []).append(i)
+
+            object_code = self._objects.lookup(object_key)
+            if object_code is None:
+                object_code = self._objects.code(object_key)
+                self._object_keys.append(object_key)
+
+            timestamps.append(event_timestamp(event))
+            counts.append(event.get("count") or (event.get("series") or {}).get("count") or 1)
+            reason_codes.append(self._reasons.code(reason))
+            namespace_codes.append(self._namespaces.code(namespace))
+            object_codes.append(object_code)
+            warnings.append(event.get("type") == "Warning")
+
+        self.timestamps = np.array(timestamps, dtype=np.float64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.reason_codes = np.array(reason_codes, dtype=np.int64)
+        self.namespace_codes = np.array(namespace_codes, dtype=np.int64)
+        self.object_codes = np.array(object_codes, dtype=np.int64)
+        self.warnings = np.array(warnings, dtype=bool)
+
+        self._owners = build_controller_map({"Pod": pods, "ReplicaSet": replicasets})
+        self._histograms: Dict[Tuple, Dict] = {}
+        self._object_totals: Dict[bool, Dict] = {}
+
+    def _filter_mask(self, namespace: Optional[str] = None, reason: Optional[str] = None,
+                     warnings_only: bool = False) -> np.ndarray:
+        mask = np.ones(len(self.events), dtype=bool)
+        if namespace is not None:
+            code = self._namespaces.lookup(namespace)
+            mask &= self.namespace_codes == (code if code is not None else -1)
+        if reason is not None:
+            code = self._reasons.lookup(reason)
+            mask &= self.reason_codes == (code if code is not None else -1)
+        if warnings_only:
+            mask &= self.warnings
+        return mask
+
+    def histogram(self, bucket: str = "hour", namespace: Optional[str] = None,
+                  reason: Optional[str] = None) -> Dict:
+        """
+        Event occurrences per time bucket, at most MAX_HISTOGRAM_BUCKETS of them.
+
+        Args:
+            bucket: Bucket size, one of 'minute', 'hour' or 'day'; a coarser one is used
+                when the events span more than MAX_HISTOGRAM_BUCKETS buckets
+            namespace: Only count events of this namespace
+            reason: Only count events with this reason
+
+        Returns:
+            Dictionary with the bucket size used, the buckets with start time, number
+            of events, occurrences and warnings, and the number of events older than
+            the first bucket (only when even daily buckets span too long)
+        """
+        cache_key = (bucket, namespace, reason)
+        if cache_key in self._histograms:
+            return self._histograms[cache_key]
+
+        mask = self._filter_mask(namespace, reason) & ~np.isnan(self.timestamps)
+        if not mask.any():
+            self._histograms[cache_key] = {"bucket": bucket, "buckets": [], "omitted": 0}
+            return self._histograms[cache_key]
+
+        timestamps = self.timestamps[mask]
+        sizes = list(BUCKET_SECONDS)
+        for bucket in sizes[sizes.index(bucket):]:
+            bucket_seconds = BUCKET_SECONDS[bucket]
+            buckets = (timestamps // bucket_seconds).astype(np.int64)
+            first, last = int(buckets.min()), int(buckets.max())
+            if last - first < MAX_HISTOGRAM_BUCKETS:
+                break
+
+        # Still too long with daily buckets: keep the latest ones
+        first = max(first, last - MAX_HISTOGRAM_BUCKETS + 1)
+        in_window = buckets >= first
+        offsets = buckets[in_window] - first
+        size = last - first + 1
+        events = np.bincount(offsets, minlength=size)
+        occurrences = np.bincount(offsets, weights=self.counts[mask][in_window], minlength=size)
+        warnings = np.bincount(offsets, weights=self.warnings[mask][in_window], minlength=size)
+
+        result = {
+            "bucket": bucket,
+            "buckets": [
+                {
+                    "start": _format_timestamp(float((first + i) * bucket_seconds)),
+                    "events": int(events[i]),
+                    "count": int(occurrences[i]),
+                    "warnings": int(warnings[i]),
+                }
+                for i in range(size)
+            ],
+            "omitted": int((~in_window).sum()),
+        }
+        self._histograms[cache_key] = result
+        return result
+
+    def _top(self, codes: np.ndarray, values: List, mask: np.ndarray, top_n: int) -> List[Dict]:
+        if not mask.any():
+            return []
+        selected = codes[mask]
+        occurrences = np.bincount(selected, weights=self.counts[mask], minlength=len(values))
+        events = np.bincount(selected, minlength=len(values))
+        order = np.argsort(-occurrences, kind="stable")[:top_n]
+        return [
+            {"key": values[i], "events": int(events[i]), "count": int(occurrences[i])}
+            for i in order if events[i] > 0
+        ]
+
+    def summary(self, bucket: str = "hour", top_n: int = 10, namespace: Optional[str] = None) -> Dict:
+        """
+        Totals, time histogram and top-N reasons, namespaces and objects by occurrences.
+
+        The histogram's bucket size may be coarser than requested, see histogram; the
+        one used is returned as histogramBucket, the events left out of it as
+        histogramOmitted.
+        """
+        mask = self._filter_mask(namespace)
+        top_objects = self._top(self.object_codes, self._object_keys, mask, top_n)
+        for row in top_objects:
+            kind, object_namespace, name = row.pop("key")
+            row.update({"kind": kind, "namespace": object_namespace, "name": name})
+
+        histogram = self.histogram(bucket, namespace)
+        return {
+            "events": int(mask.sum()),
+            "count": int(self.counts[mask].sum()),
+            "warnings": int((self.warnings & mask).sum()),
+            "histogram": histogram["buckets"],
+            "histogramBucket": histogram["bucket"],
+            "histogramOmitted": histogram["omitted"],
+            "topReasons": self._top(self.reason_codes, self._reasons.values, mask, top_n),
+            "topNamespaces": self._top(self.namespace_codes, self._namespaces.values, mask, top_n),
+            "topObjects": top_objects,
+        }
+
+    def _totals_by_object(self, rollup_workloads: bool) -> Dict:
+        """Per-object (or per-workload) totals sorted by descending occurrences, cached per rollup."""
+        if rollup_workloads in self._object_totals:
+            return self._object_totals[rollup_workloads]
+
+        if rollup_workloads:
+            positions: Dict[Tuple[str, str, str], int] = {}
+            keys: List[Tuple[str, str, str]] = []
+            targets = np.empty(len(self._object_keys), dtype=np.int64)
+            for code, object_key in enumerate(self._object_keys):
+                workload = resolve_workload(object_key, self._owners)
+                position = positions.get(workload)
+                if position is None:
+                    position = positions[workload] = len(keys)
+                    keys.append(workload)
+                targets[code] = position
+            targets = targets[self.object_codes]
+        else:
+            keys = self._object_keys
+            targets = self.object_codes
+
+        events = np.bincount(targets, minlength=len(keys))
+        occurrences = np.bincount(targets, weights=self.counts, minlength=len(keys)).astype(np.int64)
+        warnings = np.bincount(targets, weights=self.warnings, minlength=len(keys)).astype(np.int64)
+
+        order = sorted(range(len(keys)), key=lambda i: (-occurrences[i], keys[i][1] or "", keys[i][2] or ""))
+        totals = {
+            "keys": [keys[i] for i in order],
+            "kinds": np.array([keys[i][0] for i in order], dtype=object),
+            "namespaces": np.array([keys[i][1] for i in order], dtype=object),
+            "events": events[order],
+            "count": occurrences[order],
+            "warnings": warnings[order],
+        }
+        self._object_totals[rollup_workloads] = totals
+        return totals
+
+    def counts_by_object(self, kind: Optional[str] = None, namespace: Optional[str] = None,
+                         rollup_workloads: bool = False, page: int = 1, page_size: int = 100) -> Dict:
+        """
+        Event counts per involved object, or per owning workload when rolled up.
+
+        Args:
+            kind: Only return objects (or workloads) of this kind
+            namespace: Only return objects in this namespace
+            rollup_workloads: Attribute pod and ReplicaSet events to their top-level controller
+            page: 1-based page number
+            page_size: Rows per page
+
+        Returns:
+            Dictionary with the page of rows, sorted by descending occurrences, and
+            pagination info
+        """
+        if page < 1 or page_size < 1:
+            raise ValueError("page and page_size must be positive")
+
+        totals = self._totals_by_object(rollup_workloads)
+        mask = np.ones(len(totals["keys"]), dtype=bool)
+        if kind is not None:
+            mask &= totals["kinds"] == kind
+        if namespace is not None:
+            mask &= totals["namespaces"] == namespace
+        selected = np.flatnonzero(mask)
+
+        start = (page - 1) * page_size
+        items = []
+        for i in selected[start:start + page_size].tolist():
+            object_kind, object_namespace, name = totals["keys"][i]
+            items.append({
+                "kind": object_kind,
+                "namespace": object_namespace,
+                "name": name,
+                "events": int(totals["events"][i]),
+                "count": int(totals["count"][i]),
+                "warnings": int(totals["warnings"][i]),
+            })
+
+        return {
+            "page": page,
+            "pageSize": page_size,
+            "total": int(len(selected)),
+            "items": items,
+        }
+
+    def timeline(self, kind: Optional[str] = None, namespace: Optional[str] = None,
+                 name: Optional[str] = None, uid: Optional[str] = None) -> List[Dict]:
+        """
+        Events of a single object ordered by time, looked up by uid or kind/namespace/name.
+        """
+        if uid:
+            indices = self.by_uid.get(uid, [])
+        else:
+            indices = self.by_object.get((kind, namespace, name), [])
+        ordered = sorted(indices, key=lambda i: (math.isnan(self.timestamps[i]), self.timestamps[i]))
+        return [self.events[i] for i in ordered]
@@ -0,0 +1,125 @@
+"""
+Best practices findings index
+
+Per-resource verdicts of every best practice check, so the resources failing a check
+can be listed without re-deriving them from the full resource lists. For each check and
+resource type it inspects, the index keeps two packed bitsets over the resources of
+that type (applicable and failing) next to a shared array of namespace codes.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from bestpractices_analyzer import AnalysisState
+from bestpractices_rules import Rule
+
+
+class FindingsIndex:
+    """
+    Bitsets of the check verdicts of one analysis.
+
+    Args:
+        records: ResourceRecords of the snapshot by type, aligned with the analyzed resources
+        rules: Rules of the analysis
+        state: State returned by run_best_practices for these resources and rules
+    """
+
+    def __init__(self, records: Dict[str, List], rules: Sequence[Rule], state: AnalysisState):
+        self._records = records
+        self._rules = {rule.id: rule for rule in rules}
+
+        inspected_types = {resource_type for rule in rules for resource_type in rule.resource_types}
+        self._namespaces = sorted({
+            record.namespace or "" for resource_type in inspected_types for record in records.get(resource_type, [])
+        })
+        namespace_codes = {namespace: i for i, namespace in enumerate(self._namespaces)}
+        self._namespace_codes = namespace_codes
+        self._type_namespaces = {
+            resource_type: np.array(
+                [namespace_codes[record.namespace or ""] for record in records.get(resource_type, [])], dtype=np.int32
+            )
+            for resource_type in inspected_types
+        }
+
+        # check id -> [(resource type, count, applicable bits, failing bits)]
+        self._bitsets: Dict[str, List] = {}
+        # Position of each rule in the contributions of a type, like the analyzer's routing
+        positions: Dict[str, int] = {}
+        for rule in rules:
+            type_bitsets = []
+            for resource_type in rule.resource_types:
+                position = positions.get(resource_type, 0)
+                positions[resource_type] = position + 1
+                verdicts = [rule.verdict(entry[2][position]) for entry in state.entries.get(resource_type, {}).values()]
+                applicable = np.array([verdict is not None for verdict in verdicts], dtype=bool)
+                failing = np.array([verdict is False for verdict in verdicts], dtype=bool)
+                type_bitsets.append((resource_type, len(verdicts), np.packbits(applicable), np.packbits(failing)))
+            self._bitsets[rule.id] = type_bitsets
+
+    def violations(self, check_id: str, namespace: Optional[str] = None, page: int = 1, page_size: int = 50) -> Dict:
+        """
+        Paginated resources failing a check, ordered by type, namespace and position.
+
+        Args:
+            check_id: Id of the check
+            namespace: Only return resources of this namespace
+            page: 1-based page number
+            page_size: Resources per page
+
+        Returns:
+            Dictionary with the check, the number of resources it applies to, failing
+            counts per namespace, the page of failing resources and pagination info
+        """
+        rule = self._rules.get(check_id)
+        if rule is None:
+            raise KeyError(f"Unknown check '{check_id}', expected one of {sorted(self._rules)}")
+        if page < 1 or page_size < 1:
+            raise ValueError("page and page_size must be positive")
+
+        namespace_code = self._namespace_codes.get(namespace, -1) if namespace is not None else None
+        applicable_count = 0
+        failing_by_namespace = np.zeros(len(self._namespaces), dtype=np.int64)
+        selected = []
+        for resource_type, count, applicable_bits, failing_bits in self._bitsets[check_id]:
+            applicable = np.unpackbits(applicable_bits, count=count).astype(bool)
+            failing = np.unpackbits(failing_bits, count=count).astype(bool)
+            namespaces = self._type_namespaces[resource_type][:count]
+            if namespace_code is not None:
+                in_namespace = namespaces == namespace_code
+                applicable &= in_namespace
+                failing &= in_namespace
+            applicable_count += int(applicable.sum())
+            failing_by_namespace += np.bincount(namespaces[failing], minlength=len(self._namespaces))
+
+            indices = np.flatnonzero(failing)
+            indices = indices[np.argsort(namespaces[indices], kind="stable")]
+            selected.extend((resource_type, i) for i in indices.tolist())
+
+        start = (page - 1) * page_size
+        items = []
+        for resource_type, i in selected[start:start + page_size]:
+            record = self._records[resource_type][i]
+            items.append({
+                "type": resource_type,
+                "kind": record.kind,
+                "namespace": record.namespace,
+                "name": record.name,
+                "uid": record.uid,
+            })
+
+        namespace_counts = [
+            {"namespace": self._namespaces[code] or None, "failing": int(failing_by_namespace[code])}
+            for code in np.argsort(-failing_by_namespace, kind="stable").tolist()
+            if failing_by_namespace[code] > 0
+        ]
+        return {
+            "check": {"id": rule.id, "name": rule.name, "category": rule.category},
+            "namespace": namespace,
+            "applicable": applicable_count,
+            "namespaces": namespace_counts,
+            "page": page,
+            "pageSize": page_size,
+            "total": len(selected),
+            "items": items,
+        }
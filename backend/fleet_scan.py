@@ -0,0 +1,280 @@
+"""
+Fleet-wide best practices scan
+
+Headless batch mode: fetches the latest snapshot of every listed cluster with bounded
+concurrency, analyzes them in a process pool and appends one JSON line per cluster to
+the results file as soon as it is done. Re-running with the same results file skips
+the clusters that already succeeded, so an interrupted or partially failed run
+continues where it stopped (clusters that failed are retried unless --skip-failed).
+At the end the latest result of every cluster is written as a score table.
+
+Usage:
+    python backend/fleet_scan.py CLUSTERS [--results scan.jsonl] [--table scores.csv]
+                                 [--fetch-concurrency 8] [--workers N] [--source DIR]
+
+CLUSTERS is a file with one cluster per line: "cluster_id[,region]" (region defaults
+to US, lines starting with # are ignored). --source reads snapshots from a local
+directory laid out like the bucket (DIR/<cluster_id>/latest-snapshot.json.gz) instead
+of the snapshot store.
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bestpractices_analyzer import run_best_practices
+from bestpractices_rules import CATEGORIES
+from cluster_explorer import ClusterExplorer
+from custom_rules import configured_rules
+from snapshot_store import LATEST_SNAPSHOT, snapshot_uri
+
+logger = logging.getLogger("fleet_scan")
+
+FETCH_CONCURRENCY = 8
+FETCH_RETRIES = 2
+
+
+def read_clusters(path: str) -> List[Tuple[str, str]]:
+    """(cluster_id, region) pairs of a clusters file, without duplicates."""
+    clusters = []
+    seen = set()
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = [part.strip() for part in line.split(",")]
+            cluster = (parts[0], (parts[1] if len(parts) > 1 and parts[1] else "US").upper())
+            if cluster not in seen:
+                seen.add(cluster)
+                clusters.append(cluster)
+    return clusters
+
+
+def read_results(path: str) -> Dict[Tuple[str, str], Dict]:
+    """Latest result per (cluster_id, region) of a results file, ignoring a torn last line."""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            results[(result["cluster_id"], result["region"])] = result
+    return results
+
+
+def _load_snapshot(path: str) -> Tuple[Dict, bytes]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    # The store serves the snapshots decompressed, local copies may still be gzipped
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    return json.loads(raw), raw
+
+
+def analyze_snapshot_file(path: str) -> Dict:
+    """
+    Analyze one downloaded snapshot. Runs in a worker process.
+
+    The rules are run directly rather than through ClusterExplorer.analyze_best_practices,
+    which answers a failed analysis with an all-zero result: here a failure has to
+    raise, so the cluster is recorded as an error and retried on the next run.
+
+    Returns:
+        Overall and category scores plus load and analysis timings
+    """
+    start = time.perf_counter()
+    snapshot, raw = _load_snapshot(path)
+    explorer = ClusterExplorer(snapshot)
+    loaded = time.perf_counter()
+    analysis, _ = run_best_practices(explorer.resources, explorer.quantities, configured_rules(explorer.resources.keys()))
+    analyzed = time.perf_counter()
+
+    return {
+        "score": analysis.get("overall_score", 0),
+        "categories": {category: details.get("score", 0) for category, details in analysis.get("categories", {}).items()},
+        "failed_checks": [
+            check.get("id") or check.get("name")
+            for details in analysis.get("categories", {}).values()
+            for check in details.get("checks", [])
+            if not check.get("passed")
+        ],
+        "pods": len(explorer.resources.get("pods", [])),
+        "snapshot_bytes": len(raw),
+        "load_seconds": round(loaded - start, 3),
+        "analyze_seconds": round(analyzed - loaded, 3),
+    }
+
+
+def _quiet_worker():
+    # The analyzer logs per check; keep worker output to warnings
+    logging.getLogger("cluster_explorer").setLevel(logging.WARNING)
+    logging.getLogger("best_practices_debug").setLevel(logging.WARNING)
+
+
+class FleetScan:
+    """
+    One scan run.
+
+    Args:
+        results_path: JSON lines file results are appended to
+        workers: Size of the analysis process pool
+        fetch_concurrency: Maximum number of concurrent snapshot downloads
+        retries: Download retries per cluster
+        source: Local directory to read snapshots from instead of the snapshot store
+    """
+
+    def __init__(self, results_path: str, workers: int, fetch_concurrency: int = FETCH_CONCURRENCY,
+                 retries: int = FETCH_RETRIES, source: Optional[str] = None):
+        self.results_path = results_path
+        self.workers = workers
+        self.fetch_concurrency = fetch_concurrency
+        self.retries = retries
+        self.source = source
+        self.completed = 0
+        self.failed = 0
+
+    async def _fetch(self, cluster_id: str, region: str, directory: str) -> str:
+        """Download the latest snapshot of a cluster into directory and return its path."""
+        if self.source:
+            path = os.path.join(self.source, cluster_id, LATEST_SNAPSHOT)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No snapshot at {path}")
+            local_file = os.path.join(directory, f"{cluster_id}-{region}.json")
+            await asyncio.to_thread(shutil.copyfile, path, local_file)
+            return local_file
+
+        local_file = os.path.join(directory, f"{cluster_id}-{region}.json")
+        for attempt in range(self.retries + 1):
+            process = await asyncio.create_subprocess_exec(
+                "gcloud", "storage", "cp", snapshot_uri(cluster_id, region), local_file,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await process.communicate()
+            if process.returncode == 0:
+                return local_file
+            error = stderr.decode(errors="replace").strip().splitlines()[-1:] or ["gcloud storage cp failed"]
+            if attempt == self.retries:
+                raise RuntimeError(error[0])
+            logger.warning(f"Fetching {cluster_id} failed ({error[0]}), retrying")
+            await asyncio.sleep(2 ** attempt)
+
+    def _record(self, result: Dict) -> None:
+        with open(self.results_path, "a") as f:
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _scan_cluster(self, cluster_id: str, region: str, pool: ProcessPoolExecutor, directory: str,
+                            fetch_slots: asyncio.Semaphore, pending_slots: asyncio.Semaphore, total: int) -> None:
+        result = {"cluster_id": cluster_id, "region": region}
+        start = time.perf_counter()
+        local_file = None
+        # Bounds the downloaded snapshots waiting for a worker, so disk use stays bounded too
+        async with pending_slots:
+            try:
+                async with fetch_slots:
+                    local_file = await self._fetch(cluster_id, region, directory)
+                fetched = time.perf_counter()
+                result["fetch_seconds"] = round(fetched - start, 3)
+
+                analysis = await asyncio.get_running_loop().run_in_executor(pool, analyze_snapshot_file, local_file)
+                result.update(analysis)
+                result["status"] = "ok"
+                self.completed += 1
+            except Exception as e:
+                result["status"] = "error"
+                result["error"] = str(e) or type(e).__name__
+                self.failed += 1
+            finally:
+                if local_file and os.path.exists(local_file):
+                    os.remove(local_file)
+
+        result["total_seconds"] = round(time.perf_counter() - start, 3)
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self._record(result)
+        done = self.completed + self.failed
+        status = f"score {result['score']}" if result["status"] == "ok" else f"error: {result['error']}"
+        logger.info(f"[{done}/{total}] {cluster_id} ({region}): {status} in {result['total_seconds']:.1f}s")
+
+    async def run(self, clusters: List[Tuple[str, str]]) -> None:
+        fetch_slots = asyncio.Semaphore(self.fetch_concurrency)
+        pending_slots = asyncio.Semaphore(max(self.fetch_concurrency, 2 * self.workers))
+        directory = tempfile.mkdtemp(prefix="fleet-scan-")
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_quiet_worker) as pool:
+                await asyncio.gather(*(
+                    self._scan_cluster(cluster_id, region, pool, directory, fetch_slots, pending_slots, len(clusters))
+                    for cluster_id, region in clusters
+                ))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def write_table(results: Dict[Tuple[str, str], Dict], path: str) -> None:
+    """Write one row per cluster with its overall and category scores and timings."""
+    categories = list(CATEGORIES)
+    for result in results.values():
+        categories.extend(c for c in result.get("categories", {}) if c not in categories)
+
+    columns = (["cluster_id", "region", "status", "score"] + categories +
+               ["pods", "fetch_seconds", "load_seconds", "analyze_seconds", "total_seconds", "error"])
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for (cluster_id, region), result in sorted(results.items()):
+            row = {**result, **result.get("categories", {})}
+            writer.writerow([row.get(column, "") for column in columns])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Best practices scan of many clusters")
+    parser.add_argument("clusters", help="File with one 'cluster_id[,region]' per line")
+    parser.add_argument("--results", default="fleet-scan.jsonl", help="JSON lines results file, also used to resume")
+    parser.add_argument("--table", default="fleet-scan.csv", help="Per-cluster score table written at the end")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Analysis processes")
+    parser.add_argument("--fetch-concurrency", type=int, default=FETCH_CONCURRENCY, help="Concurrent downloads")
+    parser.add_argument("--retries", type=int, default=FETCH_RETRIES, help="Download retries per cluster")
+    parser.add_argument("--skip-failed", action="store_true", help="Don't rescan clusters whose last scan failed")
+    parser.add_argument("--source", help="Local snapshot directory to use instead of the snapshot store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+    _quiet_worker()
+
+    clusters = read_clusters(args.clusters)
+    previous = read_results(args.results)
+    done_statuses = ("ok", "error") if args.skip_failed else ("ok",)
+    todo = [cluster for cluster in clusters if previous.get(cluster, {}).get("status") not in done_statuses]
+    logger.info(f"{len(clusters)} clusters, {len(clusters) - len(todo)} already scanned, {len(todo)} to scan")
+
+    scan = FleetScan(args.results, args.workers, args.fetch_concurrency, args.retries, args.source)
+    start = time.perf_counter()
+    try:
+        asyncio.run(scan.run(todo))
+    finally:
+        elapsed = time.perf_counter() - start
+        rate = (scan.completed + scan.failed) / elapsed * 60 if elapsed > 0 else 0
+        logger.info(f"Scanned {scan.completed} clusters, {scan.failed} failed, in {elapsed:.1f}s ({rate:.1f} clusters/min)")
+
+        results = read_results(args.results)
+        write_table({cluster: results[cluster] for cluster in clusters if cluster in results}, args.table)
+        logger.info(f"Wrote {args.table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ import yaml
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+import asyncio
 import json
 import os
 import logging
@@ -16,18 +17,16 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 import re
 from debug_logger import debug_log
+from analysis_cache import best_practices_cache, content_hash
+from custom_rules import RuleDefinitionError
+from metrics_registry import registry as metrics_registry
 from cluster_info import router as cluster_info, get_cluster_info
-from data_collection import collect_cluster_data, get_latest_report_dates, sanitize_filename
-
-BUCKET_MAPPING = {
-    "US": "prod-master-console-cluster-snapshots-snapshotstore",
-    "EU": "prod-eu-console-cluster-snapshots-snapshotstore"
-}
-
-API_ENDPOINTS = {
-    "US": "https://api.cast.ai",
-    "EU": "https://api.eu.cast.ai"
-}
+from collection_jobs import collection_jobs
+from data_collection import get_latest_report_dates
+from report_store import ReportStore, reports_status
+from timeseries import aggregate_report
+from snapshot_store import BUCKET_MAPPING, snapshot_uri
+from cast_api_client import api_base_url
 
 GCP_AUTH_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
 GCP_AUTH_CMD = "gcloud auth application-default login"
@@ -72,14 +71,26 @@ class ReportRequest(BaseModel):
     resource_types: List[str]
 
 
+class NodeSimulationRequest(BaseModel):
+    remove_nodes: List[str] = []
+    node_shapes: Dict[str, Dict[str, Any]] = {}  # node name -> {"cpu": "8", "memory": "32Gi", "pods": "110"}
+
+
 class ClusterDataRequest(BaseModel):
     api_key: str
     region: str = "US"  # Default to US if not specified
+    full: bool = False  # Re-download the whole history instead of only the missing days
+    background: bool = False  # Return the collection job right away instead of waiting for the data
+
+
+class CollectionScheduleRequest(BaseModel):
+    api_key: str
+    region: str = "US"
+    interval_hours: float = 24
 
 
 async def fetch_from_cast_api(cluster_id: str, region: str, api_key: str, endpoint: str):
-    base_url = API_ENDPOINTS.get(region.upper(), API_ENDPOINTS["US"])
-    url = f"{base_url}/v1/kubernetes/clusters/{cluster_id}/{endpoint}"
+    url = f"{api_base_url(region)}/v1/kubernetes/clusters/{cluster_id}/{endpoint}"
 
     async with httpx.AsyncClient() as client:
         response = await client.get(
@@ -165,9 +176,9 @@ def find_closest_snapshot_filename(cluster_id: str, region: str, requested_datet
 
     return selected_snapshot_filename
 
-def get_raw_snapshot(cluster_id: str, region: str = "US", snapshot: str = "latest-snapshot.json.gz"):
-    bucket = BUCKET_MAPPING.get(region.upper(), BUCKET_MAPPING["US"])
-    snapshot_file = f"gs://{bucket}/{cluster_id}/{snapshot}"
+def get_raw_snapshot(cluster_id: str, region: str = "US", snapshot: str = "latest-snapshot.json.gz",
+                     return_hash: bool = False):
+    snapshot_file = snapshot_uri(cluster_id, region, snapshot)
     logger.info(f"Fetching snapshot from {snapshot_file}")
 
     temp_dir = tempfile.mkdtemp()
@@ -180,10 +191,14 @@ def get_raw_snapshot(cluster_id: str, region: str = "US", snapshot: str = "lates
 
     cmd = f"gcloud storage cp {snapshot_file} {local_file}"
     subprocess.check_output(cmd, text=True, shell=True)
-    with open(local_file, 'r') as f:
-        cluster_snapshot = json.load(f)
+    with open(local_file, 'rb') as f:
+        raw_snapshot = f.read()
+    cluster_snapshot = json.loads(raw_snapshot)
 
     cleanup_temp_file(local_file)
+    if return_hash:
+        # Hash of the downloaded bytes, used to key cached analysis results
+        return cluster_snapshot, content_hash(raw_snapshot)
     return cluster_snapshot
 
 
@@ -199,6 +214,13 @@ def cleanup_temp_file(file_path: str):
 
 @app.get("/resources/{resource_type}")
 async def get_resources(resource_type: str):
+    """
+    Resources of one type from the loaded snapshot.
+
+    The objects are served as compacted at load, without metadata.managedFields; set
+    SNAPSHOT_KEEP_MANAGED_FIELDS=true to keep them. /cluster/snapshot/raw always
+    serves the snapshot unmodified.
+    """
     global current_explorer
     if current_explorer is None:
         raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
@@ -214,8 +236,13 @@ async def get_cluster_snapshot(request: ClusterRequest, background_tasks: Backgr
         else:
             snapshot_filename = find_closest_snapshot_filename(request.cluster_id, request.region, request.date)
 
+        snapshot_data, snapshot_hash = get_raw_snapshot(
+            request.cluster_id, request.region, snapshot_filename, return_hash=True
+        )
+        # Seed the best practices analysis with the previous snapshot's, so only changed resources are re-evaluated
+        previous_state = current_explorer.get_analysis_state() if current_explorer else None
         current_explorer = ClusterExplorer(
-            get_raw_snapshot(request.cluster_id, request.region, snapshot_filename)
+            snapshot_data, content_hash=snapshot_hash, previous_analysis_state=previous_state
         )
         return {
             "status": "success",
@@ -237,6 +264,10 @@ async def get_cluster_snapshot_raw(
         region: str = "US",
         date: str = None
 ):
+    """
+    Download a stored snapshot as is, including the metadata.managedFields that the
+    loaded snapshot drops.
+    """
     try:
         if date:
             snapshot_store_filename = find_closest_snapshot_filename(cluster_id, region, date)
@@ -360,10 +391,13 @@ async def generate_report(request: ReportRequest):
 
 
 @app.get("/reports/best-practices-analysis")
-async def get_best_practices_analysis():
+async def get_best_practices_analysis(profile: bool = False):
     """
     Analyze the current snapshot against Kubernetes best practices.
     
+    Args:
+        profile: Bypass the results cache and include per-check timings and counts
+    
     Returns:
         A JSON object with analysis results by category and an overall score
     """
@@ -377,7 +411,7 @@ async def get_best_practices_analysis():
     try:
         # Perform the actual analysis using the cluster explorer
         debug_log("Calling analyze_best_practices on cluster explorer", "INFO")
-        best_practices_analysis = current_explorer.analyze_best_practices()
+        best_practices_analysis = current_explorer.analyze_best_practices(profile=profile)
         
         # Log a summary of the results
         overall_score = best_practices_analysis.get("overall_score", 0)
@@ -400,12 +434,44 @@ async def get_best_practices_analysis():
         # Return the analysis results to the frontend
         return best_practices_analysis
         
+    except RuleDefinitionError as rde:
+        logger.error(f"Invalid best practice rules: {str(rde)}")
+        raise HTTPException(status_code=500, detail=f"Invalid best practice rules: {str(rde)}")
     except Exception as e:
         debug_log(f"Error performing best practices analysis: {str(e)}", "ERROR")
         import traceback
         debug_log(f"Traceback: {traceback.format_exc()}", "ERROR")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.get("/reports/best-practices/{check_id}/violations")
+async def get_best_practice_violations(check_id: str, namespace: Optional[str] = None,
+                                       page: int = 1, page_size: int = 50):
+    """
+    Paginated resources failing a best practice check, served from the per-check verdict bitsets.
+    """
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+
+    try:
+        return current_explorer.get_best_practice_violations(
+            check_id, namespace=namespace, page=page, page_size=page_size
+        )
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke.args[0]))
+    except RuleDefinitionError as rde:
+        # A ValueError, but the server's configuration is at fault, not the request
+        logger.error(f"Invalid best practice rules: {str(rde)}")
+        raise HTTPException(status_code=500, detail=f"Invalid best practice rules: {str(rde)}")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as ex:
+        logger.error(f"Error listing best practice violations: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to list best practice violations: {str(ex)}"
+        )
+
 @app.get("/reports/node-pods")
 async def get_node_pods_report():
     global current_explorer
@@ -425,6 +491,180 @@ async def get_node_pods_report():
             detail=f"Failed to generate node pods report: {str(ex)}"
         )
 
+@app.get("/reports/node-allocation")
+async def get_node_allocation_report(top_n: int = 5):
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+    
+    try:
+        # Requested vs allocatable resources per node, without pod bodies
+        return current_explorer.generate_node_allocation_report(top_n=top_n)
+    except Exception as ex:
+        logger.error(f"Error generating node allocation report: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate node allocation report: {str(ex)}"
+        )
+
+@app.post("/reports/node-simulation")
+async def simulate_node_consolidation(request: NodeSimulationRequest):
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+    
+    try:
+        return current_explorer.simulate_node_consolidation(
+            remove_nodes=request.remove_nodes,
+            node_shapes=request.node_shapes
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as ex:
+        logger.error(f"Error simulating node consolidation: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to simulate node consolidation: {str(ex)}"
+        )
+
+@app.get("/reports/memory-stats")
+async def get_memory_stats():
+    """
+    Report the memory held by the loaded snapshot and the savings of load-time compaction.
+    """
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+
+    try:
+        return current_explorer.get_memory_stats()
+    except Exception as ex:
+        logger.error(f"Error computing memory stats: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to compute memory stats: {str(ex)}"
+        )
+
+@app.get("/reports/metrics")
+async def get_metrics(prefix: str = ""):
+    """
+    Process-wide timings and counters, e.g. of every best practice check across analyses.
+    """
+    try:
+        return {**metrics_registry.snapshot(prefix), "best_practices_cache": best_practices_cache.get_stats()}
+    except Exception as ex:
+        logger.error(f"Error reading metrics: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to read metrics: {str(ex)}"
+        )
+
+@app.get("/reports/namespaces")
+async def get_namespace_rollup():
+    """
+    Per-namespace resource counts, pod phases, requests and event counts in one response.
+    """
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+
+    try:
+        return current_explorer.get_namespace_rollup()
+    except Exception as ex:
+        logger.error(f"Error generating namespace rollup: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate namespace rollup: {str(ex)}"
+        )
+
+@app.get("/reports/rightsizing")
+async def get_rightsizing_report(group_by: str = "workload", namespace: Optional[str] = None,
+                                 sort_by: str = "cpuWaste", page: int = 1, page_size: int = 50):
+    """
+    Usage vs requests per workload or namespace, joined from pod metrics and WOOP recommendations.
+    """
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+
+    try:
+        return current_explorer.generate_rightsizing_report(
+            group_by=group_by, namespace=namespace, sort_by=sort_by, page=page, page_size=page_size
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as ex:
+        logger.error(f"Error generating right-sizing report: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate right-sizing report: {str(ex)}"
+        )
+
+@app.get("/events/summary")
+async def get_event_summary(bucket: str = "hour", top_n: int = 10, namespace: Optional[str] = None):
+    """
+    Time-bucketed event histogram and top reasons, namespaces and objects.
+    """
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+
+    try:
+        return current_explorer.get_event_summary(bucket=bucket, top_n=top_n, namespace=namespace)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as ex:
+        logger.error(f"Error summarizing events: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to summarize events: {str(ex)}"
+        )
+
+@app.get("/events/counts")
+async def get_event_counts(kind: Optional[str] = None, namespace: Optional[str] = None, rollup: bool = True,
+                           page: int = 1, page_size: int = 100):
+    """
+    Event counts per workload, or per involved object when rollup is false, a page
+    at a time sorted by descending occurrences.
+    """
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+
+    try:
+        return current_explorer.get_event_counts(
+            kind=kind, namespace=namespace, rollup_workloads=rollup, page=page, page_size=page_size
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as ex:
+        logger.error(f"Error counting events: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to count events: {str(ex)}"
+        )
+
+@app.get("/events/timeline")
+async def get_event_timeline(kind: Optional[str] = None, namespace: Optional[str] = None,
+                             name: Optional[str] = None, uid: Optional[str] = None):
+    """
+    Events of a single object ordered by time, by uid or by kind/namespace/name.
+    """
+    global current_explorer
+    if current_explorer is None:
+        raise HTTPException(status_code=400, detail="No snapshot uploaded yet")
+    if not uid and not (kind and name):
+        raise HTTPException(status_code=400, detail="Either uid or kind and name are required")
+
+    try:
+        return current_explorer.get_event_timeline(kind=kind, namespace=namespace, name=name, uid=uid)
+    except Exception as ex:
+        logger.error(f"Error building event timeline: {str(ex)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to build event timeline: {str(ex)}"
+        )
+
 @app.get("/helm-charts")
 async def get_helm_charts():
     try:
@@ -461,66 +701,175 @@ async def get_helm_charts():
 async def get_cluster_data(cluster_id: str, request: ClusterDataRequest):
     """
     Collect cluster data including cost and efficiency reports.
+    
+    Stored reports are extended with the days since their last item unless full is set.
+    The collection runs as a background job; a collection of the cluster already in
+    progress is joined instead of starting another one, except that a full collection
+    is queued behind an incremental one. Unless background is set, the response waits
+    for the job and returns the collected data.
+    """
+    job = collection_jobs.submit(cluster_id, request.api_key, request.region, request.full)
+    if request.background:
+        return {"status": "accepted", "job": job.to_dict()}
+    try:
+        # Shielded: a client disconnecting doesn't cancel the job
+        return await asyncio.shield(job.task)
+    except asyncio.CancelledError:
+        if not job.task.cancelled():
+            raise
+        return {"status": "error", "message": "Collection was cancelled"}
+
+@app.get("/collection-jobs")
+async def list_collection_jobs(cluster_id: Optional[str] = None):
+    """
+    Collection jobs, newest first, optionally of one cluster only.
+    """
+    return {"jobs": [job.to_dict() for job in collection_jobs.list(cluster_id)]}
+
+@app.get("/collection-jobs/{job_id}")
+async def get_collection_job(job_id: str):
+    """
+    Status and progress of a collection job.
+    """
+    try:
+        return collection_jobs.get(job_id).to_dict()
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke.args[0]))
+
+@app.get("/collection-jobs/{job_id}/events")
+async def stream_collection_job(job_id: str):
+    """
+    Server-sent events with the job's status and progress on every change, until it finishes.
+    """
+    try:
+        job = collection_jobs.get(job_id)
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke.args[0]))
+
+    async def events():
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                yield f"event: progress\ndata: {json.dumps(job.to_dict())}\n\n"
+                if not job.active:
+                    break
+            elif not await job.wait_for_change(version, timeout=15):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/collection-jobs/{job_id}")
+async def cancel_collection_job(job_id: str):
+    """
+    Cancel a collection job. Chunks fetched so far stay stored and the next collection resumes.
+    """
+    try:
+        return collection_jobs.cancel(job_id).to_dict()
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=str(ke.args[0]))
+
+@app.put("/clusters/{cluster_id}/collection-schedule")
+async def schedule_cluster_collection(cluster_id: str, request: CollectionScheduleRequest):
+    """
+    Refresh a cluster's cost and efficiency data periodically, starting now.
+    """
+    try:
+        return collection_jobs.schedule(cluster_id, request.api_key, request.region,
+                                        int(request.interval_hours * 3600))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+@app.delete("/clusters/{cluster_id}/collection-schedule")
+async def unschedule_cluster_collection(cluster_id: str, region: str = "US"):
+    """
+    Stop the periodic refresh of a cluster's data.
     """
-    return await collect_cluster_data(cluster_id, request.api_key, request.region)
+    if not collection_jobs.unschedule(cluster_id, region):
+        raise HTTPException(status_code=404, detail=f"No collection schedule for cluster {cluster_id}")
+    return {"status": "success"}
+
+@app.get("/collection-schedules")
+async def list_collection_schedules():
+    """
+    Periodic collection schedules of all clusters.
+    """
+    return {"schedules": collection_jobs.schedules()}
 
 @app.get("/clusters/{cluster_id}/report-dates")
 async def get_latest_report_dates_endpoint(cluster_id: str, region: str = 'US'):
     """
-    Get the latest available dates for cost and efficiency reports.
+    Get the latest available dates for cost and efficiency reports, from the report manifests.
     """
     return get_latest_report_dates(cluster_id, region)
 
+@app.get("/clusters/report-status")
+async def get_reports_status():
+    """
+    Freshness of the stored cost and efficiency reports of all locally stored clusters.
+    """
+    try:
+        return {"clusters": reports_status()}
+    except Exception as e:
+        logger.error(f"Error reading report manifests: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get report status: {str(e)}")
+
+def read_report(cluster_id: str, report: str, start: Optional[str], end: Optional[str], step: Optional[str] = None,
+                group_by: Optional[str] = None, agg: str = "mean") -> Dict[str, Any]:
+    """
+    Stored items of a cluster report within [start, end), reading only the partitions needed,
+    or their aggregates per step and group when either is given.
+    """
+    try:
+        store = ReportStore(cluster_id, report)
+        if not store.exists():
+            raise HTTPException(status_code=404, detail=f"{report.capitalize()} data not found for this cluster")
+        if step is not None or group_by is not None:
+            return aggregate_report(store, start, end, step, group_by, agg)
+        return {"items": store.read(start, end)}
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get {report} data: {str(e)}")
+
 @app.get("/clusters/{cluster_id}/cost-data")
-async def get_cluster_cost_data(cluster_id: str):
+async def get_cluster_cost_data(cluster_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                                 step: Optional[str] = None, group_by: Optional[str] = None, agg: str = "mean"):
     """
-    Get cost data for a specific cluster from the saved JSON file.
+    Get cost data for a specific cluster from the report store.
     
     Args:
         cluster_id: The ID of the cluster
+        start: Only return items from this date or timestamp on
+        end: Only return items before this date or timestamp
+        step: Aggregate the items per 'day', 'week' or 'month'
+        group_by: Aggregate per value of this item field, or 'lifecycle' for the
+            OnDemand, Spot and SpotFallback variants of each field
+        agg: Aggregation of the values of a bucket: mean, sum, min, max or last
         
     Returns:
-        Dict[str, Any]: The cost data from the JSON file
+        Dict[str, Any]: The cost data items, aggregated if step or group_by is given
     """
-    try:
-        safe_cluster_id = sanitize_filename(cluster_id)
-        cost_path = os.path.join('reports', safe_cluster_id, 'cost', 'cost_data.json')
-        
-        if not os.path.exists(cost_path):
-            raise HTTPException(status_code=404, detail="Cost data not found for this cluster")
-            
-        with open(cost_path, 'r') as f:
-            data = json.load(f)
-            
-        return data
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Error reading cost data: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get cost data: {str(e)}")
+    return read_report(cluster_id, 'cost', start, end, step, group_by, agg)
 
 @app.get("/clusters/{cluster_id}/efficiency-data")
-async def get_cluster_efficiency_data(cluster_id: str):
+async def get_cluster_efficiency_data(cluster_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                                       step: Optional[str] = None, group_by: Optional[str] = None, agg: str = "mean"):
     """
-    Get efficiency data for a specific cluster from the saved JSON file.
+    Get efficiency data for a specific cluster from the report store.
     
     Args:
         cluster_id: The ID of the cluster
+        start: Only return items from this date or timestamp on
+        end: Only return items before this date or timestamp
+        step: Aggregate the items per 'day', 'week' or 'month'
+        group_by: Aggregate per value of this item field, or 'lifecycle' for the
+            OnDemand, Spot and SpotFallback variants of each field
+        agg: Aggregation of the values of a bucket: mean, sum, min, max or last
         
     Returns:
-        Dict[str, Any]: The efficiency data from the JSON file
+        Dict[str, Any]: The efficiency data items, aggregated if step or group_by is given
     """
-    try:
-        safe_cluster_id = sanitize_filename(cluster_id)
-        efficiency_path = os.path.join('reports', safe_cluster_id, 'efficiency', 'efficiency_data.json')
-        
-        if not os.path.exists(efficiency_path):
-            raise HTTPException(status_code=404, detail="Efficiency data not found for this cluster")
-            
-        with open(efficiency_path, 'r') as f:
-            data = json.load(f)
-            
-        return data
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Error reading efficiency data: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get efficiency data: {str(e)}")
\ No newline at end of file
+    return read_report(cluster_id, 'efficiency', start, end, step, group_by, agg)
\ No newline at end of file
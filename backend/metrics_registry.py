@@ -0,0 +1,78 @@
+"""
+Process-wide metrics registry
+
+Aggregates timings and counters of recurring operations (e.g. every best practice
+check of every analysis) over the lifetime of the process, so slow operations can be
+spotted from the metrics endpoint without attaching a profiler.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+
+class MetricsRegistry:
+    """
+    Named timers with counters, aggregated across calls.
+
+    Each name keeps its number of calls, total, last and maximum seconds, and the sum
+    of every counter recorded with it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._since = time.time()
+
+    def record(self, name: str, seconds: float, **counters: int) -> None:
+        """
+        Record one call of an operation.
+
+        Args:
+            name: Name of the operation, e.g. "best_practices.rule.pod-disruption-budgets"
+            seconds: Wall time of the call
+            counters: Counts to add to the operation's totals
+        """
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0, "counters": {}}
+                self._metrics[name] = metric
+            metric["calls"] += 1
+            metric["total_seconds"] += seconds
+            metric["last_seconds"] = seconds
+            metric["max_seconds"] = max(metric["max_seconds"], seconds)
+            for counter, value in counters.items():
+                metric["counters"][counter] = metric["counters"].get(counter, 0) + value
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Any]:
+        """
+        Current metrics whose name starts with prefix, slowest total first.
+
+        Returns:
+            Dictionary with the registry start time and the metrics by name, each with
+            its calls, total, mean, last and maximum seconds and counter totals
+        """
+        with self._lock:
+            metrics = {
+                name: {**metric, "counters": dict(metric["counters"])}
+                for name, metric in self._metrics.items() if name.startswith(prefix)
+            }
+            since = self._since
+
+        for metric in metrics.values():
+            metric["mean_seconds"] = metric["total_seconds"] / metric["calls"]
+            for key in ("total_seconds", "mean_seconds", "last_seconds", "max_seconds"):
+                metric[key] = round(metric[key], 6)
+        return {
+            "since": since,
+            "metrics": dict(sorted(metrics.items(), key=lambda item: -item[1]["total_seconds"])),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics = {}
+            self._since = time.time()
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,108 @@
+"""
+Namespace rollup
+
+Computes, in one pass over the snapshot, the per-namespace numbers the namespace view
+needs: resource counts by type, pod phases, pod requests and limits and event counts.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from resource_quantity import ResourceQuantities
+
+
+def build_namespace_rollup(resources: Dict[str, List[Dict]], records: Dict[str, List],
+                           quantities: ResourceQuantities) -> Dict:
+    """
+    Build the per-namespace rollup.
+
+    Args:
+        resources: Resources of the snapshot by type
+        records: ResourceRecords of the snapshot by type, aligned with resources
+        quantities: Normalized requests and limits of the snapshot
+
+    Returns:
+        Dictionary with one row per namespace (sorted by name) and the counts of
+        cluster-scoped resources. CPU is in cores and memory in bytes.
+    """
+    namespace_rows: Dict[str, Dict] = {}
+
+    def row(namespace: str) -> Dict:
+        entry = namespace_rows.get(namespace)
+        if entry is None:
+            entry = {
+                "name": namespace,
+                "phase": None,
+                "labels": {},
+                "resources": {},
+                "pods": {"total": 0, "phases": {}},
+                "requests": {"cpu": 0.0, "memory": 0},
+                "limits": {"cpu": 0.0, "memory": 0},
+                "events": {"total": 0, "warnings": 0},
+            }
+            namespace_rows[namespace] = entry
+        return entry
+
+    # Namespace objects first, so namespaces without any resources are listed too
+    for namespace in resources.get('namespaces', []):
+        metadata = namespace.get("metadata", {})
+        if metadata.get("name"):
+            entry = row(metadata["name"])
+            entry["phase"] = namespace.get("status", {}).get("phase")
+            entry["labels"] = metadata.get("labels") or {}
+
+    cluster_scoped: Dict[str, int] = {}
+    for resource_type, type_records in records.items():
+        if resource_type == 'namespaces':
+            continue
+        counts: Dict[str, int] = {}
+        for record in type_records:
+            counts[record.namespace] = counts.get(record.namespace, 0) + 1
+        for namespace, count in counts.items():
+            if namespace:
+                row(namespace)["resources"][resource_type] = count
+            else:
+                cluster_scoped[resource_type] = cluster_scoped.get(resource_type, 0) + count
+
+    for pod, record in zip(resources.get('pods', []), records.get('pods', [])):
+        if not record.namespace:
+            continue
+        pods = row(record.namespace)["pods"]
+        phase = pod.get("status", {}).get("phase") or "Unknown"
+        pods["total"] += 1
+        pods["phases"][phase] = pods["phases"].get(phase, 0) + 1
+
+    for event, record in zip(resources.get('events', []), records.get('events', [])):
+        if not record.namespace:
+            continue
+        events = row(record.namespace)["events"]
+        events["total"] += 1
+        if event.get("type") == "Warning":
+            events["warnings"] += 1
+
+    # Requests and limits of running pods, summed per namespace in bulk
+    pod_records = records.get('pods', [])
+    if pod_records:
+        namespaces = sorted(namespace_rows)
+        namespace_codes = {name: i for i, name in enumerate(namespaces)}
+        pod_namespace = np.array([namespace_codes.get(record.namespace, -1) for record in pod_records], dtype=np.int64)
+        selected = quantities.pod_active & (pod_namespace >= 0)
+        groups = pod_namespace[selected]
+
+        def total(values: np.ndarray) -> List[float]:
+            return np.bincount(groups, weights=values[selected], minlength=len(namespaces)).tolist()
+
+        cpu_requests = total(quantities.pod_cpu_request)
+        memory_requests = total(quantities.pod_memory_request)
+        cpu_limits = total(quantities.pod_cpu_limit)
+        memory_limits = total(quantities.pod_memory_limit)
+        for i, name in enumerate(namespaces):
+            entry = namespace_rows[name]
+            entry["requests"] = {"cpu": round(cpu_requests[i], 3), "memory": int(memory_requests[i])}
+            entry["limits"] = {"cpu": round(cpu_limits[i], 3), "memory": int(memory_limits[i])}
+
+    return {
+        "namespaces": [namespace_rows[name] for name in sorted(namespace_rows)],
+        "clusterScoped": cluster_scoped,
+    }
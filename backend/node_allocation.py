@@ -0,0 +1,155 @@
+"""
+Node allocation report
+
+Computes requested vs allocatable CPU, memory and pod slots for every node of a
+snapshot in bulk from the normalized ResourceQuantities arrays, and returns compact
+rows instead of full pod bodies.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from resource_quantity import ResourceQuantities
+
+ZONE_LABEL = "topology.kubernetes.io/zone"
+INSTANCE_TYPE_LABEL = "node.kubernetes.io/instance-type"
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise numerator / denominator, 0 where the denominator is 0 or unknown."""
+    result = np.zeros_like(numerator, dtype=np.float64)
+    valid = np.nan_to_num(denominator) > 0
+    np.divide(numerator, denominator, out=result, where=valid)
+    return result
+
+
+def _round_list(values: np.ndarray, digits: int) -> List[float]:
+    return np.round(values, digits).tolist()
+
+
+def build_node_allocation_report(node_records: List, pod_records: List, quantities: ResourceQuantities,
+                                 top_n: int = 5) -> Dict:
+    """
+    Build the per-node allocation report.
+
+    Args:
+        node_records: ResourceRecords of the nodes, aligned with quantities' node arrays
+        pod_records: ResourceRecords of the pods, aligned with quantities' pod arrays
+        quantities: Normalized requests and limits of the snapshot
+        top_n: Number of top consuming pods to list per node
+
+    Returns:
+        Dictionary with a cluster summary and one compact row per node. CPU is in
+        cores, memory in bytes and utilization in percent of allocatable.
+    """
+    q = quantities
+    node_count = len(q.node_names)
+
+    allocatable_cpu = np.nan_to_num(q.node_allocatable_cpu)
+    allocatable_memory = np.nan_to_num(q.node_allocatable_memory)
+    allocatable_pods = np.nan_to_num(q.node_allocatable_pods)
+
+    requested_cpu = q.node_cpu_requested
+    requested_memory = q.node_memory_requested
+    pod_count = q.node_pod_count.astype(np.float64)
+
+    cpu_utilization = _ratio(requested_cpu, allocatable_cpu)
+    memory_utilization = _ratio(requested_memory, allocatable_memory)
+    pods_utilization = _ratio(pod_count, allocatable_pods)
+
+    free_cpu = np.maximum(allocatable_cpu - requested_cpu, 0)
+    free_memory = np.maximum(allocatable_memory - requested_memory, 0)
+
+    # A node whose free CPU and free memory shares differ a lot strands the larger one:
+    # e.g. 60% of CPU free but only 5% of memory free leaves that CPU unusable
+    fragmentation = np.abs(_ratio(free_cpu, allocatable_cpu) - _ratio(free_memory, allocatable_memory))
+
+    # Top consumers: rank running, scheduled pods by their dominant share of the node
+    scheduled = np.flatnonzero(q.pod_active & (q.pod_node >= 0))
+    pod_nodes = q.pod_node[scheduled]
+    dominant_share = np.maximum(
+        _ratio(q.pod_cpu_request[scheduled], allocatable_cpu[pod_nodes]),
+        _ratio(q.pod_memory_request[scheduled], allocatable_memory[pod_nodes]),
+    )
+    order = np.lexsort((-dominant_share, pod_nodes))
+    sorted_pods = scheduled[order]
+    sorted_nodes = pod_nodes[order]
+    group_starts = np.searchsorted(sorted_nodes, np.arange(node_count))
+    group_stops = np.searchsorted(sorted_nodes, np.arange(node_count), side="right")
+
+    cpu_util_pct = _round_list(cpu_utilization * 100, 1)
+    memory_util_pct = _round_list(memory_utilization * 100, 1)
+    pods_util_pct = _round_list(pods_utilization * 100, 1)
+    fragmentation_list = _round_list(fragmentation, 3)
+
+    nodes = []
+    for i in range(node_count):
+        record = node_records[i]
+        labels = record.labels
+        top_consumers = []
+        for pod_idx in sorted_pods[group_starts[i]:min(group_stops[i], group_starts[i] + top_n)]:
+            pod_record = pod_records[pod_idx]
+            top_consumers.append({
+                "name": pod_record.name,
+                "namespace": pod_record.namespace,
+                "cpu": round(float(q.pod_cpu_request[pod_idx]), 3),
+                "memory": int(q.pod_memory_request[pod_idx]),
+            })
+
+        nodes.append({
+            "name": record.name,
+            "zone": labels.get(ZONE_LABEL),
+            "instanceType": labels.get(INSTANCE_TYPE_LABEL),
+            "allocatable": {
+                "cpu": round(float(allocatable_cpu[i]), 3),
+                "memory": int(allocatable_memory[i]),
+                "pods": int(allocatable_pods[i]),
+            },
+            "requested": {
+                "cpu": round(float(requested_cpu[i]), 3),
+                "memory": int(requested_memory[i]),
+                "pods": int(q.node_pod_count[i]),
+            },
+            "utilization": {
+                "cpu": cpu_util_pct[i],
+                "memory": memory_util_pct[i],
+                "pods": pods_util_pct[i],
+            },
+            "fragmentation": fragmentation_list[i],
+            "topConsumers": top_consumers,
+        })
+
+    total_free_cpu = float(free_cpu.sum())
+    total_free_memory = float(free_memory.sum())
+    summary = {
+        "nodes": node_count,
+        "pods": int(q.node_pod_count.sum()),
+        "unscheduledPods": int((q.pod_active & (q.pod_node < 0)).sum()),
+        "allocatable": {
+            "cpu": round(float(allocatable_cpu.sum()), 3),
+            "memory": int(allocatable_memory.sum()),
+            "pods": int(allocatable_pods.sum()),
+        },
+        "requested": {
+            "cpu": round(float(requested_cpu.sum()), 3),
+            "memory": int(requested_memory.sum()),
+            "pods": int(q.node_pod_count.sum()),
+        },
+        "utilization": {
+            "cpu": round(float(_ratio(requested_cpu.sum(keepdims=True), allocatable_cpu.sum(keepdims=True))[0] * 100), 1),
+            "memory": round(float(_ratio(requested_memory.sum(keepdims=True), allocatable_memory.sum(keepdims=True))[0] * 100), 1),
+        },
+        # Share of the free capacity that is not available as one contiguous block on a
+        # single node: 0 when all free capacity sits on one node, close to 1 when it is
+        # spread thinly over many nodes
+        "freeCapacityFragmentation": {
+            "cpu": round(1 - float(free_cpu.max()) / total_free_cpu, 3) if total_free_cpu > 0 else 0,
+            "memory": round(1 - float(free_memory.max()) / total_free_memory, 3) if total_free_memory > 0 else 0,
+        },
+    }
+
+    return {
+        "summary": summary,
+        "nodes": nodes,
+    }
@@ -0,0 +1,430 @@
+"""
+Node consolidation simulator
+
+Re-packs the pods of a snapshot onto a modified set of nodes (nodes removed, node
+shapes changed) by their effective requests and reports the minimal set of nodes
+needed and the pods that would not fit.
+
+Scheduling constraints taken into account: taints/tolerations (NoSchedule and
+NoExecute), nodeSelector, required node affinity and the per-node overhead of
+DaemonSet pods. Pods are packed first-fit-decreasing by their dominant resource
+share. Pods are grouped by constraints so node eligibility is computed once per
+group, and runs of identical pods are placed in bulk, which is equivalent to placing
+them one at a time with first-fit.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from resource_quantity import ResourceQuantities, parse_quantity
+
+# Taint effects that keep pods without a matching toleration off a node
+BLOCKING_TAINT_EFFECTS = ("NoSchedule", "NoExecute")
+
+# Relative slack when comparing requests against free capacity
+_EPSILON = 1e-9
+
+
+def _owner_kind(pod: Dict) -> Optional[str]:
+    owners = pod.get("metadata", {}).get("ownerReferences") or []
+    for owner in owners:
+        if owner.get("controller", True):
+            return owner.get("kind")
+    return None
+
+
+def _owner_key(pod: Dict) -> Tuple:
+    owners = pod.get("metadata", {}).get("ownerReferences") or []
+    for owner in owners:
+        if owner.get("controller", True):
+            return (pod.get("metadata", {}).get("namespace"), owner.get("kind"), owner.get("uid") or owner.get("name"))
+    return (pod.get("metadata", {}).get("namespace"), None, pod.get("metadata", {}).get("name"))
+
+
+def _tolerates(tolerations: List[Dict], taint: Dict) -> bool:
+    for toleration in tolerations:
+        effect = toleration.get("effect")
+        if effect and effect != taint.get("effect"):
+            continue
+        operator = toleration.get("operator") or "Equal"
+        key = toleration.get("key")
+        if operator == "Exists":
+            if not key or key == taint.get("key"):
+                return True
+        elif key == taint.get("key") and (toleration.get("value") or "") == (taint.get("value") or ""):
+            return True
+    return False
+
+
+def _match_expression(expression: Dict, labels: Dict[str, str]) -> bool:
+    key = expression.get("key")
+    operator = expression.get("operator")
+    values = expression.get("values") or []
+    present = key in labels
+    value = labels.get(key)
+
+    if operator == "In":
+        return present and value in values
+    if operator == "NotIn":
+        return not present or value not in values
+    if operator == "Exists":
+        return present
+    if operator == "DoesNotExist":
+        return not present
+    if operator in ("Gt", "Lt") and present and values:
+        try:
+            label_number = int(value)
+            bound = int(values[0])
+        except (TypeError, ValueError):
+            return False
+        return label_number > bound if operator == "Gt" else label_number < bound
+    return False
+
+
+def _match_node_selector_terms(terms: List[Dict], labels: Dict[str, str], fields: Dict[str, str]) -> bool:
+    """Terms are ORed, the requirements inside a term are ANDed; an empty term matches nothing."""
+    for term in terms:
+        expressions = term.get("matchExpressions") or []
+        field_expressions = term.get("matchFields") or []
+        if not expressions and not field_expressions:
+            continue
+        if all(_match_expression(e, labels) for e in expressions) and \
+                all(_match_expression(e, fields) for e in field_expressions):
+            return True
+    return False
+
+
+class _SchedulingConstraints:
+    """The node-selection parts of a pod spec."""
+
+    __slots__ = ("node_selector", "tolerations", "node_selector_terms")
+
+    def __init__(self, pod_spec: Dict, ignore_match_fields: bool = False):
+        self.node_selector = pod_spec.get("nodeSelector") or {}
+        self.tolerations = pod_spec.get("tolerations") or []
+        required = (
+            (pod_spec.get("affinity") or {})
+            .get("nodeAffinity", {})
+            .get("requiredDuringSchedulingIgnoredDuringExecution") or {}
+        )
+        terms = required.get("nodeSelectorTerms") or []
+        if ignore_match_fields:
+            # DaemonSet pods are pinned to their node through matchFields on metadata.name;
+            # the DaemonSet itself runs on every node the rest of the constraints allow
+            terms = [
+                {key: value for key, value in term.items() if key != "matchFields"}
+                for term in terms
+            ]
+            terms = [term for term in terms if term.get("matchExpressions")]
+        self.node_selector_terms = terms
+
+    def key(self) -> str:
+        if not self.node_selector and not self.tolerations and not self.node_selector_terms:
+            return ""
+        return json.dumps(
+            [self.node_selector, self.tolerations, self.node_selector_terms],
+            sort_keys=True, separators=(",", ":")
+        )
+
+    def referenced_label_keys(self) -> set:
+        keys = set(self.node_selector)
+        for term in self.node_selector_terms:
+            keys.update(e.get("key") for e in term.get("matchExpressions") or [])
+        return keys
+
+    def uses_match_fields(self) -> bool:
+        return any(term.get("matchFields") for term in self.node_selector_terms)
+
+    def allows(self, labels: Dict[str, str], taints: List[Dict], fields: Dict[str, str]) -> bool:
+        for taint in taints:
+            if taint.get("effect") in BLOCKING_TAINT_EFFECTS and not _tolerates(self.tolerations, taint):
+                return False
+        for key, value in self.node_selector.items():
+            if labels.get(key) != value:
+                return False
+        if self.node_selector_terms and not _match_node_selector_terms(self.node_selector_terms, labels, fields):
+            return False
+        return True
+
+
+class _EligibilityCache:
+    """
+    Node eligibility masks by constraint set.
+
+    Nodes are reduced to profiles (referenced labels, taints, and name only when some
+    pod uses matchFields), so each constraint set is evaluated once per profile
+    rather than once per node.
+    """
+
+    def __init__(self, nodes: List[Dict], referenced_keys: set, include_names: bool):
+        self._nodes = nodes
+        profile_ids = {}
+        self._profiles = []
+        node_profile = []
+        for node in nodes:
+            metadata = node.get("metadata", {})
+            labels = metadata.get("labels") or {}
+            taints = [t for t in (node.get("spec", {}).get("taints") or []) if t.get("effect") in BLOCKING_TAINT_EFFECTS]
+            profile_labels = {k: labels[k] for k in referenced_keys if k in labels}
+            fields = {"metadata.name": metadata.get("name")} if include_names else {}
+            key = json.dumps([profile_labels, taints, fields], sort_keys=True)
+            if key not in profile_ids:
+                profile_ids[key] = len(self._profiles)
+                self._profiles.append((profile_labels, taints, fields))
+            node_profile.append(profile_ids[key])
+        self._node_profile = np.array(node_profile, dtype=np.int64)
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def mask(self, constraints: _SchedulingConstraints, key: str) -> np.ndarray:
+        mask = self._masks.get(key)
+        if mask is None:
+            if not key:
+                mask = np.array([
+                    not any(t.get("effect") in BLOCKING_TAINT_EFFECTS for t in taints)
+                    for _, taints, _ in self._profiles
+                ], dtype=bool)
+            else:
+                mask = np.array([
+                    constraints.allows(labels, taints, fields)
+                    for labels, taints, fields in self._profiles
+                ], dtype=bool)
+            mask = mask[self._node_profile] if len(self._node_profile) else np.zeros(0, dtype=bool)
+            self._masks[key] = mask
+        return mask
+
+
+def _fit_counts(free_cpu: np.ndarray, free_memory: np.ndarray, free_pods: np.ndarray,
+                cpu: float, memory: float) -> np.ndarray:
+    """How many pods with the given requests fit on each node."""
+    counts = np.floor(free_pods + _EPSILON)
+    if cpu > 0:
+        counts = np.minimum(counts, np.floor(free_cpu / cpu + _EPSILON))
+    if memory > 0:
+        counts = np.minimum(counts, np.floor(free_memory / memory + _EPSILON))
+    return np.maximum(counts, 0).astype(np.int64)
+
+
+def _shape_quantity(node: str, resource: str, value: Any) -> float:
+    """A node shape quantity in base units, rejecting values that aren't valid quantities."""
+    quantity = parse_quantity(value)
+    if np.isnan(quantity) or quantity < 0:
+        raise ValueError(f"Invalid {resource} quantity '{value}' in the shape of node '{node}'")
+    return quantity
+
+
+def simulate_node_consolidation(resources: Dict[str, List[Dict]], quantities: ResourceQuantities,
+                                remove_nodes: Optional[List[str]] = None,
+                                node_shapes: Optional[Dict[str, Dict[str, Any]]] = None,
+                                max_unschedulable: int = 500) -> Dict:
+    """
+    Re-pack the snapshot's pods onto a modified node set.
+
+    Args:
+        resources: Dictionary of resources by type, as loaded by ClusterExplorer
+        quantities: Normalized requests and limits of the snapshot
+        remove_nodes: Names of nodes to take out of the cluster
+        node_shapes: New allocatable capacity by node name, e.g. {"node-1": {"cpu": "8", "memory": "32Gi"}}
+        max_unschedulable: Maximum number of unschedulable pods listed in the result
+
+    Returns:
+        Dictionary with a summary, the minimal set of nodes that holds all packed pods,
+        the nodes left empty and the pods that would not fit
+
+    Raises:
+        ValueError: If a node shape holds an invalid or negative quantity
+    """
+    nodes = resources.get("nodes", [])
+    pods = resources.get("pods", [])
+    remove_nodes = set(remove_nodes or [])
+    node_shapes = node_shapes or {}
+
+    kept = np.array([name not in remove_nodes for name in quantities.node_names], dtype=bool)
+    kept_idx = np.flatnonzero(kept)
+    kept_nodes = [nodes[i] for i in kept_idx]
+    kept_names = [quantities.node_names[i] for i in kept_idx]
+
+    capacity_cpu = np.nan_to_num(quantities.node_allocatable_cpu[kept_idx]).copy()
+    capacity_memory = np.nan_to_num(quantities.node_allocatable_memory[kept_idx]).copy()
+    capacity_pods = np.nan_to_num(quantities.node_allocatable_pods[kept_idx]).copy()
+    for i, name in enumerate(kept_names):
+        shape = node_shapes.get(name)
+        if not shape:
+            continue
+        if shape.get("cpu") is not None:
+            capacity_cpu[i] = _shape_quantity(name, "cpu", shape["cpu"])
+        if shape.get("memory") is not None:
+            capacity_memory[i] = _shape_quantity(name, "memory", shape["memory"])
+        if shape.get("pods") is not None:
+            capacity_pods[i] = _shape_quantity(name, "pods", shape["pods"])
+
+    # Split pods into DaemonSet pods (per-node overhead), pods pinned to their node
+    # (static/mirror pods) and movable pods that get re-packed
+    daemonsets: Dict[Tuple, int] = {}
+    pinned: List[int] = []
+    movable: List[int] = []
+    for i in np.flatnonzero(quantities.pod_active).tolist():
+        pod = pods[i]
+        kind = _owner_kind(pod)
+        if kind == "DaemonSet":
+            daemonsets.setdefault(_owner_key(pod), i)
+        elif kind == "Node":
+            pinned.append(i)
+        else:
+            movable.append(i)
+
+    # Pods are only distinguished by their constraint key; one constraints object is kept per key
+    constraint_sets: Dict[str, _SchedulingConstraints] = {}
+    keys = []
+    for i in movable:
+        spec = pods[i].get("spec", {})
+        if not (spec.get("nodeSelector") or spec.get("tolerations") or spec.get("affinity")):
+            key = ""
+            if key not in constraint_sets:
+                constraint_sets[key] = _SchedulingConstraints(spec)
+        else:
+            constraints = _SchedulingConstraints(spec)
+            key = constraints.key()
+            constraint_sets.setdefault(key, constraints)
+        keys.append(key)
+
+    daemonset_constraints = {
+        key: _SchedulingConstraints(pods[i].get("spec", {}), ignore_match_fields=True)
+        for key, i in daemonsets.items()
+    }
+    referenced_keys = set()
+    include_names = False
+    for constraints in list(constraint_sets.values()) + list(daemonset_constraints.values()):
+        referenced_keys |= constraints.referenced_label_keys()
+        include_names = include_names or constraints.uses_match_fields()
+    eligibility = _EligibilityCache(kept_nodes, referenced_keys, include_names)
+
+    free_cpu = capacity_cpu.copy()
+    free_memory = capacity_memory.copy()
+    free_pods = capacity_pods.copy()
+
+    # DaemonSet overhead: every DaemonSet takes its pod's requests on each node it can run on
+    daemonset_pods = np.zeros(len(kept_idx), dtype=np.int64)
+    for key, i in daemonsets.items():
+        constraints = daemonset_constraints[key]
+        mask = eligibility.mask(constraints, "ds:" + constraints.key())
+        free_cpu[mask] -= quantities.pod_cpu_request[i]
+        free_memory[mask] -= quantities.pod_memory_request[i]
+        free_pods[mask] -= 1
+        daemonset_pods[mask] += 1
+
+    # Pinned pods stay where they are, and disappear with their node
+    kept_position = {int(node): pos for pos, node in enumerate(kept_idx)}
+    for i in pinned:
+        pos = kept_position.get(int(quantities.pod_node[i]))
+        if pos is not None:
+            free_cpu[pos] -= quantities.pod_cpu_request[i]
+            free_memory[pos] -= quantities.pod_memory_request[i]
+            free_pods[pos] -= 1
+
+    # Prefer the largest nodes so that the packing ends up on as few nodes as possible
+    max_cpu = max(float(capacity_cpu.max()), _EPSILON) if len(capacity_cpu) else 1.0
+    max_memory = max(float(capacity_memory.max()), _EPSILON) if len(capacity_memory) else 1.0
+    node_order = np.lexsort((-(capacity_memory / max_memory), -(capacity_cpu / max_cpu)))
+    order_cpu = free_cpu[node_order]
+    order_memory = free_memory[node_order]
+    order_pods = free_pods[node_order]
+    placed_count = np.zeros(len(kept_idx), dtype=np.int64)
+
+    # First-fit-decreasing by dominant share, identical pods kept adjacent
+    movable_arr = np.array(movable, dtype=np.int64)
+    key_ids = {}
+    key_codes = np.array([key_ids.setdefault(k, len(key_ids)) for k in keys], dtype=np.int64)
+    cpu = quantities.pod_cpu_request[movable_arr] if len(movable_arr) else np.zeros(0)
+    memory = quantities.pod_memory_request[movable_arr] if len(movable_arr) else np.zeros(0)
+    dominant = np.maximum(cpu / max_cpu, memory / max_memory)
+    order = np.lexsort((key_codes, memory, cpu, -dominant))
+
+    unschedulable = []
+    unschedulable_count = 0
+    start = 0
+    while start < len(order):
+        first = order[start]
+        stop = start + 1
+        while stop < len(order) and cpu[order[stop]] == cpu[first] and memory[order[stop]] == memory[first] \
+                and key_codes[order[stop]] == key_codes[first]:
+            stop += 1
+        run = stop - start
+
+        mask = eligibility.mask(constraint_sets[keys[first]], keys[first])[node_order]
+        counts = _fit_counts(order_cpu, order_memory, order_pods, cpu[first], memory[first])
+        counts[~mask] = 0
+
+        cumulative = np.cumsum(counts)
+        placed_here = np.minimum(counts, np.maximum(run - (cumulative - counts), 0))
+        placed = int(placed_here.sum())
+        order_cpu -= placed_here * cpu[first]
+        order_memory -= placed_here * memory[first]
+        order_pods -= placed_here
+        placed_count[node_order] += placed_here
+
+        if placed < run:
+            reason = "No node satisfies the pod's scheduling constraints" if not mask.any() else "Insufficient capacity"
+            unschedulable_count += run - placed
+            for position in range(start + placed, stop):
+                if len(unschedulable) >= max_unschedulable:
+                    break
+                metadata = pods[int(movable_arr[order[position]])].get("metadata", {})
+                unschedulable.append({
+                    "name": metadata.get("name"),
+                    "namespace": metadata.get("namespace"),
+                    "cpu": round(float(cpu[first]), 3),
+                    "memory": int(memory[first]),
+                    "reason": reason,
+                })
+        start = stop
+
+    free_cpu[node_order] = order_cpu
+    free_memory[node_order] = order_memory
+    free_pods[node_order] = order_pods
+
+    used = placed_count > 0
+    node_rows = []
+    empty_nodes = []
+    # Report used nodes in packing order
+    rank = np.empty(len(node_order), dtype=np.int64)
+    rank[node_order] = np.arange(len(node_order))
+    for pos in sorted(np.flatnonzero(used), key=lambda p: rank[p]):
+        node_rows.append({
+            "name": kept_names[pos],
+            "allocatable": {
+                "cpu": round(float(capacity_cpu[pos]), 3),
+                "memory": int(capacity_memory[pos]),
+                "pods": int(capacity_pods[pos]),
+            },
+            "packedPods": int(placed_count[pos]),
+            "daemonSetPods": int(daemonset_pods[pos]),
+            "utilization": {
+                "cpu": round(float((capacity_cpu[pos] - free_cpu[pos]) / capacity_cpu[pos] * 100), 1) if capacity_cpu[pos] > 0 else 0,
+                "memory": round(float((capacity_memory[pos] - free_memory[pos]) / capacity_memory[pos] * 100), 1) if capacity_memory[pos] > 0 else 0,
+            },
+        })
+    for pos in np.flatnonzero(~used):
+        empty_nodes.append(kept_names[pos])
+
+    return {
+        "summary": {
+            "nodesBefore": len(quantities.node_names),
+            "nodesAvailable": int(len(kept_idx)),
+            "nodesRequired": int(used.sum()),
+            "nodesRemovable": len(empty_nodes),
+            "removedNodes": sorted(remove_nodes & set(quantities.node_names)),
+            "reshapedNodes": sorted(set(node_shapes) & set(kept_names)),
+            "podsPacked": int(placed_count.sum()),
+            "podsUnschedulable": unschedulable_count,
+            "daemonSets": len(daemonsets),
+            "requiredCapacity": {
+                "cpu": round(float(capacity_cpu[used].sum()), 3),
+                "memory": int(capacity_memory[used].sum()),
+            },
+        },
+        "nodes": node_rows,
+        "emptyNodes": empty_nodes,
+        "unschedulablePods": unschedulable,
+    }
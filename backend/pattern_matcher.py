@@ -0,0 +1,60 @@
+"""
+Multi-pattern substring matcher
+
+Finds which of a fixed set of patterns occur in a string with a single regex scan
+instead of one `in` test per pattern. The patterns are compiled into one alternation
+inside a lookahead, longest first, so the scan reports the longest pattern starting at
+every position; the shorter patterns starting there are its prefixes and are derived
+from it. Results are cached per string, as label keys and values repeat a lot across
+the resources of a snapshot.
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable
+
+# Distinct strings remembered per matcher before the cache is dropped
+CACHE_SIZE = 65536
+
+
+class PatternMatcher:
+    """
+    Precompiled set of lowercase substring patterns.
+
+    Args:
+        patterns: Patterns to look for; matching is case-insensitive
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = tuple(dict.fromkeys(pattern.lower() for pattern in patterns if pattern))
+        longest_first = sorted(self.patterns, key=len, reverse=True)
+        self._regex = re.compile("(?=(" + "|".join(re.escape(pattern) for pattern in longest_first) + "))")
+        # Patterns found whenever a given pattern is the longest match at a position
+        self._prefixes = {
+            pattern: frozenset(other for other in self.patterns if pattern.startswith(other))
+            for pattern in self.patterns
+        }
+        self._cache: Dict[str, FrozenSet[str]] = {}
+
+    def search(self, text: str) -> FrozenSet[str]:
+        """Patterns occurring in text."""
+        found = self._cache.get(text)
+        if found is None:
+            if not self.patterns:
+                return frozenset()
+            hits = set()
+            for match in self._regex.finditer(text.lower()):
+                hits.update(self._prefixes[match.group(1)])
+            found = frozenset(hits)
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[text] = found
+        return found
+
+    def search_all(self, texts: Iterable[str]) -> FrozenSet[str]:
+        """Patterns occurring in any of texts."""
+        found = frozenset()
+        for text in texts:
+            hits = self.search(text)
+            if hits:
+                found = found | hits
+        return found
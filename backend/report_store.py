@@ -0,0 +1,341 @@
+"""
+Partitioned storage of cluster cost and efficiency reports
+
+Each report of a cluster is stored as one JSON file per calendar month of its items
+(reports/<cluster>/<report>/<YYYY-MM>.json) next to an index.json listing the stored
+partitions with their first and last timestamps, item counts and sizes, and a
+generation number incremented by every write. Writes merge
+new items into the affected partitions only, reads open only the partitions
+overlapping the requested window, so I/O scales with the window instead of the
+cluster's age. A manifest.json summarizes the whole report (first and last timestamp,
+item count, size, collection time and date ranges still missing) so freshness checks
+don't touch the partitions. A checkpoint.json holds the date ranges a collection still
+has to fetch, so an interrupted or partially failed collection resumes where it
+stopped. All files are replaced atomically.
+
+Reports stored by earlier versions as a single <report>_data.json file are split into
+partitions the first time the store is opened.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from dateutil.parser import parse as parse_datetime
+
+logger = logging.getLogger(__name__)
+
+REPORTS_DIR = os.environ.get("REPORTS_DIR", "reports")
+
+INDEX_FILE = "index.json"
+
+MANIFEST_FILE = "manifest.json"
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+REPORT_TYPES = ("cost", "efficiency")
+
+
+def sanitize_filename(filename: str) -> str:
+    """Sanitize filename to be safe for all operating systems."""
+    # Replace any non-alphanumeric characters (except dots and hyphens) with underscores
+    sanitized = ''.join(c if c.isalnum() or c in '.-' else '_' for c in filename)
+    # Ensure the filename doesn't start with a dot or hyphen
+    sanitized = sanitized.lstrip('.-')
+    return sanitized
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    A timestamp or date as 'YYYY-MM-DDTHH:MM:SS', comparable with the leading part of
+    item timestamps.
+
+    Raises:
+        ValueError: If value is not a valid date
+    """
+    try:
+        return parse_datetime(value).strftime("%Y-%m-%dT%H:%M:%S")
+    except (ValueError, OverflowError) as e:
+        raise ValueError(f"Invalid date '{value}': {str(e)}")
+
+
+def _partition_of(timestamp: str) -> str:
+    # Item timestamps are ISO 8601 UTC, their month is the leading 'YYYY-MM'
+    return timestamp[:7]
+
+
+def _write_json(path: str, data: Any) -> int:
+    """Atomically replace path with data as compact JSON and return its size in bytes."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size
+
+
+class ReportStore:
+    """
+    Monthly partitions of one report ('cost' or 'efficiency') of one cluster.
+
+    Args:
+        cluster_id: The ID of the cluster
+        report: Type of report
+        root: Directory holding the reports of all clusters
+    """
+
+    def __init__(self, cluster_id: str, report: str, root: str = REPORTS_DIR):
+        self.cluster_id = cluster_id
+        self.report = report
+        self.directory = os.path.join(root, sanitize_filename(cluster_id), report)
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._generation = 0
+        self._migrate_legacy()
+
+    @property
+    def legacy_path(self) -> str:
+        return os.path.join(self.directory, f"{self.report}_data.json")
+
+    def _partition_path(self, partition: str) -> str:
+        return os.path.join(self.directory, f"{partition}.json")
+
+    def _load_index(self) -> bool:
+        """Read the index and its generation from disk. Returns whether it exists."""
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), "r") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            self._index, self._generation = {}, 0
+            return False
+        # Indexes written before generations existed count as generation 0
+        self._index, self._generation = index.get("partitions", {}), index.get("generation", 0)
+        return True
+
+    def partitions(self) -> Dict[str, Dict[str, Any]]:
+        """Index of the stored partitions: month -> {first, last, count, bytes}."""
+        if self._index is None:
+            self._load_index()
+        return self._index
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        """
+        Summary of the stored report, None if nothing is stored.
+
+        Returns:
+            Dictionary with the first and last timestamp, item count, size in bytes and
+            number of partitions, the region, the time the report was last written and
+            the [start, end] date ranges still missing
+        """
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        # Stores written before manifests existed
+        return self._build_manifest(self.partitions(), None, None, self.pending_ranges()) if self.exists() else None
+
+    def _build_manifest(self, index: Dict[str, Dict[str, Any]], collected_at: Optional[str],
+                        region: Optional[str], missing: List[List[str]]) -> Dict[str, Any]:
+        return {
+            "cluster_id": self.cluster_id,
+            "report": self.report,
+            "region": region,
+            "first": index[min(index)]["first"] if index else None,
+            "last": index[max(index)]["last"] if index else None,
+            "count": sum(partition["count"] for partition in index.values()),
+            "bytes": sum(partition["bytes"] for partition in index.values()),
+            "partitions": len(index),
+            "collected_at": collected_at,
+            "missing": missing,
+        }
+
+    def pending_ranges(self) -> List[List[str]]:
+        """[start, end] date ranges of the checkpoint: planned by a collection but not fetched yet."""
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE), "r") as f:
+                return json.load(f).get("pending", [])
+        except FileNotFoundError:
+            return []
+
+    def save_pending(self, ranges: List[List[str]]) -> None:
+        """Checkpoint the date ranges still to fetch and list them as missing in the manifest."""
+        os.makedirs(self.directory, exist_ok=True)
+        checkpoint_path = os.path.join(self.directory, CHECKPOINT_FILE)
+        if ranges:
+            _write_json(checkpoint_path, {"pending": ranges})
+        elif os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        manifest = self.manifest()
+        if manifest is not None and manifest.get("missing") != ranges:
+            _write_json(os.path.join(self.directory, MANIFEST_FILE), {**manifest, "missing": ranges})
+
+    def version(self) -> Optional[int]:
+        """
+        Generation of the store, incremented by every write, for caches of data derived
+        from it. Read from disk, so writes through other ReportStore instances count.
+        None if nothing is stored.
+        """
+        return self._generation if self._load_index() else None
+
+    def exists(self) -> bool:
+        return bool(self.partitions())
+
+    def first_timestamp(self) -> Optional[str]:
+        partitions = self.partitions()
+        return partitions[min(partitions)]["first"] if partitions else None
+
+    def last_timestamp(self) -> Optional[str]:
+        partitions = self.partitions()
+        return partitions[max(partitions)]["last"] if partitions else None
+
+    def count(self) -> int:
+        return sum(partition["count"] for partition in self.partitions().values())
+
+    def _read_partition(self, partition: str) -> List[Dict[str, Any]]:
+        try:
+            with open(self._partition_path(partition), "r") as f:
+                return json.load(f).get("items", [])
+        except FileNotFoundError:
+            return []
+
+    def read(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Items with start <= timestamp < end, sorted by timestamp.
+
+        Args:
+            start: Inclusive lower bound (a date or timestamp), unbounded if None
+            end: Exclusive upper bound (a date or timestamp), unbounded if None
+
+        Returns:
+            List of items read from the partitions overlapping the window only
+        """
+        start = normalize_timestamp(start) if start else None
+        end = normalize_timestamp(end) if end else None
+
+        items = []
+        for partition in sorted(self.partitions()):
+            if (start and partition < _partition_of(start)) or (end and partition > _partition_of(end)):
+                continue
+            items.extend(
+                item for item in self._read_partition(partition)
+                if (not start or item["timestamp"][:19] >= start) and (not end or item["timestamp"][:19] < end)
+            )
+        return items
+
+    def write(self, items: List[Dict[str, Any]], replace: bool = False, region: Optional[str] = None) -> None:
+        """
+        Merge items into the store, replacing stored items with the same timestamp.
+
+        Only the partitions of the given items are rewritten, then the index (with the
+        next generation) and the manifest.
+
+        Args:
+            items: Items to store
+            replace: Drop all stored items first
+            region: Region the report was collected from, kept in the manifest
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # Fresh from disk, so the generation follows writes of other instances. A new
+        # store starts at the current time, so a deleted and recreated one doesn't
+        # repeat the generations of the old one
+        generation = self._generation + 1 if self._load_index() else time.time_ns()
+        index = {} if replace else dict(self.partitions())
+
+        by_partition: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            by_partition.setdefault(_partition_of(item["timestamp"]), []).append(item)
+
+        for partition, partition_items in by_partition.items():
+            merged = {} if replace else {item["timestamp"]: item for item in self._read_partition(partition)}
+            merged.update((item["timestamp"], item) for item in partition_items)
+            ordered = sorted(merged.values(), key=lambda x: x["timestamp"])
+            size = _write_json(self._partition_path(partition), {"items": ordered})
+            index[partition] = {
+                "first": ordered[0]["timestamp"],
+                "last": ordered[-1]["timestamp"],
+                "count": len(ordered),
+                "bytes": size,
+            }
+
+        # The index is written last, so it never lists a partition that isn't there yet
+        _write_json(os.path.join(self.directory, INDEX_FILE),
+                    {"generation": generation, "partitions": dict(sorted(index.items()))})
+        stale = set(self.partitions()) - set(index)
+        previous_manifest = self.manifest() or {}
+        self._index, self._generation = index, generation
+        for partition in stale:
+            os.remove(self._partition_path(partition))
+
+        collected_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        manifest = self._build_manifest(index, collected_at, region or previous_manifest.get("region"),
+                                        previous_manifest.get("missing", []))
+        _write_json(os.path.join(self.directory, MANIFEST_FILE), manifest)
+
+    def _migrate_legacy(self) -> None:
+        """Split a single-file report of an earlier version into partitions."""
+        if not os.path.exists(self.legacy_path) or os.path.exists(os.path.join(self.directory, INDEX_FILE)):
+            return
+        try:
+            with open(self.legacy_path, "r") as f:
+                items = json.load(f).get("items", [])
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Not migrating unreadable report {self.legacy_path}: {e}")
+            return
+        self.write(items, replace=True)
+        os.remove(self.legacy_path)
+        logger.info(f"Migrated {self.legacy_path} into {len(self.partitions())} monthly partitions")
+
+
+def stored_clusters(root: str = REPORTS_DIR) -> List[str]:
+    """Directory names of the clusters with reports under root."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if any(os.path.isdir(os.path.join(root, name, report)) for report in REPORT_TYPES)
+    )
+
+
+def _age_hours(timestamp: Optional[str], now: datetime) -> Optional[float]:
+    if not timestamp:
+        return None
+    parsed = parse_datetime(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return round((now - parsed).total_seconds() / 3600, 1)
+
+
+def reports_status(root: str = REPORTS_DIR) -> List[Dict[str, Any]]:
+    """
+    Freshness of the reports of every locally stored cluster, from the manifests only.
+
+    Returns:
+        One dictionary per cluster with the manifest of each report type (None if not
+        stored) plus the hours since its last item and since it was collected
+    """
+    now = datetime.now(timezone.utc)
+    status = []
+    for cluster_id in stored_clusters(root):
+        cluster_status = {"cluster_id": cluster_id}
+        for report in REPORT_TYPES:
+            manifest = ReportStore(cluster_id, report, root).manifest()
+            if manifest is not None:
+                manifest = {
+                    **manifest,
+                    "last_age_hours": _age_hours(manifest["last"], now),
+                    "collected_age_hours": _age_hours(manifest["collected_at"], now),
+                }
+            cluster_status[report] = manifest
+        status.append(cluster_status)
+    return status
@@ -0,0 +1,205 @@
+"""
+Kubernetes resource quantities
+
+Parses quantity strings ("500m", "0.5Gi", "1e3", ...) into plain numbers and normalizes
+the requests and limits of every container of a snapshot into NumPy arrays, so that
+sizing, QoS and utilization math compares numbers instead of unit-dependent strings.
+CPU is expressed in cores and memory in bytes.
+"""
+
+from functools import lru_cache
+import math
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_BINARY_SUFFIXES = {
+    "Ki": 2 ** 10,
+    "Mi": 2 ** 20,
+    "Gi": 2 ** 30,
+    "Ti": 2 ** 40,
+    "Pi": 2 ** 50,
+    "Ei": 2 ** 60,
+}
+
+_DECIMAL_SUFFIXES = {
+    "n": 1e-9,
+    "u": 1e-6,
+    "m": 1e-3,
+    "": 1,
+    "k": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "P": 1e15,
+    "E": 1e18,
+}
+
+_QUANTITY_PATTERN = re.compile(r"^([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(Ki|Mi|Gi|Ti|Pi|Ei|[numkMGTPE]?)$")
+
+# Pods in these phases no longer hold resources on their node
+TERMINATED_POD_PHASES = ("Succeeded", "Failed")
+
+
+@lru_cache(maxsize=65536)
+def _parse_quantity_string(value: str) -> float:
+    match = _QUANTITY_PATTERN.match(value.strip())
+    if not match:
+        return math.nan
+    number, suffix = match.groups()
+    multiplier = _BINARY_SUFFIXES.get(suffix) or _DECIMAL_SUFFIXES[suffix]
+    return float(number) * multiplier
+
+
+def parse_quantity(value) -> float:
+    """
+    Parse a Kubernetes quantity into a number in base units.
+
+    Args:
+        value: A quantity string (e.g. "250m", "512Mi", "1.5G") or a number
+
+    Returns:
+        The quantity in base units (cores, bytes, ...), or NaN when the value is
+        missing or not a valid quantity
+    """
+    if value is None or isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str) or not value:
+        return math.nan
+    return _parse_quantity_string(value)
+
+
+def quantities_equal(a, b) -> bool:
+    """Compare two quantities by value, so "512Mi" equals "0.5Gi"."""
+    a_value = parse_quantity(a)
+    b_value = parse_quantity(b)
+    if math.isnan(a_value) or math.isnan(b_value):
+        return False
+    return math.isclose(a_value, b_value, rel_tol=1e-12, abs_tol=1e-12)
+
+
+class ResourceQuantities:
+    """
+    Normalized requests and limits of all pods of a snapshot.
+
+    Container arrays have one entry per container (init containers included, flagged by
+    container_is_init). Pod arrays are aligned with resources['pods'] and node arrays
+    with resources['nodes']. Unset requests and limits are NaN in container arrays and
+    count as zero in pod and node totals.
+    """
+
+    def __init__(self, pods: List[Dict], nodes: List[Dict]):
+        self.node_names: List[Optional[str]] = [node.get("metadata", {}).get("name") for node in nodes]
+        self.node_index: Dict[str, int] = {name: i for i, name in enumerate(self.node_names) if name}
+
+        allocatable = [node.get("status", {}).get("allocatable") or {} for node in nodes]
+        self.node_allocatable_cpu = np.array([parse_quantity(a.get("cpu")) for a in allocatable], dtype=np.float64)
+        self.node_allocatable_memory = np.array([parse_quantity(a.get("memory")) for a in allocatable], dtype=np.float64)
+        self.node_allocatable_pods = np.array([parse_quantity(a.get("pods")) for a in allocatable], dtype=np.float64)
+
+        container_pod = []
+        container_is_init = []
+        container_names = []
+        cpu_request = []
+        cpu_limit = []
+        memory_request = []
+        memory_limit = []
+        pod_node = []
+        pod_active = []
+        pod_overhead_cpu = []
+        pod_overhead_memory = []
+
+        for pod_idx, pod in enumerate(pods):
+            spec = pod.get("spec", {})
+            for is_init, key in ((False, "containers"), (True, "initContainers")):
+                for container in spec.get(key) or []:
+                    resources = container.get("resources") or {}
+                    requests = resources.get("requests") or {}
+                    limits = resources.get("limits") or {}
+                    container_pod.append(pod_idx)
+                    container_is_init.append(is_init)
+                    container_names.append(container.get("name"))
+                    cpu_request.append(parse_quantity(requests.get("cpu")))
+                    cpu_limit.append(parse_quantity(limits.get("cpu")))
+                    memory_request.append(parse_quantity(requests.get("memory")))
+                    memory_limit.append(parse_quantity(limits.get("memory")))
+
+            pod_node.append(self.node_index.get(spec.get("nodeName"), -1))
+            pod_active.append(pod.get("status", {}).get("phase") not in TERMINATED_POD_PHASES)
+            overhead = spec.get("overhead") or {}
+            pod_overhead_cpu.append(parse_quantity(overhead.get("cpu")))
+            pod_overhead_memory.append(parse_quantity(overhead.get("memory")))
+
+        self.pod_count = len(pods)
+        self.container_pod = np.array(container_pod, dtype=np.int64)
+        self.container_is_init = np.array(container_is_init, dtype=bool)
+        self.container_names = container_names
+        self.container_cpu_request = np.array(cpu_request, dtype=np.float64)
+        self.container_cpu_limit = np.array(cpu_limit, dtype=np.float64)
+        self.container_memory_request = np.array(memory_request, dtype=np.float64)
+        self.container_memory_limit = np.array(memory_limit, dtype=np.float64)
+        self.pod_node = np.array(pod_node, dtype=np.int64)
+        self.pod_active = np.array(pod_active, dtype=bool)
+
+        regular = ~self.container_is_init
+        self.pod_container_count = self._count_per_pod(regular)
+
+        # Effective pod requests, as seen by the scheduler: the larger of the sum of
+        # regular containers and the largest init container, plus the pod overhead
+        self.pod_cpu_request = self._effective_pod_total(self.container_cpu_request, np.array(pod_overhead_cpu))
+        self.pod_memory_request = self._effective_pod_total(self.container_memory_request, np.array(pod_overhead_memory))
+        self.pod_cpu_limit = self._sum_per_pod(self.container_cpu_limit, regular)
+        self.pod_memory_limit = self._sum_per_pod(self.container_memory_limit, regular)
+
+        has_cpu_request = ~np.isnan(self.container_cpu_request)
+        has_memory_request = ~np.isnan(self.container_memory_request)
+        has_memory_limit = ~np.isnan(self.container_memory_limit)
+        memory_equal = has_memory_request & has_memory_limit & np.isclose(
+            self.container_memory_request, self.container_memory_limit, rtol=1e-12, atol=0
+        )
+
+        has_containers = self.pod_container_count > 0
+        # Per pod checks over regular containers: True when every container passes
+        self.pod_all_requests = has_containers & (self._count_per_pod(regular & ~(has_cpu_request & has_memory_request)) == 0)
+        self.pod_all_memory_limits = has_containers & (self._count_per_pod(regular & ~has_memory_limit) == 0)
+        self.pod_all_memory_request_and_limit = has_containers & (
+            self._count_per_pod(regular & ~(has_memory_request & has_memory_limit)) == 0
+        )
+        self.pod_memory_guaranteed = self.pod_all_memory_request_and_limit & (
+            self._count_per_pod(regular & ~memory_equal) == 0
+        )
+
+        # Node totals over pods that are bound to a known node and still running
+        scheduled = self.pod_active & (self.pod_node >= 0)
+        node_count = len(self.node_names)
+        self.node_pod_count = np.bincount(self.pod_node[scheduled], minlength=node_count).astype(np.int64)
+        self.node_cpu_requested = np.bincount(
+            self.pod_node[scheduled], weights=self.pod_cpu_request[scheduled], minlength=node_count
+        )
+        self.node_memory_requested = np.bincount(
+            self.pod_node[scheduled], weights=self.pod_memory_request[scheduled], minlength=node_count
+        )
+
+    def _count_per_pod(self, mask: np.ndarray) -> np.ndarray:
+        return np.bincount(self.container_pod[mask], minlength=self.pod_count).astype(np.int64)
+
+    def _sum_per_pod(self, values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return np.bincount(
+            self.container_pod[mask], weights=np.nan_to_num(values[mask]), minlength=self.pod_count
+        )
+
+    def _effective_pod_total(self, values: np.ndarray, overhead: np.ndarray) -> np.ndarray:
+        regular_total = self._sum_per_pod(values, ~self.container_is_init)
+        init_max = np.zeros(self.pod_count, dtype=np.float64)
+        init = self.container_is_init
+        np.maximum.at(init_max, self.container_pod[init], np.nan_to_num(values[init]))
+        return np.maximum(regular_total, init_max) + np.nan_to_num(overhead)
+
+    def pod_containers(self, pod_idx: int) -> range:
+        """Indices into the container arrays of a pod's containers."""
+        # Containers are stored in pod order, so a pod's containers are contiguous
+        start, stop = np.searchsorted(self.container_pod, [pod_idx, pod_idx + 1])
+        return range(int(start), int(stop))
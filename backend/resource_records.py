@@ -0,0 +1,269 @@
+"""
+Compact in-memory representation of snapshot resources.
+
+Snapshots repeat the same strings (namespaces, label keys and values, images, node
+names, apiVersion/kind values) across every object. The ingestion pass in this module
+interns those strings, shares identical label maps between resources, drops
+metadata.managedFields and extracts the hot metadata of every resource into
+__slots__ records, so lookups by name, namespace, node or label don't have to walk
+the raw resource dictionaries.
+"""
+
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Strings longer than this are rarely repeated and expensive to hash, so they are kept as-is
+MAX_INTERNED_LENGTH = 256
+
+# managedFields are server-side apply bookkeeping that the UI never shows; they are
+# dropped from the stored bodies, so /resources/{type} and the other endpoints serving
+# snapshot objects return them without. Set SNAPSHOT_KEEP_MANAGED_FIELDS=true to keep them
+KEEP_MANAGED_FIELDS = os.environ.get("SNAPSHOT_KEEP_MANAGED_FIELDS", "").lower() in ("1", "true", "yes")
+
+# Shared by all records of unlabeled resources, never mutated
+_NO_LABELS: Dict[str, str] = {}
+
+
+class ResourceRecord:
+    """Hot metadata of a single resource."""
+
+    __slots__ = ("uid", "name", "namespace", "kind", "node_name", "labels")
+
+    def __init__(self, uid: Optional[str], name: Optional[str], namespace: Optional[str],
+                 kind: Optional[str], node_name: Optional[str], labels: Dict[str, str]):
+        self.uid = uid
+        self.name = name
+        self.namespace = namespace
+        self.kind = kind
+        self.node_name = node_name
+        self.labels = labels
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "uid": self.uid,
+            "name": self.name,
+            "namespace": self.namespace,
+            "kind": self.kind,
+            "nodeName": self.node_name,
+            "labels": self.labels,
+        }
+
+
+class SnapshotCompactor:
+    """
+    Interns strings and label maps across all resources of a snapshot.
+
+    A single compactor is used for the whole snapshot so that values are shared
+    between resource types too (e.g. node names in pods and nodes). Label maps with
+    identical content end up as the same dict object, so they must not be mutated
+    in place after compaction.
+    """
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+        self._label_sets: Dict[tuple, Dict[str, str]] = {}
+        self.strings_seen = 0
+        self.strings_deduplicated = 0
+        self.string_bytes_saved = 0
+        self.label_maps_seen = 0
+        self.label_maps_shared = 0
+        self.label_bytes_saved = 0
+        self.managed_fields_removed = 0
+        self.managed_fields_bytes = 0
+
+    def intern(self, value: str) -> str:
+        return self._strings.setdefault(value, value)
+
+    def compact_resources(self, resources: List[Dict]) -> None:
+        """Compact a list of resources in place."""
+        for resource in resources:
+            if not isinstance(resource, dict):
+                continue
+
+            metadata = resource.get("metadata")
+            if isinstance(metadata, dict):
+                if not KEEP_MANAGED_FIELDS and "managedFields" in metadata:
+                    self.managed_fields_removed += 1
+                    self.managed_fields_bytes += deep_sizeof(metadata.pop("managedFields"))
+
+            self._intern_values(resource)
+
+            if isinstance(metadata, dict):
+                labels = metadata.get("labels")
+                if isinstance(labels, dict) and labels:
+                    metadata["labels"] = self._share_labels(labels)
+
+            spec = resource.get("spec")
+            if isinstance(spec, dict):
+                template = spec.get("template")
+                template_metadata = template.get("metadata") if isinstance(template, dict) else None
+                if isinstance(template_metadata, dict) and isinstance(template_metadata.get("labels"), dict) and template_metadata["labels"]:
+                    template_metadata["labels"] = self._share_labels(template_metadata["labels"])
+
+    def _intern_values(self, root: Any) -> None:
+        """Replace every short string value below root by its interned copy."""
+        strings = self._strings
+        stack = [root]
+        seen = 0
+        deduplicated = 0
+        saved = 0
+
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if isinstance(value, str):
+                        if len(value) <= MAX_INTERNED_LENGTH:
+                            seen += 1
+                            interned = strings.setdefault(value, value)
+                            if interned is not value:
+                                node[key] = interned
+                                deduplicated += 1
+                                saved += sys.getsizeof(value)
+                    elif isinstance(value, (dict, list)):
+                        stack.append(value)
+            else:
+                for i, value in enumerate(node):
+                    if isinstance(value, str):
+                        if len(value) <= MAX_INTERNED_LENGTH:
+                            seen += 1
+                            interned = strings.setdefault(value, value)
+                            if interned is not value:
+                                node[i] = interned
+                                deduplicated += 1
+                                saved += sys.getsizeof(value)
+                    elif isinstance(value, (dict, list)):
+                        stack.append(value)
+
+        self.strings_seen += seen
+        self.strings_deduplicated += deduplicated
+        self.string_bytes_saved += saved
+
+    def _share_labels(self, labels: Dict[str, str]) -> Dict[str, str]:
+        """Return a shared dict for label maps with identical content."""
+        self.label_maps_seen += 1
+        try:
+            key = tuple(sorted(labels.items()))
+        except TypeError:
+            return labels
+
+        shared = self._label_sets.setdefault(key, labels)
+        if shared is not labels:
+            self.label_maps_shared += 1
+            self.label_bytes_saved += sys.getsizeof(labels)
+        return shared
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "strings_seen": self.strings_seen,
+            "unique_strings": len(self._strings),
+            "strings_deduplicated": self.strings_deduplicated,
+            "string_bytes_saved": self.string_bytes_saved,
+            "label_maps_seen": self.label_maps_seen,
+            "unique_label_maps": len(self._label_sets),
+            "label_maps_shared": self.label_maps_shared,
+            "label_bytes_saved": self.label_bytes_saved,
+            "managed_fields_removed": self.managed_fields_removed,
+            "managed_fields_bytes_removed": self.managed_fields_bytes,
+        }
+
+
+def build_records(resources: Iterable[Dict], default_kind: str, compactor: SnapshotCompactor) -> List[ResourceRecord]:
+    """
+    Extract the hot metadata of each resource into a ResourceRecord.
+
+    Args:
+        resources: The resources of a single type
+        default_kind: Kind to use for list items that don't carry their own kind
+        compactor: The snapshot compactor, used to intern the kind
+
+    Returns:
+        List of records, in the same order as the resources
+    """
+    default_kind = compactor.intern(default_kind)
+    records = []
+    for resource in resources:
+        metadata = resource.get("metadata") or {}
+        spec = resource.get("spec")
+        kind = resource.get("kind")
+        records.append(ResourceRecord(
+            uid=metadata.get("uid"),
+            name=metadata.get("name"),
+            namespace=metadata.get("namespace"),
+            kind=compactor.intern(kind) if isinstance(kind, str) else default_kind,
+            node_name=spec.get("nodeName") if isinstance(spec, dict) else None,
+            labels=metadata.get("labels") or _NO_LABELS,
+        ))
+    return records
+
+
+def build_controller_map(resources_by_kind: Dict[str, List[Dict]]) -> Dict[Tuple, Tuple]:
+    """
+    Map (kind, namespace, name) of each resource to its controlling owner.
+
+    Args:
+        resources_by_kind: Resources keyed by their kind, e.g. {"Pod": pods, "ReplicaSet": replicasets}
+
+    Returns:
+        Dictionary from (kind, namespace, name) to the owner's (kind, namespace, name)
+    """
+    owners = {}
+    for kind, items in resources_by_kind.items():
+        for item in items:
+            metadata = item.get("metadata", {})
+            for owner in metadata.get("ownerReferences") or []:
+                if owner.get("controller", True):
+                    owners[(kind, metadata.get("namespace"), metadata.get("name"))] = (
+                        owner.get("kind"), metadata.get("namespace"), owner.get("name")
+                    )
+                    break
+    return owners
+
+
+def resolve_workload(object_key: Tuple, owners: Dict[Tuple, Tuple]) -> Tuple:
+    """Follow controller ownerReferences from object_key up to the top-level workload."""
+    seen = set()
+    while object_key in owners and object_key not in seen:
+        seen.add(object_key)
+        object_key = owners[object_key]
+    return object_key
+
+
+def deep_sizeof(root: Any) -> int:
+    """
+    Approximate the memory held by a JSON-like object graph.
+
+    Shared objects (interned strings, shared label maps) are counted once.
+    """
+    seen = set()
+    total = 0
+    stack = [root]
+
+    while stack:
+        node = stack.pop()
+        node_id = id(node)
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        total += sys.getsizeof(node)
+
+        if isinstance(node, dict):
+            stack.extend(node.keys())
+            stack.extend(node.values())
+        elif isinstance(node, (list, tuple)):
+            stack.extend(node)
+        elif isinstance(node, ResourceRecord):
+            stack.extend(getattr(node, slot) for slot in ResourceRecord.__slots__)
+
+    return total
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Current resident set size of the process, when the platform exposes it."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
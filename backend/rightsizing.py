@@ -0,0 +1,326 @@
+"""
+Right-sizing analysis
+
+Joins the snapshot's pod metrics (podmetrics) with the normalized container requests
+and limits of ResourceQuantities, and compares both with the WOOP recommendations.
+All per-container math is done once on NumPy arrays; reports then aggregate waste
+(requested but unused) and shortfall (used but not requested) per workload or
+namespace with bincount and only build rows for the requested page.
+
+Pod metrics are a point-in-time sample, so the ratios describe usage at snapshot time.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from resource_quantity import ResourceQuantities, parse_quantity
+from resource_records import build_controller_map, resolve_workload
+
+# A container using less than this share of its request is over-provisioned
+OVER_PROVISIONED_RATIO = 0.5
+
+# A container using more than this share of its request is under-provisioned
+UNDER_PROVISIONED_RATIO = 1.0
+
+# Memory usage above this share of the limit puts a container at risk of OOM kills
+MEMORY_LIMIT_PRESSURE_RATIO = 0.9
+
+GROUP_BY = ("workload", "namespace")
+
+SORT_KEYS = ("cpuWaste", "memoryWaste", "cpuShortfall", "memoryShortfall", "containers")
+
+
+class _GroupCodes:
+    def __init__(self):
+        self.keys: List[Tuple] = []
+        self._codes: Dict[Tuple, int] = {}
+
+    def code(self, key: Tuple) -> int:
+        code = self._codes.get(key)
+        if code is None:
+            code = len(self.keys)
+            self._codes[key] = code
+            self.keys.append(key)
+        return code
+
+
+def _optional(value: float, digits: int) -> Optional[float]:
+    """Round a number for the report, whole numbers (bytes) as int, NaN as None."""
+    if np.isnan(value):
+        return None
+    return int(round(float(value))) if digits == 0 else round(float(value), digits)
+
+
+class RightsizingAnalysis:
+    """
+    Usage, requests and recommendations of every container of a snapshot.
+
+    Container arrays are aligned with the quantities' container arrays. Only regular
+    containers of running pods that have a pod metrics sample are "measured" and take
+    part in the aggregations.
+    """
+
+    def __init__(self, resources: Dict[str, List[Dict]], pod_records: List, quantities: ResourceQuantities):
+        q = quantities
+        self.quantities = q
+        container_count = len(q.container_pod)
+
+        self.cpu_usage = np.full(container_count, np.nan)
+        self.memory_usage = np.full(container_count, np.nan)
+        self.cpu_recommended = np.full(container_count, np.nan)
+        self.memory_recommended = np.full(container_count, np.nan)
+
+        pod_lookup = {(record.namespace, record.name): i for i, record in enumerate(pod_records)}
+        self.unmatched_metrics = 0
+        for metric in resources.get('podmetrics', []):
+            metadata = metric.get("metadata", {})
+            pod_idx = pod_lookup.get((metadata.get("namespace"), metadata.get("name")))
+            if pod_idx is None:
+                self.unmatched_metrics += 1
+                continue
+            containers = self._regular_containers(pod_idx)
+            for container in metric.get("containers") or []:
+                container_idx = containers.get(container.get("name"))
+                if container_idx is None:
+                    continue
+                usage = container.get("usage") or {}
+                self.cpu_usage[container_idx] = parse_quantity(usage.get("cpu"))
+                self.memory_usage[container_idx] = parse_quantity(usage.get("memory"))
+
+        # Workloads: pods resolved to their top-level controller (ReplicaSet -> Deployment)
+        owners = build_controller_map({"Pod": resources.get('pods', []), "ReplicaSet": resources.get('replicasets', [])})
+        self.workloads = _GroupCodes()
+        self.namespaces = _GroupCodes()
+        pod_workloads = []
+        pod_namespaces = []
+        for record in pod_records:
+            workload = resolve_workload(("Pod", record.namespace, record.name), owners)
+            pod_workloads.append(self.workloads.code(workload))
+            pod_namespaces.append(self.namespaces.code((record.namespace,)))
+        self.pod_workload = np.array(pod_workloads, dtype=np.int64)
+        self.pod_namespace = np.array(pod_namespaces, dtype=np.int64)
+
+        self.recommendations_matched = self._apply_recommendations(resources.get('woop', []))
+
+        regular_active = ~q.container_is_init & q.pod_active[q.container_pod]
+        self.measured = regular_active & ~(np.isnan(self.cpu_usage) & np.isnan(self.memory_usage))
+        self.unmeasured_containers = int((regular_active & ~self.measured).sum())
+
+        cpu_request = np.nan_to_num(q.container_cpu_request)
+        memory_request = np.nan_to_num(q.container_memory_request)
+        cpu_usage = np.nan_to_num(self.cpu_usage)
+        memory_usage = np.nan_to_num(self.memory_usage)
+        measured = self.measured
+
+        self.cpu_waste = np.where(measured, np.maximum(cpu_request - cpu_usage, 0), 0)
+        self.memory_waste = np.where(measured, np.maximum(memory_request - memory_usage, 0), 0)
+        self.cpu_shortfall = np.where(measured, np.maximum(cpu_usage - cpu_request, 0), 0)
+        self.memory_shortfall = np.where(measured, np.maximum(memory_usage - memory_request, 0), 0)
+
+        self.cpu_over = measured & (cpu_request > 0) & (cpu_usage < cpu_request * OVER_PROVISIONED_RATIO)
+        self.memory_over = measured & (memory_request > 0) & (memory_usage < memory_request * OVER_PROVISIONED_RATIO)
+        self.cpu_under = measured & (cpu_usage > cpu_request * UNDER_PROVISIONED_RATIO)
+        self.memory_under = measured & (memory_usage > memory_request * UNDER_PROVISIONED_RATIO)
+        memory_limit = q.container_memory_limit
+        self.memory_limit_pressure = measured & ~np.isnan(memory_limit) & (
+            memory_usage >= np.nan_to_num(memory_limit) * MEMORY_LIMIT_PRESSURE_RATIO
+        )
+
+        self._aggregates: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def _regular_containers(self, pod_idx: int) -> Dict[str, int]:
+        q = self.quantities
+        return {
+            q.container_names[c]: c for c in q.pod_containers(pod_idx) if not q.container_is_init[c]
+        }
+
+    def _apply_recommendations(self, recommendations: List[Dict]) -> int:
+        """Spread per-workload WOOP container recommendations over the workload's pods."""
+        by_workload: Dict[Tuple, Dict[str, Dict]] = {}
+        for recommendation in recommendations:
+            spec = recommendation.get("spec") or {}
+            target = spec.get("targetRef") or {}
+            containers = spec.get("recommendation")
+            if not isinstance(containers, list):
+                continue
+            key = (target.get("kind"), recommendation.get("metadata", {}).get("namespace"), target.get("name"))
+            by_workload[key] = {
+                container.get("containerName"): container.get("requests") or {}
+                for container in containers if isinstance(container, dict)
+            }
+        if not by_workload:
+            return 0
+
+        matched = 0
+        for pod_idx, workload_code in enumerate(self.pod_workload.tolist()):
+            containers = by_workload.get(self.workloads.keys[workload_code])
+            if not containers:
+                continue
+            for name, container_idx in self._regular_containers(pod_idx).items():
+                requests = containers.get(name)
+                if requests is None:
+                    continue
+                self.cpu_recommended[container_idx] = parse_quantity(requests.get("cpu"))
+                self.memory_recommended[container_idx] = parse_quantity(requests.get("memory"))
+                matched += 1
+        return matched
+
+    def _aggregate(self, group_by: str) -> Dict[str, np.ndarray]:
+        if group_by in self._aggregates:
+            return self._aggregates[group_by]
+
+        q = self.quantities
+        if group_by == "workload":
+            pod_groups, size = self.pod_workload, len(self.workloads.keys)
+        else:
+            pod_groups, size = self.pod_namespace, len(self.namespaces.keys)
+
+        measured = self.measured
+        groups = pod_groups[q.container_pod[measured]]
+
+        def total(values: np.ndarray) -> np.ndarray:
+            return np.bincount(groups, weights=np.nan_to_num(values[measured]), minlength=size)
+
+        has_recommendation = measured & ~np.isnan(self.cpu_recommended) & ~np.isnan(self.memory_recommended)
+        with_recommendation = has_recommendation[measured]
+
+        measured_pods = np.zeros(q.pod_count, dtype=bool)
+        measured_pods[q.container_pod[measured]] = True
+
+        aggregates = {
+            "pods": np.bincount(pod_groups[measured_pods], minlength=size),
+            "containers": np.bincount(groups, minlength=size),
+            "cpuRequested": total(q.container_cpu_request),
+            "cpuUsed": total(self.cpu_usage),
+            "cpuWaste": total(self.cpu_waste),
+            "cpuShortfall": total(self.cpu_shortfall),
+            "memoryRequested": total(q.container_memory_request),
+            "memoryUsed": total(self.memory_usage),
+            "memoryWaste": total(self.memory_waste),
+            "memoryShortfall": total(self.memory_shortfall),
+            "cpuOver": total(self.cpu_over.astype(np.float64)),
+            "cpuUnder": total(self.cpu_under.astype(np.float64)),
+            "memoryOver": total(self.memory_over.astype(np.float64)),
+            "memoryUnder": total(self.memory_under.astype(np.float64)),
+            "memoryLimitPressure": total(self.memory_limit_pressure.astype(np.float64)),
+            "recommendedContainers": np.bincount(groups[with_recommendation], minlength=size),
+            "cpuRecommended": total(np.where(has_recommendation, self.cpu_recommended, 0)),
+            "memoryRecommended": total(np.where(has_recommendation, self.memory_recommended, 0)),
+            "cpuRequestedRecommended": total(np.where(has_recommendation, q.container_cpu_request, 0)),
+            "memoryRequestedRecommended": total(np.where(has_recommendation, q.container_memory_request, 0)),
+        }
+        self._aggregates[group_by] = aggregates
+        return aggregates
+
+    def report(self, group_by: str = "workload", namespace: Optional[str] = None, sort_by: str = "cpuWaste",
+               page: int = 1, page_size: int = 50) -> Dict:
+        """
+        Paginated right-sizing rows per workload or namespace.
+
+        Args:
+            group_by: 'workload' or 'namespace'
+            namespace: Only return rows of this namespace
+            sort_by: Column to sort by, descending (one of SORT_KEYS)
+            page: 1-based page number
+            page_size: Rows per page
+
+        Returns:
+            Dictionary with a cluster summary, the page of rows and pagination info.
+            CPU is in cores and memory in bytes.
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Invalid group_by '{group_by}', expected one of {list(GROUP_BY)}")
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Invalid sort_by '{sort_by}', expected one of {list(SORT_KEYS)}")
+        if page < 1 or page_size < 1:
+            raise ValueError("page and page_size must be positive")
+
+        aggregates = self._aggregate(group_by)
+        keys = self.workloads.keys if group_by == "workload" else self.namespaces.keys
+        namespace_position = 1 if group_by == "workload" else 0
+
+        candidates = np.flatnonzero(aggregates["containers"] > 0)
+        if namespace is not None:
+            candidates = np.array(
+                [i for i in candidates.tolist() if keys[i][namespace_position] == namespace], dtype=np.int64
+            )
+        order = candidates[np.argsort(-aggregates[sort_by][candidates], kind="stable")]
+        start = (page - 1) * page_size
+        items = [self._row(keys[i], aggregates, i, group_by) for i in order[start:start + page_size].tolist()]
+
+        return {
+            "summary": self.summary(),
+            "groupBy": group_by,
+            "sortBy": sort_by,
+            "page": page,
+            "pageSize": page_size,
+            "total": int(len(order)),
+            "items": items,
+        }
+
+    @staticmethod
+    def _row(key: Tuple, aggregates: Dict[str, np.ndarray], i: int, group_by: str) -> Dict:
+        if group_by == "workload":
+            row = {"kind": key[0], "namespace": key[1], "name": key[2]}
+        else:
+            row = {"namespace": key[0]}
+
+        row["pods"] = int(aggregates["pods"][i])
+        row["containers"] = int(aggregates["containers"][i])
+        for resource, digits in (("cpu", 3), ("memory", 0)):
+            requested = aggregates[f"{resource}Requested"][i]
+            used = aggregates[f"{resource}Used"][i]
+            recommended_containers = int(aggregates["recommendedContainers"][i])
+            recommended = aggregates[f"{resource}Recommended"][i]
+            row[resource] = {
+                "requested": _optional(requested, digits),
+                "used": _optional(used, digits),
+                "waste": _optional(aggregates[f"{resource}Waste"][i], digits),
+                "shortfall": _optional(aggregates[f"{resource}Shortfall"][i], digits),
+                "utilization": _optional(used / requested * 100, 1) if requested > 0 else None,
+                "overProvisioningRatio": _optional(requested / used, 2) if used > 0 else None,
+                "overProvisionedContainers": int(aggregates[f"{resource}Over"][i]),
+                "underProvisionedContainers": int(aggregates[f"{resource}Under"][i]),
+                "recommended": _optional(recommended, digits) if recommended_containers else None,
+                # Requested minus recommended, over the containers that have a recommendation
+                "recommendationDelta": _optional(
+                    aggregates[f"{resource}RequestedRecommended"][i] - recommended, digits
+                ) if recommended_containers else None,
+            }
+        row["memory"]["limitPressureContainers"] = int(aggregates["memoryLimitPressure"][i])
+        row["recommendedContainers"] = int(aggregates["recommendedContainers"][i])
+        return row
+
+    def summary(self) -> Dict:
+        measured = self.measured
+        q = self.quantities
+        cpu_requested = float(np.nansum(q.container_cpu_request[measured]))
+        memory_requested = float(np.nansum(q.container_memory_request[measured]))
+        cpu_used = float(np.nansum(self.cpu_usage[measured]))
+        memory_used = float(np.nansum(self.memory_usage[measured]))
+        return {
+            "measuredContainers": int(measured.sum()),
+            "unmeasuredContainers": self.unmeasured_containers,
+            "unmatchedMetrics": self.unmatched_metrics,
+            "recommendedContainers": self.recommendations_matched,
+            "cpu": {
+                "requested": round(cpu_requested, 3),
+                "used": round(cpu_used, 3),
+                "waste": round(float(self.cpu_waste.sum()), 3),
+                "shortfall": round(float(self.cpu_shortfall.sum()), 3),
+                "utilization": round(cpu_used / cpu_requested * 100, 1) if cpu_requested > 0 else None,
+                "overProvisionedContainers": int(self.cpu_over.sum()),
+                "underProvisionedContainers": int(self.cpu_under.sum()),
+            },
+            "memory": {
+                "requested": int(memory_requested),
+                "used": int(memory_used),
+                "waste": int(self.memory_waste.sum()),
+                "shortfall": int(self.memory_shortfall.sum()),
+                "utilization": round(memory_used / memory_requested * 100, 1) if memory_requested > 0 else None,
+                "overProvisionedContainers": int(self.memory_over.sum()),
+                "underProvisionedContainers": int(self.memory_under.sum()),
+                "limitPressureContainers": int(self.memory_limit_pressure.sum()),
+            },
+        }
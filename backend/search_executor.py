@@ -0,0 +1,142 @@
+"""
+Parallel execution of component searches over large snapshots.
+
+The loaded snapshot is shared with the workers by forking: every worker inherits the
+ClusterExplorer copy-on-write and only receives the (resource type, start, stop) bounds
+of the chunk it has to evaluate. Chunk results are returned in submission order, so the
+merged matches are in the same order as a sequential search.
+
+The API server handles requests on several threads while the workers are forked, so:
+
+- parallel searches are serialized with a lock, as the explorer handed to the workers
+  and gc.freeze() are process-wide state;
+- workers replace the inherited stdout before matching, since another request thread
+  may have held its lock when the pool was forked (logging locks are reinitialized
+  after a fork by Python itself);
+- workers touch nothing but the explorer.
+
+That makes it safe with the single-worker server the app is run with; other code
+forking the server process should take _search_lock as well.
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from debug_logger import debug_log
+
+# Searches over fewer resources than this run sequentially in the request process
+PARALLEL_SEARCH_THRESHOLD = int(os.environ.get("SEARCH_PARALLEL_THRESHOLD", "20000"))
+
+# Number of resources evaluated by a worker per task
+SEARCH_CHUNK_SIZE = int(os.environ.get("SEARCH_CHUNK_SIZE", "2000"))
+
+# Upper bound for the worker pool, defaults to the number of CPUs
+SEARCH_MAX_WORKERS = int(os.environ.get("SEARCH_MAX_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Explorer inherited by forked workers, only set while a parallel search is running
+_worker_explorer = None
+
+# Held while a parallel search runs; guards _worker_explorer and the gc freeze
+_search_lock = threading.Lock()
+
+
+def _search_chunk(task: Tuple[str, int, int, List[str], str, bool]) -> Tuple[List[Dict], List[int]]:
+    """
+    Evaluate a single chunk inside a worker process.
+
+    Returns:
+        The matching rows of the chunk and the indices of resources that carry the
+        memory imbalance annotation, so the parent can apply it to its own copy.
+    """
+    resource_type, start, stop, components, mode, collect_annotations = task
+    matches = _worker_explorer._match_resources(resource_type, start, stop, components, mode)
+
+    annotated = []
+    if collect_annotations:
+        resources = _worker_explorer.resources[resource_type]
+        for i in range(start, stop):
+            annotations = resources[i].get("metadata", {}).get("annotations") or {}
+            if annotations.get("memory-resources-imbalance") == "true":
+                annotated.append(i)
+
+    return matches, annotated
+
+
+def _init_worker() -> None:
+    # The inherited stdout's lock may be held by a thread that doesn't exist in the
+    # worker; the per-resource search output of the workers isn't needed anyway
+    sys.stdout = open(os.devnull, "w")
+
+
+def _fork_context():
+    """Return a fork multiprocessing context, or None when the platform can't fork."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork")
+
+
+def parallel_search(explorer, resource_types: List[str], components: List[str], mode: str) -> Optional[List[Dict]]:
+    """
+    Run search_by_components matching over a pool of forked workers.
+
+    Concurrent calls (from different request threads) run one after the other.
+
+    Args:
+        explorer: The ClusterExplorer holding the loaded snapshot
+        resource_types: Resource types to search in, all present in explorer.resources
+        components: List of component paths to search for
+        mode: Either 'include' or 'exclude'
+
+    Returns:
+        List of search result rows in resource order, or None when the search should
+        run sequentially instead (single CPU, no fork support or a single chunk)
+    """
+    global _worker_explorer
+
+    context = _fork_context()
+    if context is None:
+        return None
+
+    tasks = []
+    collect_annotations = "resources.requests" in components
+    for resource_type in resource_types:
+        resource_count = len(explorer.resources[resource_type])
+        for start in range(0, resource_count, SEARCH_CHUNK_SIZE):
+            stop = min(start + SEARCH_CHUNK_SIZE, resource_count)
+            tasks.append((resource_type, start, stop, components, mode, collect_annotations))
+
+    workers = min(SEARCH_MAX_WORKERS, len(tasks))
+    if workers < 2:
+        return None
+
+    debug_log(f"Running parallel search: {len(tasks)} chunks on {workers} workers", "INFO")
+
+    with _search_lock:
+        _worker_explorer = explorer
+        # Keep the loaded snapshot out of the workers' garbage collector so that
+        # collections don't touch (and copy) every shared page
+        gc.freeze()
+        try:
+            with context.Pool(processes=workers, initializer=_init_worker) as pool:
+                chunk_results = pool.map(_search_chunk, tasks, chunksize=1)
+        finally:
+            gc.unfreeze()
+            _worker_explorer = None
+
+    results = []
+    for task, (matches, annotated) in zip(tasks, chunk_results):
+        results.extend(matches)
+
+        # Annotations set by the workers only exist in their copy of the snapshot
+        resources = explorer.resources[task[0]]
+        for i in annotated:
+            metadata = resources[i].setdefault("metadata", {})
+            if not metadata.get("annotations"):
+                metadata["annotations"] = {}
+            metadata["annotations"]["memory-resources-imbalance"] = "true"
+
+    return results
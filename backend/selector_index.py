@@ -0,0 +1,90 @@
+"""
+Label selector index
+
+Resolves which label selectors (e.g. of PodDisruptionBudgets) select a given label
+set without testing every selector. Selectors are indexed per namespace by the
+(key, value) pairs of their matchLabels; a lookup walks the postings of the labels'
+pairs and keeps the selectors whose matchLabels were all hit, then checks their
+matchExpressions.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+
+def _expression_matches(expression: Dict, labels: Dict[str, str]) -> bool:
+    key = expression.get("key")
+    operator = expression.get("operator")
+    values = expression.get("values") or []
+    if operator == "In":
+        return key in labels and labels[key] in values
+    if operator == "NotIn":
+        return key not in labels or labels[key] not in values
+    if operator == "Exists":
+        return key in labels
+    if operator == "DoesNotExist":
+        return key not in labels
+    # Unknown operators never match, like the API server rejecting them
+    return False
+
+
+def selector_matches(selector: Optional[Dict], labels: Dict[str, str]) -> bool:
+    """
+    Whether a label selector selects a label set.
+
+    A missing selector selects nothing, an empty selector selects everything.
+    """
+    if selector is None:
+        return False
+    match_labels = selector.get("matchLabels") or {}
+    if any(labels.get(key) != value for key, value in match_labels.items()):
+        return False
+    return all(_expression_matches(expression, labels) for expression in selector.get("matchExpressions") or [])
+
+
+class SelectorIndex:
+    """
+    Per-namespace postings of label selectors.
+
+    Args:
+        selectors: (namespace, selector) pairs; lookups return positions in this list
+    """
+
+    def __init__(self, selectors: List[Tuple[Optional[str], Optional[Dict]]]):
+        self._selectors = selectors
+        self._postings: Dict[Optional[str], Dict[Tuple[str, str], List[int]]] = {}
+        self._requirement_counts: List[int] = []
+        # Selectors without matchLabels: candidates for every lookup in their namespace
+        self._unlabeled: Dict[Optional[str], List[int]] = {}
+
+        for i, (namespace, selector) in enumerate(selectors):
+            match_labels = (selector or {}).get("matchLabels") or {}
+            self._requirement_counts.append(len(match_labels))
+            if selector is None:
+                continue
+            if not match_labels:
+                self._unlabeled.setdefault(namespace, []).append(i)
+                continue
+            postings = self._postings.setdefault(namespace, {})
+            for pair in match_labels.items():
+                postings.setdefault(pair, []).append(i)
+
+    def matching(self, namespace: Optional[str], labels: Dict[str, str]) -> List[int]:
+        """
+        Positions of the selectors in namespace that select labels, in index order.
+        """
+        candidates = list(self._unlabeled.get(namespace, ()))
+        postings = self._postings.get(namespace)
+        if postings:
+            hits: Dict[int, int] = {}
+            for pair in labels.items():
+                for i in postings.get(pair, ()):
+                    hits[i] = hits.get(i, 0) + 1
+            counts = self._requirement_counts
+            candidates.extend(i for i, hit_count in hits.items() if hit_count == counts[i])
+
+        matches = []
+        for i in sorted(candidates):
+            expressions = self._selectors[i][1].get("matchExpressions")
+            if not expressions or all(_expression_matches(expression, labels) for expression in expressions):
+                matches.append(i)
+        return matches
@@ -0,0 +1,16 @@
+"""
+Location of cluster snapshots in the snapshot store buckets.
+"""
+
+BUCKET_MAPPING = {
+    "US": "prod-master-console-cluster-snapshots-snapshotstore",
+    "EU": "prod-eu-console-cluster-snapshots-snapshotstore"
+}
+
+LATEST_SNAPSHOT = "latest-snapshot.json.gz"
+
+
+def snapshot_uri(cluster_id: str, region: str = "US", snapshot: str = LATEST_SNAPSHOT) -> str:
+    """gs:// URI of a cluster snapshot, in the bucket of the cluster's region (US when unknown)."""
+    bucket = BUCKET_MAPPING.get(region.upper(), BUCKET_MAPPING["US"])
+    return f"gs://{bucket}/{cluster_id}/{snapshot}"
@@ -0,0 +1,216 @@
+"""
+Server-side aggregation of cost and efficiency reports
+
+A stored report is turned into a columnar form once per version of its store: a
+datetime64 array of the item timestamps, one float array per numeric field (the API
+sends numbers as strings) and one object array per text field. Queries slice it by
+time range, bucket the rows by day, week or month, optionally group them, and reduce
+every numeric field per bucket with NumPy, so report pages receive a few aggregated
+rows instead of the full daily history. Results are cached per query and store version.
+"""
+
+from collections import OrderedDict
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from report_store import ReportStore, normalize_timestamp
+
+STEPS = ("day", "week", "month")
+
+AGGREGATIONS = ("mean", "sum", "min", "max", "last")
+
+# Pseudo field grouping the OnDemand/Spot/SpotFallback variants of each field
+LIFECYCLE = "lifecycle"
+LIFECYCLE_PATTERN = re.compile(r"SpotFallback|OnDemand|Spot")
+LIFECYCLES = {"OnDemand": "on-demand", "Spot": "spot", "SpotFallback": "spot-fallback"}
+
+MAX_CACHED_QUERIES = 256
+
+
+def _to_float(value: Any) -> float:
+    if value is None or value == "":
+        return np.nan
+    return float(value)
+
+
+class TimeSeries:
+    """
+    Columnar form of report items.
+
+    Args:
+        items: Report items sorted by timestamp
+    """
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.timestamps = np.array([item["timestamp"][:19] for item in items], dtype="datetime64[s]")
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, np.ndarray] = {}
+
+        fields = list(dict.fromkeys(field for item in items for field in item if field != "timestamp"))
+        for field in fields:
+            values = [item.get(field) for item in items]
+            try:
+                self.numeric[field] = np.array([_to_float(value) for value in values], dtype=np.float64)
+            except (TypeError, ValueError):
+                self.labels[field] = np.array(["" if value is None else str(value) for value in values], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _buckets(self, timestamps: np.ndarray, step: str) -> np.ndarray:
+        days = timestamps.astype("datetime64[D]")
+        if step == "day":
+            return days
+        if step == "week":
+            # Weeks start on Monday; 1970-01-01 was a Thursday
+            day_numbers = days.astype(np.int64)
+            return (day_numbers - (day_numbers + 3) % 7).astype("datetime64[D]")
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+
+    def _groups(self, group_by: Optional[str], rows: slice) -> List[Tuple[Optional[str], Optional[np.ndarray], Dict[str, np.ndarray]]]:
+        """(group value, row codes or None, numeric columns) of each group of the query."""
+        numeric = {field: column[rows] for field, column in self.numeric.items()}
+        if group_by is None:
+            return [(None, None, numeric)]
+        if group_by == LIFECYCLE:
+            by_lifecycle: Dict[str, Dict[str, np.ndarray]] = {}
+            for field, column in numeric.items():
+                match = LIFECYCLE_PATTERN.search(field)
+                if match:
+                    base = field[:match.start()] + field[match.end():]
+                    by_lifecycle.setdefault(LIFECYCLES[match.group(0)], {})[base] = column
+            return [(lifecycle, None, columns) for lifecycle, columns in sorted(by_lifecycle.items())]
+        if group_by not in self.labels:
+            raise ValueError(f"Cannot group by '{group_by}', expected '{LIFECYCLE}' or one of {sorted(self.labels)}")
+        values, codes = np.unique(self.labels[group_by][rows], return_inverse=True)
+        return [(value, codes == i, numeric) for i, value in enumerate(values.tolist())]
+
+    def aggregate(self, start: Optional[str] = None, end: Optional[str] = None, step: Optional[str] = None,
+                  group_by: Optional[str] = None, agg: str = "mean") -> Dict[str, Any]:
+        """
+        Aggregate the numeric fields per time bucket and group.
+
+        Args:
+            start: Inclusive lower bound (a date or timestamp)
+            end: Exclusive upper bound (a date or timestamp)
+            step: Bucket size, one of STEPS; None aggregates the whole range into one row
+            group_by: A text field of the items, or 'lifecycle' to split the OnDemand,
+                Spot and SpotFallback variants of each field into rows
+            agg: Reduction of the values in a bucket, one of AGGREGATIONS; missing
+                values are ignored
+
+        Returns:
+            Dictionary with the query and one item per bucket (and group) holding the
+            bucket start as timestamp, the group value, the number of source items
+            and the aggregated fields
+        """
+        if step is not None and step not in STEPS:
+            raise ValueError(f"Invalid step '{step}', expected one of {list(STEPS)}")
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Invalid aggregation '{agg}', expected one of {list(AGGREGATIONS)}")
+
+        first = np.searchsorted(self.timestamps, np.datetime64(normalize_timestamp(start))) if start else 0
+        last = np.searchsorted(self.timestamps, np.datetime64(normalize_timestamp(end))) if end else len(self)
+        rows = slice(first, max(first, last))
+        timestamps = self.timestamps[rows]
+
+        if step is not None:
+            buckets = self._buckets(timestamps, step)
+        else:
+            buckets = np.full(len(timestamps), timestamps[0] if len(timestamps) else np.datetime64(0, "s"),
+                              dtype="datetime64[s]").astype("datetime64[D]")
+
+        items = []
+        for group, mask, columns in self._groups(group_by, rows):
+            group_buckets = buckets if mask is None else buckets[mask]
+            if not len(group_buckets):
+                continue
+            keys, inverse = np.unique(group_buckets, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(keys))
+            # Rows sorted by bucket, stable so "last" keeps timestamp order within a bucket
+            order = np.argsort(inverse, kind="stable")
+            boundaries = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+            results = {}
+            for field, column in columns.items():
+                values = column if mask is None else column[mask]
+                results[field] = self._reduce(values[order], inverse[order], boundaries, counts, len(keys), agg)
+
+            for i, key in enumerate(keys):
+                item = {"timestamp": f"{np.datetime_as_string(key, unit='D')}T00:00:00Z"}
+                if group_by is not None:
+                    item[group_by] = group
+                item["count"] = int(counts[i])
+                for field, reduced in results.items():
+                    value = reduced[i]
+                    item[field] = None if np.isnan(value) else round(float(value), 6)
+                items.append(item)
+
+        items.sort(key=lambda item: (item["timestamp"], item.get(group_by) or "") if group_by else item["timestamp"])
+        return {
+            "start": start,
+            "end": end,
+            "step": step,
+            "groupBy": group_by,
+            "agg": agg,
+            "items": items,
+        }
+
+    @staticmethod
+    def _reduce(values: np.ndarray, inverse: np.ndarray, boundaries: np.ndarray, counts: np.ndarray,
+                buckets: int, agg: str) -> np.ndarray:
+        present = ~np.isnan(values)
+        if agg in ("sum", "mean"):
+            sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=buckets)
+            present_counts = np.bincount(inverse, weights=present, minlength=buckets)
+            if agg == "sum":
+                return np.where(present_counts > 0, sums, np.nan)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return sums / present_counts
+        if agg == "last":
+            # Index of the last present value of each bucket
+            positions = np.where(present, np.arange(len(values)), -1)
+            last = np.maximum.reduceat(positions, boundaries) if len(values) else np.array([], dtype=np.int64)
+            return np.where(last >= boundaries, values[np.maximum(last, 0)], np.nan)
+        reduce = np.fmin if agg == "min" else np.fmax
+        return reduce.reduceat(values, boundaries) if len(values) else np.array([], dtype=np.float64)
+
+
+_lock = threading.Lock()
+# store directory -> (store version, TimeSeries)
+_series: Dict[str, Tuple[Any, TimeSeries]] = {}
+_queries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+
+
+def report_series(store: ReportStore) -> TimeSeries:
+    """Columnar form of a stored report, rebuilt when the store changed."""
+    version = store.version()
+    with _lock:
+        cached = _series.get(store.directory)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    series = TimeSeries(store.read())
+    with _lock:
+        _series[store.directory] = (version, series)
+    return series
+
+
+def aggregate_report(store: ReportStore, start: Optional[str] = None, end: Optional[str] = None,
+                     step: Optional[str] = None, group_by: Optional[str] = None, agg: str = "mean") -> Dict[str, Any]:
+    """TimeSeries.aggregate of a stored report, cached per query and store version."""
+    key = (store.directory, store.version(), start, end, step, group_by, agg)
+    with _lock:
+        result = _queries.get(key)
+        if result is not None:
+            _queries.move_to_end(key)
+            return result
+
+    result = report_series(store).aggregate(start, end, step, group_by, agg)
+    with _lock:
+        _queries[key] = result
+        while len(_queries) > MAX_CACHED_QUERIES:
+            _queries.popitem(last=False)
+    return result